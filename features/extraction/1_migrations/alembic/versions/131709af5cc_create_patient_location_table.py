@@ -15,32 +15,28 @@ depends_on = None
 
 from alembic import op
 import pandas as pd
-from sutter.lib.path import get_path
+from sutter.lib.helper import get_path
+from sutter.lib.upload import bulk_load
 import sqlalchemy as sa
-from numpy import isnan
 
 table_name = "bayes_patient_location"
 
 
 def upgrade():
-    engine = op.get_bind()
+    bind = op.get_bind()
     file_address = get_path('data/census/CA_pat_lat_lng_tract.csv')
     column_types = {'pat_study_id': long,
                     'latitude': float,
                     'longitude': float,
                     'tract_id': str}
+    sql_types = {'pat_study_id': sa.BigInteger,
+                 'latitude': sa.Float,
+                 'longitude': sa.Float,
+                 'tract_id': sa.VARCHAR(11)}
     with open(file_address) as f:
-
-        df = pd.read_csv(f, dtype=column_types)
-
-    op.create_table(
-        table_name,
-        sa.Column('pat_study_id', sa.BigInteger),
-        sa.Column('latitude', sa.Float),
-        sa.Column('longitude', sa.Float),
-        sa.Column('tract_id', sa.VARCHAR(11)))
-    op.create_index(table_name + "pat_study_id", table_name, ["pat_study_id", "tract_id"])
-    df.to_sql(table_name, engine, index=None, if_exists='append')
+        chunks = pd.read_csv(f, dtype=column_types, chunksize=100000)
+        bulk_load(table_name, bind, chunks, indexes=[["pat_study_id", "tract_id"]],
+                  dtype=sql_types)
 
 
 def downgrade():
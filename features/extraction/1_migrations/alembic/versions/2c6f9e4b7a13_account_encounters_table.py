@@ -0,0 +1,30 @@
+"""account encounters table
+
+Revision ID: 2c6f9e4b7a13
+Revises: 8d3a71f0c2e9
+Create Date: 2026-10-19 17:52:20.104398
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2c6f9e4b7a13'
+down_revision = '8d3a71f0c2e9'
+branch_labels = None
+depends_on = None
+
+import logging
+
+from alembic import op
+
+from sutter.lib.encounter_map import ENCOUNTER_MAP_TABLE, build_encounter_map
+
+log = logging.getLogger('sutter.lib.encounter_map')
+log.setLevel(logging.INFO)
+
+
+def upgrade():
+    build_encounter_map(op.get_bind())
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS {} CASCADE".format(ENCOUNTER_MAP_TABLE))
@@ -14,15 +14,15 @@ depends_on = None
 
 from alembic import op
 import pandas as pd
-from sutter.lib.path import get_path
-import sqlalchemy as sa
+from sutter.lib.helper import get_path
+from sutter.lib.upload import bulk_load
 from numpy import isnan
 
 table_name = "bayes_census"
 
 
 def upgrade():
-    engine = op.get_bind()
+    bind = op.get_bind()
     file_address = get_path('data/census/census_processed.csv')
 
     with open(file_address) as f:
@@ -31,8 +31,7 @@ def upgrade():
         df['tract_id'] = df.tract_id.apply(lambda f: "{:011.0f}".format(f) if ~isnan(f) else None)
     print df.shape
 
-    df.to_sql(table_name, engine, index=None, if_exists='append')
-    op.create_index(table_name + "tract_id", table_name, ["tract_id"])
+    bulk_load(table_name, bind, df, indexes=["tract_id"], if_exists='append')
 
 
 def downgrade():
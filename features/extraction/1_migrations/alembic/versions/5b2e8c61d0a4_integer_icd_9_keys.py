@@ -0,0 +1,30 @@
+"""integer icd-9 keys
+
+Revision ID: 5b2e8c61d0a4
+Revises: 3fd25ba9c477
+Create Date: 2026-10-19 10:12:41.318204
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5b2e8c61d0a4'
+down_revision = '3fd25ba9c477'
+branch_labels = None
+depends_on = None
+
+import logging
+
+from alembic import op
+
+from sutter.lib.icd9 import create_key_columns, drop_key_columns
+
+log = logging.getLogger('sutter.lib.icd9')
+log.setLevel(logging.INFO)
+
+
+def upgrade():
+    create_key_columns(op.get_bind())
+
+
+def downgrade():
+    drop_key_columns(op.get_bind())
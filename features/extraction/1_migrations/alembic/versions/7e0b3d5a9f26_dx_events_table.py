@@ -0,0 +1,30 @@
+"""dx events table
+
+Revision ID: 7e0b3d5a9f26
+Revises: 2c6f9e4b7a13
+Create Date: 2026-10-19 18:14:37.820641
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7e0b3d5a9f26'
+down_revision = '2c6f9e4b7a13'
+branch_labels = None
+depends_on = None
+
+import logging
+
+from alembic import op
+
+from sutter.lib.dx_events import create_dx_events_table, drop_dx_events_table
+
+log = logging.getLogger('sutter.lib.dx_events')
+log.setLevel(logging.INFO)
+
+
+def upgrade():
+    create_dx_events_table(op.get_bind())
+
+
+def downgrade():
+    drop_dx_events_table(op.get_bind())
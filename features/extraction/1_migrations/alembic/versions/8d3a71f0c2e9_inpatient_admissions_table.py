@@ -0,0 +1,30 @@
+"""inpatient admissions table
+
+Revision ID: 8d3a71f0c2e9
+Revises: 5b2e8c61d0a4
+Create Date: 2026-10-19 17:31:08.552187
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8d3a71f0c2e9'
+down_revision = '5b2e8c61d0a4'
+branch_labels = None
+depends_on = None
+
+import logging
+
+from alembic import op
+
+from sutter.lib.admissions import create_admissions_table, drop_admissions_table
+
+log = logging.getLogger('sutter.lib.admissions')
+log.setLevel(logging.INFO)
+
+
+def upgrade():
+    create_admissions_table(op.get_bind())
+
+
+def downgrade():
+    drop_admissions_table(op.get_bind())
@@ -21,6 +21,7 @@ from alembic import op
 import pandas as pd
 
 from sutter.lib.helper import format_column_title, get_path
+from sutter.lib.upload import bulk_load
 
 log = logging.getLogger('sutter.lib.upload')
 log.setLevel(logging.INFO)
@@ -29,7 +30,7 @@ tables = {'bayes_hcup_ccs_dx': '$dxref 2015.csv', 'bayes_hcup_ccs_pr': '$prref 2
 
 
 def upgrade():
-    engine = op.get_bind().engine
+    bind = op.get_bind()
 
     for table_name, filename in tables.iteritems():
         data_path = os.path.join(get_path(), 'data/hcup/Single_Level_CCS_2015/%s' % filename)
@@ -42,7 +43,7 @@ def upgrade():
         hcup_ccs[col_name] = hcup_ccs[col_name].apply(format_column_title)
 
         log.info('Creating %s' % table_name)
-        hcup_ccs.to_sql(table_name, engine, index=False)
+        bulk_load(table_name, bind, hcup_ccs, indexes=['icd_9_cm_code'])
 
 
 def downgrade():
@@ -8,13 +8,14 @@
 *
 * This view is meant to be joined with as the definitive source
 * of admit/discharge timestamps for a given inpatient hospital stay.
+*
+* The MIN/MAX over the encounters of each inpatient account is kept
+* up to date in bayes_inpatient_admissions (see sutter.lib.admissions),
+* so it isn't recomputed for the whole population on every query.
 */
 
 SELECT
-  acct.hsp_acct_study_id,
-  MIN(enc.hosp_admsn_time) as admit_date_time,
-  MAX(enc.hosp_disch_time) as discharge_date_time
-FROM hospital_account acct
-LEFT JOIN hospital_encounters enc USING (hsp_acct_study_id)
-WHERE acct.acct_type_name='Inpatient'
-GROUP BY acct.hsp_acct_study_id
+  hsp_acct_study_id,
+  admit_date_time,
+  discharge_date_time
+FROM bayes_inpatient_admissions
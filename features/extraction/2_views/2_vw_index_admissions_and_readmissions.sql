@@ -38,10 +38,9 @@ WITH readmissions AS (
     SELECT
         acct.hsp_acct_study_id,
         acct.pat_study_id,
-        v.admit_date_time,
-        v.discharge_date_time
-    FROM hospital_account acct
-    JOIN features.bayes_vw_admission_discharge_timestamp v USING(hsp_acct_study_id)
+        acct.admit_date_time,
+        acct.discharge_date_time
+    FROM bayes_inpatient_admissions acct
     WHERE acct.admission_type_name != 'Elective'
     AND acct.acct_type_name = 'Inpatient'
     AND acct.admission_source_name NOT IN (
@@ -18,4 +18,4 @@ SELECT DISTINCT ON (enc_study_id)
        icd_9_cci_xwalk.weight
 FROM non_hospital_encs
 JOIN encounter_dx enc_dx USING (enc_study_id)
-JOIN icd_9_cci_xwalk USING (icd_9_cm_code)
\ No newline at end of file
+JOIN icd_9_cci_xwalk USING (icd_9_cm_key)
\ No newline at end of file
@@ -13,13 +13,15 @@ SELECT acct.hsp_acct_study_id,
        JOIN features.bayes_vw_index_admissions
        USING (hsp_acct_study_id)
 
+       -- the encounters during the stay (see sutter.lib.encounter_map)
+       LEFT JOIN bayes_account_encounters stay
+       USING (hsp_acct_study_id)
+
        LEFT JOIN encounters enc
-       ON enc.pat_study_id = acct.pat_study_id
-           AND enc.contact_date >= acct.adm_date_time::DATE
-           AND enc.contact_date <= acct.disch_date_time::DATE
+       ON enc.enc_study_id = stay.enc_study_id
 
        LEFT JOIN order_medication ord
-       USING (enc_study_id)
+       ON ord.enc_study_id = stay.enc_study_id
 
        LEFT JOIN medication_id med
        USING (medication_id)
@@ -8,23 +8,8 @@ SELECT hsp_acct_study_id,
            WHEN date_part('hour', admit_date_time) < 8 THEN 'evening'
            ELSE NULL
        END admission_time_cat,
-       CASE admission_source_name
-           WHEN 'Transfer from a Hospital (Different Facility)' THEN 'transfer'
-           WHEN 'Transfer from Another Health Care Facility' THEN 'transfer'
-           WHEN 'Transfer from One Distinct Unit to another Distinct Unit in Same Hospital' THEN 'transfer'
-           WHEN 'Transfer from Skilled Nursing (SNF), Intermediate Care (ICF) or Assisted Living (ALF)' THEN 'transfer'
-           WHEN 'Non-Health Care Facility Point of Origin' THEN 'home'
-           WHEN 'Clinic or Physician''s Office' THEN 'outpatient'
-           WHEN '' THEN NULL
-           WHEN 'Information Not Available' THEN NULL
-           ELSE 'other'
-       END admission_source_cat,
-       CASE admission_type_name
-           WHEN 'Trauma Center' THEN 'other'
-           WHEN 'Newborn' THEN 'other'
-           WHEN 'Information Not Available' THEN 'other'
-           ELSE lower(admission_type_name)
-       END admission_type_cat,
+       {{admission_source(admission_source_name)}} admission_source_cat,
+       {{admission_type(admission_type_name)}} admission_type_cat,
        CASE
            WHEN admission_type_name='Emergency' THEN 3
            ELSE 0
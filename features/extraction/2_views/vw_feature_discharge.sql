@@ -12,25 +12,7 @@ SELECT discharges.*,
            WHEN disch_hour >= 8 THEN 'morning'
            WHEN disch_hour < 8 THEN 'evening'
        END disch_time_cat,
-       CASE patient_status_name
-           WHEN 'Discharged to Home or Self Care (Routine Discharge)' THEN 'home_no_service'
-           WHEN 'Discharged/transferred to Home Under Care of Organized Home Health Service Org' THEN 'home_health'
-           WHEN 'Discharged/transferred to a Facility that Provides Custodial or Supportive Care' THEN 'assisted_living'
-           WHEN 'Discharged/transferred to a Medicare Certified Long Term Care Hospital (LTCH)' THEN 'assisted_living'
-           WHEN 'Discharged/transferred to a Nursing Fac Certified under Medicaid but not Medicare' THEN 'snf'
-           WHEN 'Discharged/transferred to Skilled Nursing Facility (SNF) with Medicare Certification' THEN 'snf'
-           WHEN 'Hospice - Home' THEN 'hospice'
-           WHEN 'Hospice - Medical Facility (Certified) Providing Hospice Level of Care' THEN 'hospice'
-           WHEN 'Discharged/transferred to a Psychiatric Hospital or Psychiatric Hospital Unit' THEN 'hospital'
-           WHEN 'Left Against Medical Advice or Discontinued Care' THEN 'discontinued'
-           WHEN 'Discharged/transferred to an Inpatient Rehab Facility (IRF)' THEN 'rehab'
-           WHEN 'Disch/trans to Another Type of Health Care Inst not Defined Elsewhere in this List' THEN 'other'
-           WHEN 'Admitted as an Inpatient to this Hospital' THEN 'other'
-           WHEN 'Discharged/transferred to Court/Law Enforcement' THEN 'other'
-           WHEN 'Still a Patient' THEN 'other'
-           WHEN '' THEN 'other'
-           ELSE 'other'
-       END disch_location_cat
+       {{disch_location(patient_status_name)}} disch_location_cat
 FROM
   (SELECT hsp_acct_study_id,
           date_part('hour', discharge_date_time) disch_hour,
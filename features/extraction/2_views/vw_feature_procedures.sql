@@ -3,4 +3,4 @@ SELECT hsp_acct_study_id,
   FROM features.bayes_vw_index_admissions
        LEFT JOIN hospital_px USING (hsp_acct_study_id)
        LEFT JOIN px_id_xwalk USING (final_icd_px_id)
-       LEFT JOIN bayes_hcup_ccs_pr USING (icd_9_cm_code)
\ No newline at end of file
+       LEFT JOIN bayes_hcup_ccs_pr USING (icd_9_cm_key)
\ No newline at end of file
@@ -1,9 +1,5 @@
-SELECT hsp.hsp_acct_study_id,
-               cen.*
-        FROM hospital_account hsp
-            JOIN features.bayes_vw_index_admissions index_admissions
-                    USING (hsp_acct_study_id)
-            LEFT  JOIN bayes_patient_location loc
-                    ON (index_admissions.pat_study_id=loc.pat_study_id)
-            LEFT JOIN bayes_census cen
-                    USING (tract_id)
\ No newline at end of file
+SELECT index_admissions.hsp_acct_study_id,
+       loc.tract_id
+  FROM features.bayes_vw_index_admissions index_admissions
+       LEFT JOIN bayes_patient_location loc
+               ON (index_admissions.pat_study_id=loc.pat_study_id)
@@ -0,0 +1,131 @@
+"""
+Benchmark the upload, view rendering and feature extraction steps on synthetic data.
+
+Usage:
+    SUTTER_DB=<scratch db> python benchmark.py --scales 10000 100000 1000000 --output bench.json
+
+For each scale, this loads a fresh synthetic dataset (see sutter.lib.synthetic) into the database
+named by SUTTER_DB, then times:
+    * CsvToSql uploading the synthetic hospital_account table from a TSV file
+    * rendering each view (SELECT count(*)) and each materialized view
+    * each feature extractor (query, transform and emit times from the databuilder run report)
+
+Results are written as JSON after every scale, so that scaling curves can be compared between
+runs to catch regressions.
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from feature_extraction import feature_extractors
+
+from sutter.lib import postgres, synthetic, views
+from sutter.lib.databuilder import DatabuilderFramework
+from sutter.lib.helper import get_path
+from sutter.lib.upload import CsvToSql
+
+log = logging.getLogger('benchmark')
+
+UPLOAD_TABLE = 'bench_hospital_account'
+
+
+def time_upload(engine, n_accounts, seed, tmpdir):
+    """Time CsvToSql uploading a synthetic hospital_account table of the given size."""
+    path = os.path.join(tmpdir, 'hospital_account.tsv')
+    header = True
+    with open(path, 'w') as f:
+        for tables in synthetic.generate(n_accounts, seed):
+            if 'hospital_account' in tables:
+                tables['hospital_account'].to_csv(f, sep='\t', index=False, header=header,
+                                                  quotechar="'")
+                header = False
+
+    engine.execute("DROP TABLE IF EXISTS {}".format(UPLOAD_TABLE))
+    start = time.time()
+    upload = CsvToSql(UPLOAD_TABLE, engine, fpaths=[path])
+    elapsed = time.time() - start
+    engine.execute("DROP TABLE IF EXISTS {}".format(UPLOAD_TABLE))
+    return {'seconds': elapsed, 'errors': len(upload.get_errors())}
+
+
+def time_views(engine, schema):
+    """Create all views, then time rendering each plain view and each materialized view."""
+    engine.execute("CREATE SCHEMA IF NOT EXISTS {}".format(schema))
+    cwd = os.getcwd()
+    os.chdir(get_path())  # views.py looks for the `views` folder relative to the project root
+    try:
+        view_names = views.update_views(schema)
+        render_times = {}
+        for view_name in view_names:
+            start = time.time()
+            engine.execute("SELECT count(*) FROM {}.{}".format(schema, view_name))
+            render_times[view_name] = time.time() - start
+        render_times.update(views.create_materialized_views(schema))
+    finally:
+        os.chdir(cwd)
+    return render_times
+
+
+def time_extractors(schema, tmpdir):
+    """Run all feature extractors and return the per-extractor entries of the run report."""
+    report_path = os.path.join(tmpdir, 'report.json')
+    framework = DatabuilderFramework(load_state=False, report_path=report_path)
+    framework.cache_path = os.path.join(tmpdir, 'databuilder-cache.pckl')
+    for extractor in feature_extractors:
+        extractor._schema = schema
+    framework.generate_features(feature_extractors)
+    with open(report_path) as f:
+        return json.load(f)
+
+
+def run_scale(n_accounts, schema, seed):
+    """Load a synthetic dataset of the given size and benchmark every pipeline step on it."""
+    engine = postgres.get_connection()
+    tmpdir = tempfile.mkdtemp(prefix='sutter-bench-')
+    result = {'n_accounts': n_accounts}
+    try:
+        log.info('loading %d synthetic accounts ...' % n_accounts)
+        start = time.time()
+        result['row_counts'] = synthetic.load(n_accounts, engine, seed)
+        result['load_seconds'] = time.time() - start
+
+        log.info('timing CsvToSql ...')
+        result['upload'] = time_upload(engine, n_accounts, seed, tmpdir)
+        log.info('timing views ...')
+        result['views'] = time_views(engine, schema)
+        log.info('timing feature extractors ...')
+        result['extraction'] = time_extractors(schema, tmpdir)
+    finally:
+        shutil.rmtree(tmpdir)
+    return result
+
+
+def main():
+    """Run the benchmarks at each of the requested scales."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[10000, 100000],
+                        help='numbers of hospital accounts to benchmark with')
+    parser.add_argument('--schema', default='features')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark.json')
+    args = parser.parse_args()
+
+    if not os.environ.get('SUTTER_DB'):
+        parser.error('set SUTTER_DB to a scratch database: the benchmark drops the raw tables!')
+
+    results = []
+    for n_accounts in args.scales:
+        results.append(run_scale(n_accounts, args.schema, args.seed))
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        log.info('results written to %s' % args.output)
+
+
+if __name__ == '__main__':
+    main()
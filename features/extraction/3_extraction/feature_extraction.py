@@ -1,6 +1,9 @@
 """Feature extraction pipeline for sutter."""
 
+import argparse
+import json
 import logging
+import sys
 
 from feature_extractors.admission import AdmissionExtractor
 from feature_extractors.comorbidities import ComorbiditiesExtractor
@@ -10,6 +13,7 @@ from feature_extractors.encounter_reason import EncounterReasonExtractor
 from feature_extractors.health_history import HealthHistoryExtractor
 from feature_extractors.hospital_problems import HospitalProblemsExtractor
 from feature_extractors.lab_results import LabResultsExtractor
+from feature_extractors.lab_trends import LabTrendsExtractor
 from feature_extractors.labels import ReadmissionExtractor
 from feature_extractors.medications import MedicationsExtractor
 from feature_extractors.payer import PayerExtractor
@@ -19,7 +23,11 @@ from feature_extractors.socioeconomic import SocioeconomicExtractor
 from feature_extractors.utilization import UtilizationExtractor
 from feature_extractors.vitals import VitalsExtractor
 
-from fex import runner
+from sutter.lib.databuilder import DatabuilderFramework
+from sutter.lib.feature_extractor import account_partitions
+from sutter.lib.feature_store import FeatureStore
+from sutter.lib.helper import get_path
+from sutter.lib.realtime import extract_account, featurize, read_feature_list
 
 logging.basicConfig(format='%(levelname)s:%(name)s:%(asctime)s=> %(message)s',
                     datefmt='%m/%d %H:%M:%S',
@@ -42,8 +50,66 @@ feature_extractors = [
     VitalsExtractor(),
     MedicationsExtractor(),
     LabResultsExtractor(),
+    LabTrendsExtractor(),
     SocioeconomicExtractor()
 ]
 
+
+def main():
+    """Run all feature extractors, optionally writing a timing report and per-extractor profiles."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('dataset_path', nargs='?', default='features.csv',
+                        help='where to write the extracted features (a directory if partitioned)')
+    parser.add_argument('--partitions', type=int, default=None,
+                        help='extract this many ranges of accounts one at a time, writing one '
+                             'file per range, to bound peak memory')
+    parser.add_argument('--report', default=None,
+                        help='write a JSON report of per-extractor timings to this path')
+    parser.add_argument('--profile-dir', default=None,
+                        help='write a profiler dump for each extractor to this directory')
+    parser.add_argument('--profiler', default='cprofile', choices=['cprofile', 'pyinstrument'])
+    parser.add_argument('--no-cache', action='store_true',
+                        help='re-run every extractor, even those whose code, views and input '
+                             'tables haven\'t changed since the cached run')
+    parser.add_argument('--feature-store', default=None,
+                        help='also write each extractor\'s features, with their as-of times, to '
+                             'the feature store in this directory')
+    parser.add_argument('--account', type=int, default=None,
+                        help='only compute the model inputs of this hsp_acct_study_id (e.g. for '
+                             'a patient being discharged), and print them as CSV')
+    parser.add_argument('--feature-list', default=get_path('features_100.txt'),
+                        help='with --account: the ordered list of model inputs to output')
+    parser.add_argument('--fill-values', default=None,
+                        help='with --account: JSON file of the values to impute missing model '
+                             'inputs with, i.e. the training means (see '
+                             'sutter.lib.realtime.training_fill_values)')
+    args = parser.parse_args()
+
+    if args.account is not None:
+        if args.fill_values is None:
+            parser.error('--account requires --fill-values')
+        with open(args.fill_values) as f:
+            fill_values = json.load(f)
+        extractors = [e for e in feature_extractors if not isinstance(e, ReadmissionExtractor)]
+        features = extract_account(args.account, extractors)
+        featurize(features, read_feature_list(args.feature_list),
+                  fill_values=fill_values).to_csv(sys.stdout)
+        return
+
+    feature_store = FeatureStore(args.feature_store) if args.feature_store else None
+    framework = DatabuilderFramework(load_state=not args.no_cache,
+                                     report_path=args.report,
+                                     profile_dir=args.profile_dir,
+                                     profiler=args.profiler,
+                                     feature_store=feature_store)
+    for extractor in feature_extractors:
+        framework.add_feature_extractor(extractor)
+
+    if args.partitions:
+        framework.run_partitioned(args.dataset_path, account_partitions(args.partitions))
+    else:
+        framework.run(args.dataset_path, use_cache=not args.no_cache)
+
+
 if __name__ == '__main__':
-    runner.run(*feature_extractors, args=["--no-cache"])
+    main()
@@ -6,7 +6,6 @@ import logging
 
 import pandas as pd
 
-from sutter.lib import postgres
 from sutter.lib.feature_extractor import FeatureExtractor
 from sutter.lib.helper import find_cci
 
@@ -43,14 +42,17 @@ class ComorbiditiesExtractor(FeatureExtractor):
 
     def extract(self):
         query = """
-            SELECT *
+            SELECT hsp_acct_study_id,
+                   condition_cat,
+                   weight
               FROM {}.bayes_m_vw_feature_comorbidities
         """.format(self._schema)
 
-        engine = postgres.get_connection()
-
-        res = pd.read_sql(query, engine)
+        res = self.read_sql(query)
         log.info('The queried table has %d rows.' % len(res))
+        # Accounts without comorbidities have a row with a null weight: if that's all of them
+        # (e.g. for a single account), the weights aren't numeric.
+        res['weight'] = res.weight.astype('float')
 
         pivoted = pd.pivot_table(data=res,
                                  index='hsp_acct_study_id',
@@ -60,7 +62,8 @@ class ComorbiditiesExtractor(FeatureExtractor):
 
         df = pd.DataFrame(index=res.hsp_acct_study_id.unique())
         df[pivoted.columns] = pivoted
-        df['charlson_index'] = df.apply(find_cci, axis=1)
+        # (apply would return an empty frame if none of the accounts has a comorbidity)
+        df['charlson_index'] = df.apply(find_cci, axis=1) if len(df.columns) else 0
         df['charlson_index_lace'] = df.charlson_index.apply(lambda s: s if s <= 3 else 5)
 
         # I needed weight values to calculate cci. Now, I will replace all
@@ -70,4 +73,4 @@ class ComorbiditiesExtractor(FeatureExtractor):
         for col in df.columns[:-2]:
             df[col] = df[col].astype('bool')
 
-        return self.emit_df(df)
+        return self.emit_df(df, missing=dict.fromkeys(pivoted.columns, False))
@@ -2,10 +2,7 @@
 
 from __future__ import absolute_import
 
-import pandas as pd
-
-from sutter.lib import postgres
-from sutter.lib.feature_categorizers import marital_status_from_string, race_from_string
+from sutter.lib.feature_categorizers import CATEGORY_MAPPINGS
 from sutter.lib.feature_extractor import FeatureExtractor
 
 
@@ -42,18 +39,16 @@ class BasicDemographicsExtractor(FeatureExtractor):
               FROM {}.bayes_vw_feature_demographics
         """.format(self._schema)
 
-        engine = postgres.get_connection()
-
-        res = pd.read_sql(query, engine)
+        res = self.read_sql(query, index_col='hsp_acct_study_id')
         # Occasionally (in less than 5% of cases), we have more than 1 row per patient.
-        # I randomly select one line here.
-        res = res.groupby('hsp_acct_study_id').first()
+        res = self.dedupe(res, 'first_non_null')
 
         res['age^2'] = res.age.apply(lambda x: x ** 2)
         res['age^3'] = res.age.apply(lambda x: x ** 3)
         res['tabak_age'] = res.age.apply(lambda x: max(0, 0.4 * (x - 45)))
-        res['race_cat'] = res.race_name.apply(race_from_string)
-        res['marital_status_cat'] = res.marital_status_name.apply(marital_status_from_string)
+        res['race_cat'] = CATEGORY_MAPPINGS['race'].apply(res.race_name)
+        res['marital_status_cat'] = CATEGORY_MAPPINGS['marital_status'].apply(
+            res.marital_status_name)
 
         res.drop(['race_name', 'marital_status_name'], 1, inplace=True)
 
@@ -2,9 +2,6 @@
 
 from __future__ import absolute_import
 
-import pandas as pd
-
-from sutter.lib import postgres
 from sutter.lib.feature_extractor import FeatureExtractor
 
 
@@ -70,11 +67,8 @@ class DischargeExtractor(FeatureExtractor):
               FROM {}.bayes_vw_feature_discharge
         """.format(self._schema)
 
-        engine = postgres.get_connection()
-
-        res = pd.read_sql(query, engine)
-        # There are two duplicates which I'm going to ignore for now.
-        res.drop_duplicates(subset='hsp_acct_study_id', inplace=True)
-        res.set_index('hsp_acct_study_id', inplace=True)
+        res = self.read_sql(query, index_col='hsp_acct_study_id')
+        # There are two duplicates; keep the longest stay.
+        res = self.dedupe(res, 'latest', order_by=['length_of_stay'])
 
         return self.emit_df(res)
@@ -6,7 +6,6 @@ import logging
 
 import pandas as pd
 
-from sutter.lib import postgres
 from sutter.lib.feature_extractor import FeatureExtractor
 from sutter.lib.helper import format_column_title
 
@@ -27,9 +26,7 @@ class EncounterReasonExtractor(FeatureExtractor):
               FROM {}.bayes_vw_feature_encounter_reason
         """.format(self._schema)
 
-        engine = postgres.get_connection()
-
-        res = pd.read_sql(query, engine)
+        res = self.read_sql(query)
         log.info('The queried table has %d rows.' % len(res))
 
         dummified = res.dropna() \
@@ -43,4 +40,4 @@ class EncounterReasonExtractor(FeatureExtractor):
         df[df_columns] = dummified
         df.fillna(0, inplace=True)
         df = df.astype('bool')
-        return self.emit_df(df)
+        return self.emit_df(df, missing=False)
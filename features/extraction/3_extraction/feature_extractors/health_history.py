@@ -2,11 +2,16 @@
 
 from __future__ import absolute_import
 
+import logging
+
 import pandas as pd
 
-from sutter.lib import postgres
+from sutter.lib.asof import latest_in_window, take_latest
+from sutter.lib.feature_categorizers import CATEGORY_MAPPINGS
 from sutter.lib.feature_extractor import FeatureExtractor
 
+log = logging.getLogger('feature_extraction')
+
 
 class HealthHistoryExtractor(FeatureExtractor):
     """
@@ -16,17 +21,39 @@ class HealthHistoryExtractor(FeatureExtractor):
     `tobacco_cat` - [Never, Quit, Yes, None, Passive]
     `alcohol_cat` - [yes, not, na]
     `drugs_cat` - [yes, not, na]
+
+    The history is that of the patient's last 'History' encounter up to the day of discharge
+    (see sutter.lib.asof). Of the encounters of the same day, the last one (by enc_study_id) is
+    used.
     """
 
     def extract(self):
-        query = """
-            SELECT hsp_acct_study_id, tobacco_cat, alcohol_cat, drugs_cat
-              FROM {}.bayes_m_vw_feature_health_history
-        """.format(self._schema)
-
-        engine = postgres.get_connection()
+        stays = self.read_sql(self.stays_query()).set_index('hsp_acct_study_id')
+        stays['disch_date_time'] = pd.to_datetime(stays.disch_date_time).dt.normalize()
 
-        res = pd.read_sql(query, engine, index_col="hsp_acct_study_id")
+        query = """
+            SELECT enc.pat_study_id,
+                   enc.contact_date,
+                   hx.tobacco_user_name,
+                   hx.alcohol_use_name,
+                   hx.ill_drug_user_name
+              FROM encounters enc
+                   LEFT JOIN social_hx hx
+                   USING (enc_study_id)
+             WHERE enc.enc_type_name = 'History'
+               AND enc.pat_study_id IN ({})
+             ORDER BY enc.pat_study_id, enc.contact_date, enc.enc_study_id
+        """.format(self.patients_query())
+        encounters = self.read_sql(query, partitioned=False)
+        log.info('The queried table has %d rows.' % len(encounters))
+
+        pos = latest_in_window(stays, encounters, start=None, time='contact_date')
+        hx = take_latest(encounters, pos, stays.index)
+
+        res = pd.DataFrame(index=stays.index)
+        res['tobacco_cat'] = CATEGORY_MAPPINGS['tobacco'].apply(hx.tobacco_user_name)
+        res['alcohol_cat'] = CATEGORY_MAPPINGS['yes_no'].apply(hx.alcohol_use_name)
+        res['drugs_cat'] = CATEGORY_MAPPINGS['yes_no'].apply(hx.ill_drug_user_name)
         res.fillna('na', inplace=True)
 
         return self.emit_df(res)
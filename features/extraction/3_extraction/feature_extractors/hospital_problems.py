@@ -6,7 +6,6 @@ import logging
 
 import pandas as pd
 
-from sutter.lib import postgres
 from sutter.lib.feature_extractor import FeatureExtractor
 
 log = logging.getLogger('feature_extraction')
@@ -29,9 +28,7 @@ class HospitalProblemsExtractor(FeatureExtractor):
               FROM {}.bayes_vw_feature_hospital_problems
         """.format(self._schema)
 
-        engine = postgres.get_connection()
-
-        res = pd.read_sql(query, engine)
+        res = self.read_sql(query)
         log.info('The queried table has %d rows.' % len(res))
 
         pivoted = pd.pivot_table(res,
@@ -46,4 +43,4 @@ class HospitalProblemsExtractor(FeatureExtractor):
         df = df.astype('bool')
 
         df['hospital_problems_count'] = df.apply(sum, axis=1)
-        return self.emit_df(df)
+        return self.emit_df(df, missing=dict.fromkeys(pivoted.columns, False))
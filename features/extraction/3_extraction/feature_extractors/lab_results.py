@@ -8,11 +8,17 @@ import numpy as np
 
 import pandas as pd
 
-from sutter.lib import postgres
+from sutter.lib.asof import latest_in_window, take_latest
 from sutter.lib.feature_extractor import FeatureExtractor
 
 log = logging.getLogger('feature_extraction')
 
+# The components that the features below refer to.
+COMPONENTS = [
+    'ALBUMIN', 'BILIRUBIN TOTAL', 'CK', 'CK MB', 'COCAINE', 'GLUCOSE', 'HEMOGLOBIN', 'INR',
+    'NT PRO BNP', 'PCO2', 'PH', 'SODIUM', 'TROPONIN I', 'UREA NITROGEN', 'WBC',
+]
+
 
 def calculate_tabak_mortality_features(tests):
     """
@@ -73,6 +79,51 @@ def calculate_tabak_mortality_features(tests):
     return df
 
 
+def lab_features(stays, results):
+    """
+    Compute the lab features of each stay from the lab results of its patient.
+
+    :param stays: DataFrame of the stays, indexed by hsp_acct_study_id, with `pat_study_id`,
+        `adm_date_time` and `disch_date_time` columns (truncated to dates).
+    :param results: DataFrame of lab results, with `pat_study_id`, `common_name`, `result_date`,
+        `ord_num_value` and `result_flag_name` columns.
+    :returns: a DataFrame of features indexed like `stays`.
+    """
+    # The most recent result of each component during the stay: one window per stay and
+    # component of its patient.
+    keys = ['pat_study_id', 'common_name']
+    windows = stays.reset_index().merge(results[keys].drop_duplicates(), on='pat_study_id')
+    pos = latest_in_window(windows, results, key=keys, time='result_date')
+    res = take_latest(results, pos, pd.Index(windows.hsp_acct_study_id))[pos >= 0]
+    res = res.reset_index()
+
+    tests = res.pivot(index='hsp_acct_study_id', columns='common_name', values='ord_num_value')
+    # Every component is a column, even if none of these stays has a result for it (e.g. when
+    # extracting a single account).
+    tests = tests.reindex(index=stays.index, columns=COMPONENTS)
+
+    # Start with the Tabak features.
+    scores = calculate_tabak_mortality_features(tests)
+
+    # Boolean features for HOSPITAL score.
+    scores['hosp_low_hemoglobin'] = tests['HEMOGLOBIN'] < 12
+    scores['hosp_low_sodium'] = tests['SODIUM'] < 135
+
+    # Result of most recent cocaine test (probably not as useful as "history of cocaine usage").
+    scores['if_cocaine_bool'] = ~np.isnan(tests['COCAINE'])
+
+    # Simple statistics on abnormal test results.
+    scores['num_total_results'] = res.groupby('hsp_acct_study_id').common_name.count()
+    scores['num_abnormal_results'] = \
+        res[res.result_flag_name != ""].groupby("hsp_acct_study_id").result_flag_name.count()
+    scores['pct_abnormal_results'] = \
+        100.0 * scores['num_abnormal_results'] / scores['num_total_results']
+
+    scores.fillna(0, inplace=True)
+
+    return scores
+
+
 class LabResultsExtractor(FeatureExtractor):
     """
     Generates features from the patient's most recent results for each lab test taken.
@@ -100,37 +151,41 @@ class LabResultsExtractor(FeatureExtractor):
       `tabak_very_low_arterial_ph` - Lab test components of the Tabak mortality score
 
     - `tabak_lab_score` - Total value of "Laboratory Values" section of Tabak mortality score
+
+    Only the most recent result of each lab test during the stay is considered (see
+    sutter.lib.asof). Results are dated, not timed: of the results of the same day, the last
+    in (order, value) order is used, so that the choice doesn't depend on the query plan.
     """
 
     def extract(self):
-        query = """
-            SELECT hsp_acct_study_id, common_name, ord_num_value, result_flag_name
-              FROM {}.bayes_m_vw_account_lab_results
-        """.format(self._schema)
-        engine = postgres.get_connection()
-
-        res = pd.read_sql(query, engine)
-        log.info('The queried table has %d rows.' % len(res))
-
-        tests = res.pivot(index='hsp_acct_study_id', columns='common_name', values='ord_num_value')
-
-        # Start with the Tabak features.
-        scores = calculate_tabak_mortality_features(tests)
+        stays = self.read_sql(self.stays_query()).set_index('hsp_acct_study_id')
+        for col in ['adm_date_time', 'disch_date_time']:
+            stays[col] = pd.to_datetime(stays[col]).dt.normalize()
 
-        # Boolean features for HOSPITAL score.
-        scores['hosp_low_hemoglobin'] = tests['HEMOGLOBIN'] < 12
-        scores['hosp_low_sodium'] = tests['SODIUM'] < 135
-
-        # Result of most recent cocaine test (probably not as useful as "history of cocaine usage").
-        scores['if_cocaine_bool'] = ~np.isnan(tests['COCAINE'])
-
-        # Simple statistics on abnormal test results.
-        scores['num_total_results'] = res.groupby('hsp_acct_study_id').common_name.count()
-        scores['num_abnormal_results'] = \
-            res[res.result_flag_name != ""].groupby("hsp_acct_study_id").result_flag_name.count()
-        scores['pct_abnormal_results'] = \
-            100.0 * scores['num_abnormal_results'] / scores['num_total_results']
-
-        scores.fillna(0, inplace=True)
-
-        return self.emit_df(scores)
+        query = """
+            SELECT proc.pat_study_id,
+                   component.common_name,
+                   res.result_date,
+                   res.ord_num_value,
+                   res.result_flag_name
+              FROM order_procedures_supp proc
+                   JOIN order_results res
+                   ON res.order_proc_study_id = proc.order_proc_study_id
+
+                   JOIN component_id component
+                   ON component.component_id = res.component_id
+             WHERE proc.ordering_mode_name = 'Inpatient'
+               AND EXISTS (SELECT 1
+                             FROM ({}) stay
+                            WHERE stay.pat_study_id = proc.pat_study_id
+                              AND res.result_date >= stay.adm_date_time::date
+                              AND res.result_date <= stay.disch_date_time::date)
+             ORDER BY proc.pat_study_id, component.common_name, res.result_date,
+                      res.order_proc_study_id, res.ord_num_value
+        """.format(self._partition_query(self.stays_query(), partitioned=True))
+        # Only the results dated within one of the stays are fetched: the window of each stay
+        # is applied again by lab_features.
+        results = self.read_sql(query, partitioned=False)
+        log.info('The queried table has %d rows.' % len(results))
+
+        return self.emit_df(lab_features(stays, results))
@@ -0,0 +1,95 @@
+"""A feature extractor for the trends of patient's lab results during their stay."""
+
+from __future__ import absolute_import
+
+import logging
+
+import numpy as np
+
+import pandas as pd
+
+from sutter.lib.feature_extractor import FeatureExtractor
+from sutter.lib.segments import STATS, iter_segments, segment_starts, segment_stats
+
+log = logging.getLogger('feature_extraction')
+
+# The components of the Tabak and HOSPITAL scores (see lab_results.py).
+COMPONENTS = [
+    'ALBUMIN', 'BILIRUBIN TOTAL', 'CK', 'CK MB', 'GLUCOSE', 'HEMOGLOBIN', 'INR', 'NT PRO BNP',
+    'PCO2', 'PH', 'SODIUM', 'TROPONIN I', 'UREA NITROGEN', 'WBC',
+]
+KEYS = ['hsp_acct_study_id', 'common_name']
+# Results are dated, not timed: results of the same day are ordered by their order, then value,
+# so that the first and last results don't depend on the query plan.
+ORDER_BY = 'hsp_acct_study_id, common_name, result_date, order_proc_study_id, ord_num_value'
+
+
+def _component_stats(results):
+    """Aggregate a DataFrame of results sorted by ORDER_BY, one row per group."""
+    starts = segment_starts(*[results[key].values for key in KEYS])
+    days = pd.to_datetime(results.result_date).values.astype('datetime64[D]').astype(np.int64)
+    stats = segment_stats(starts, days, results.ord_num_value.values)
+    stats.update((key, results[key].values[starts]) for key in KEYS)
+    return pd.DataFrame(stats, columns=KEYS + STATS)
+
+
+class LabTrendsExtractor(FeatureExtractor):
+    """
+    Generates features from all of the results of each lab test taken during the hospital stay.
+
+    Features, for each [component] of COMPONENTS (e.g. `lab_sodium_min`):
+    - `lab_[component]_count` - Number of numeric results (0 if none)
+    - `lab_[component]_first`, `lab_[component]_last` - Earliest and latest result
+    - `lab_[component]_min`, `lab_[component]_max` - Lowest and highest result
+    - `lab_[component]_slope` - Least-squares trend of the results, per day (missing if all were
+                                taken on the same day)
+
+    The results are streamed in ORDER_BY order, and aggregated with segment reductions (see
+    sutter.lib.segments).
+    """
+
+    components = COMPONENTS
+    chunksize = 500000
+
+    def extract(self):
+        query = """
+            SELECT adm.hsp_acct_study_id,
+                   component.common_name,
+                   res.result_date,
+                   res.order_proc_study_id,
+                   res.ord_num_value
+              FROM {}.bayes_vw_index_admissions adm
+                   JOIN hospital_account acct
+                   ON acct.hsp_acct_study_id = adm.hsp_acct_study_id
+
+                   JOIN order_procedures_supp proc
+                   ON proc.pat_study_id = adm.pat_study_id
+                      AND proc.ordering_mode_name = 'Inpatient'
+
+                   JOIN order_results res
+                   ON res.order_proc_study_id = proc.order_proc_study_id
+                      AND res.result_date >= acct.adm_date_time::DATE
+                      AND res.result_date <= acct.disch_date_time::DATE
+
+                   JOIN component_id component
+                   ON component.component_id = res.component_id
+             WHERE res.ord_num_value IS NOT NULL
+               AND res.result_date IS NOT NULL
+               AND component.common_name IN ({})
+        """.format(self._schema, ', '.join("'{}'".format(c) for c in self.components))
+        chunks = self.read_sql_chunks(query, order_by=ORDER_BY, chunksize=self.chunksize)
+
+        stats = [_component_stats(results) for results in iter_segments(chunks, KEYS)]
+        stats = pd.concat(stats, ignore_index=True) if stats else \
+            pd.DataFrame(columns=KEYS + STATS)
+        log.info('The aggregated table has %d rows.' % len(stats))
+
+        df = stats.set_index(KEYS)[STATS].unstack('common_name')
+        df.columns = ['lab_{}_{}'.format(component.lower().replace(' ', '_'), stat)
+                      for stat, component in df.columns]
+        df = df.reindex(columns=sorted(df.columns))
+        count_cols = [c for c in df.columns if c.endswith('_count')]
+        df[count_cols] = df[count_cols].fillna(0)
+        df.index.name = 'hsp_acct_study_id'
+
+        return self.emit_df(df)
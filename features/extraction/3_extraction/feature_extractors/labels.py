@@ -2,10 +2,8 @@
 
 from __future__ import absolute_import
 
-import pandas as pd
-
-from sutter.lib import postgres
 from sutter.lib.feature_extractor import FeatureExtractor
+from sutter.lib.readmissions import DEFAULT_HORIZONS, readmission_labels
 
 
 class ReadmissionExtractor(FeatureExtractor):
@@ -13,22 +11,42 @@ class ReadmissionExtractor(FeatureExtractor):
     Generates features related to readmission to the hospital after the discharge.
 
     Features:
-    `full_days_after_discharge` - Number of complete days after discharge
+    `days_to_readmit` - Number of complete days after discharge
         before the patient was readmitted again. None if this never occurred.
+    `readmit_[n]_day_bool` - Whether the patient was readmitted within [n] (7, 30, 90) days.
     `admit_date_time` - Used for filtering data before modelling.
     `discharge_date_time` - Used for filtering data before modelling.
+
+    Readmissions are found with sutter.lib.readmissions, with the rules of
+    `2_vw_index_admissions_and_readmissions.sql`.
     """
 
+    horizons = DEFAULT_HORIZONS
+
     def extract(self):
         query = """
-            SELECT
-                *
-            FROM {}.bayes_vw_feature_labels
+            SELECT hsp_acct_study_id,
+                   pat_study_id,
+                   admit_date_time,
+                   discharge_date_time
+              FROM {}.bayes_vw_index_admissions
         """.format(self._schema)
+        res = self.read_sql(query)
 
-        engine = postgres.get_connection()
-
-        res = pd.read_sql(query, engine, index_col="hsp_acct_study_id")
-        # Les than 5 duplicates across all hospitals. Will drop them
-        res = res.groupby(res.index).first()
+        query = """
+            SELECT hsp_acct_study_id,
+                   pat_study_id,
+                   admit_date_time,
+                   acct_type_name,
+                   admission_type_name,
+                   admission_source_name
+              FROM bayes_inpatient_admissions
+             WHERE pat_study_id IN ({})
+        """.format(self.patients_query())
+        stays = self.read_sql(query, partitioned=False)
+
+        res = res.join(readmission_labels(res, stays, self.horizons))
+        res = res.set_index('hsp_acct_study_id')
+        # Less than 5 duplicates across all hospitals: keep the last discharge.
+        res = self.dedupe(res, 'latest', order_by=['discharge_date_time'])
         return self.emit_df(res)
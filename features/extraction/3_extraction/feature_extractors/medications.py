@@ -8,7 +8,6 @@ import numpy as np
 
 import pandas as pd
 
-from sutter.lib import postgres
 from sutter.lib.feature_extractor import FeatureExtractor
 
 log = logging.getLogger('feature_extraction')
@@ -79,9 +78,7 @@ class MedicationsExtractor(FeatureExtractor):
               FROM {}.bayes_m_vw_account_medications
         """.format(self._schema)
 
-        engine = postgres.get_connection()
-
-        records = pd.read_sql(query, engine)
+        records = self.read_sql(query)
         log.info('The queried table has %d rows ...' % len(records))
         log.info('... and %d groups.' % len(records.groupby("hsp_acct_study_id")))
 
@@ -94,12 +91,15 @@ class MedicationsExtractor(FeatureExtractor):
         outp_groups = records[(records.ordering_mode_name == 'Outpatient') &
                               (records.order_status_name == 'Sent')].groupby("hsp_acct_study_id")
 
-        # Get dummy columns for pharm_class_name (multiple per patient).
+        # Get dummy columns for pharm_class_name (multiple per patient). The joined names are
+        # cast to object, since they are float if there are no rows (e.g. for a single account).
         med_classes_inp = inp_groups.pharm_class_name \
                                     .apply(lambda m: join_med_names(m, "inp_med_")) \
+                                    .astype(object) \
                                     .str.get_dummies()
         med_classes_outp = outp_groups.pharm_class_name \
                                       .apply(lambda m: join_med_names(m, "outp_med_")) \
+                                      .astype(object) \
                                       .str.get_dummies()
 
         # Get dummy columns for dea_class_code_name (one per patient - just the highest found).
@@ -125,4 +125,5 @@ class MedicationsExtractor(FeatureExtractor):
                          dea_classes_outp.astype('bool')], axis=1)
         res.fillna(False, inplace=True)
 
-        return self.emit_df(res)
+        dummies = [med_classes_inp, med_classes_outp, dea_classes_inp, dea_classes_outp]
+        return self.emit_df(res, missing={col: False for df in dummies for col in df.columns})
@@ -2,9 +2,6 @@
 
 from __future__ import absolute_import
 
-import pandas as pd
-
-from sutter.lib import postgres
 from sutter.lib.feature_extractor import FeatureExtractor
 
 
@@ -27,9 +24,7 @@ class PayerExtractor(FeatureExtractor):
                 FROM {}.bayes_vw_feature_payer
         """.format(self._schema)
 
-        engine = postgres.get_connection()
-
-        res = pd.read_sql(query, engine, index_col='hsp_acct_study_id')
-        # Les than 5 duplicates across all hospitals. Will drop them
-        res = res.groupby(res.index).first()
+        res = self.read_sql(query, index_col='hsp_acct_study_id')
+        # Less than 5 duplicates across all hospitals.
+        res = self.dedupe(res, 'first_non_null')
         return self.emit_df(res)
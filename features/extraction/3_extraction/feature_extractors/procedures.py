@@ -6,7 +6,6 @@ import logging
 
 import pandas as pd
 
-from sutter.lib import postgres
 from sutter.lib.feature_extractor import FeatureExtractor
 
 log = logging.getLogger('feature_extraction')
@@ -30,21 +29,22 @@ class ProceduresExtractor(FeatureExtractor):
               FROM {}.bayes_vw_feature_procedures
         """.format(self._schema)
 
-        engine = postgres.get_connection()
-
-        res = pd.read_sql(query, engine)
+        res = self.read_sql(query)
         log.info('The queried table has %d rows.' % len(res))
 
         df = pd.DataFrame()
         df['num_px'] = res.groupby('hsp_acct_study_id').ccs_category_description.count()
         df.fillna(0, inplace=True)
 
+        # The joined categories are cast to object, since they are float if there are no rows
+        # (e.g. for a single account without procedures).
         categories = res.dropna() \
                         .groupby('hsp_acct_study_id') \
                         .ccs_category_description \
                         .apply(lambda px: "|".join('px_' + p for p in px)) \
+                        .astype(object) \
                         .str.get_dummies()
         df = pd.concat([df, categories.astype('bool')], axis=1)
         df.fillna(False, inplace=True)
 
-        return self.emit_df(df)
+        return self.emit_df(df, missing=dict.fromkeys(categories.columns, False))
@@ -6,7 +6,6 @@ import logging
 
 import pandas as pd
 
-from sutter.lib import postgres
 from sutter.lib.feature_extractor import FeatureExtractor
 from sutter.lib.helper import format_column_title
 
@@ -27,9 +26,7 @@ class ProviderExtractor(FeatureExtractor):
               FROM {}.bayes_vw_feature_provider
         """.format(self._schema)
 
-        engine = postgres.get_connection()
-
-        res = pd.read_sql(query, engine)
+        res = self.read_sql(query)
         log.info('The queried table has %d rows.' % len(res))
 
         pivoted = res.dropna() \
@@ -42,7 +39,7 @@ class ProviderExtractor(FeatureExtractor):
         df[pivoted.columns] = pivoted.astype('bool')
         df.fillna(False, inplace=True)
 
-        return self.emit_df(df)
+        return self.emit_df(df, missing=False)
 
 
 def _rename_columns(specialties):
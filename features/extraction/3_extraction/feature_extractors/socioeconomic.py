@@ -2,11 +2,35 @@
 
 from __future__ import absolute_import
 
+import glob
+import hashlib
+import logging
+import os
+
+import numpy as np
+
 import pandas as pd
 
 from sutter.lib import postgres
 from sutter.lib.feature_extractor import FeatureExtractor
 
+log = logging.getLogger('feature_extraction')
+
+# The identity and modification counters of bayes_census (as in sutter.lib.cache_key): a new
+# table (e.g. dropped and reloaded) has a new relid, and any insert, update or delete changes the
+# counters.
+CENSUS_STATS_QUERY = """
+    SELECT relid, n_tup_ins, n_tup_upd, n_tup_del
+      FROM pg_stat_user_tables
+     WHERE relid = 'bayes_census'::regclass
+"""
+
+
+def _tract_codes(tract_ids):
+    """Convert 11-digit tract ids to int64 codes (-1 where missing)."""
+    codes = pd.to_numeric(pd.Series(tract_ids), errors='coerce')
+    return codes.fillna(-1).values.astype(np.int64)
+
 
 class SocioeconomicExtractor(FeatureExtractor):
     """
@@ -29,8 +53,41 @@ class SocioeconomicExtractor(FeatureExtractor):
     `education`: pct with less than highschool, highschool, college, etc
     `household`: avg houshold income, medican household income, avg houshold size
     `population`: total and density
+
+    The census table is fetched once and cached locally as a float32 block keyed by integer
+    tract code, so that only the tract of each account is queried and the ~100 census columns
+    are joined in memory. The cache file is named after the database and the modification
+    counters of `bayes_census`, so it is rebuilt whenever the table changes.
     """
 
+    cache_path = 'census-cache-{}-{}.npz'
+
+    def _cache_path(self):
+        """Return the path of the census cache for the current contents of bayes_census."""
+        connection = postgres.get_connection()
+        stats = pd.read_sql(CENSUS_STATS_QUERY, connection)
+        version = hashlib.sha256(stats.to_csv(index=False)).hexdigest()[:16]
+        return self.cache_path.format(connection.url.database, version)
+
+    def _load_tract_features(self):
+        """Return (sorted tract codes, float32 feature block, column names) of bayes_census."""
+        cache_path = self._cache_path()
+        if os.path.exists(cache_path):
+            cached = np.load(cache_path)
+            return cached['codes'], cached['values'], list(cached['columns'])
+
+        stale = glob.glob(self.cache_path.format(postgres.get_connection().url.database, '*'))
+        for path in stale:
+            os.remove(path)
+        log.info('caching bayes_census in %s ...' % cache_path)
+        census = self.read_sql("SELECT * FROM bayes_census", partitioned=False)
+        codes = _tract_codes(census.pop('tract_id'))
+        order = np.argsort(codes, kind='mergesort')
+        codes, values = codes[order], census.values[order].astype(np.float32)
+        np.savez(cache_path, codes=codes, values=values,
+                 columns=np.array(list(census.columns), dtype='U'))
+        return codes, values, list(census.columns)
+
     def extract(self):
         query = """
                 SELECT
@@ -38,10 +95,17 @@ class SocioeconomicExtractor(FeatureExtractor):
                 FROM {}.bayes_vw_feature_socioeconomic
         """.format(self._schema)
 
-        engine = postgres.get_connection()
+        res = self.read_sql(query, index_col='hsp_acct_study_id')
+        # Less than 5 duplicates across all hospitals.
+        tracts = pd.to_numeric(res.tract_id, errors='coerce').to_frame()
+        tracts = self.dedupe(tracts, 'first_non_null').tract_id
+
+        codes, values, columns = self._load_tract_features()
+        account_codes = _tract_codes(tracts.values)
+        pos = np.searchsorted(codes, account_codes)
+        found = (pos < len(codes)) & (account_codes >= 0)
+        found[found] = codes[pos[found]] == account_codes[found]
 
-        res = pd.read_sql(query, engine, index_col='hsp_acct_study_id')
-        res.drop(['tract_id'], axis=1, inplace=True)
-        # Les than 5 duplicates across all hospitals. Will drop them
-        res = res.groupby(res.index).first()
-        return self.emit_df(res)
+        features = np.full((len(tracts), len(columns)), np.nan, dtype=np.float32)
+        features[found] = values[pos[found]]
+        return self.emit_df(pd.DataFrame(features, index=tracts.index, columns=columns))
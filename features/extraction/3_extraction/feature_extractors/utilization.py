@@ -6,11 +6,15 @@ import logging
 
 import pandas as pd
 
-from sutter.lib import postgres
 from sutter.lib.feature_extractor import FeatureExtractor
+from sutter.lib.window_counts import count_prior_events
 
 log = logging.getLogger('feature_extraction')
 
+WINDOW_MONTHS = [3, 6, 12]
+# Counted even if none of the patients has a visit of the type (e.g. for a single account).
+ACCOUNT_TYPES = ['Emergency', 'Inpatient', 'Outpatient']
+
 
 class UtilizationExtractor(FeatureExtractor):
     """
@@ -22,28 +26,40 @@ class UtilizationExtractor(FeatureExtractor):
     `er_visits_lace` - LACE score associated with number of ER visits:
                        the greater of number of emergency visits
                        during the 6 month before admission or 4.
+
+    A visit is counted if it ended within the window, before the admission (see
+    sutter.lib.window_counts).
     """
 
     def extract(self):
         query = """
-          SELECT
-            *
-            FROM {}.bayes_vw_feature_utilization
+            SELECT acct.hsp_acct_study_id,
+                   acct.pat_study_id,
+                   acct.adm_date_time
+              FROM hospital_account acct
+                   JOIN {}.bayes_vw_index_admissions
+                   USING (hsp_acct_study_id)
         """.format(self._schema)
+        admissions = self.read_sql(query).set_index('hsp_acct_study_id')
+        log.info('The queried table has %d rows.' % len(admissions))
 
-        engine = postgres.get_connection()
-
-        res = pd.read_sql(query, engine)
-        log.info('The pre-pivot table has %d rows.' % len(res))
+        query = """
+            SELECT pat_study_id,
+                   disch_date_time,
+                   acct_type_name
+              FROM hospital_account
+             WHERE pat_study_id IN ({})
+               AND disch_date_time IS NOT NULL
+        """.format(self.patients_query())
+        visits = self.read_sql(query, partitioned=False)
+        log.info('The patients have %d visits.' % len(visits))
 
-        pivoted = pd.pivot_table(data=res, index='hsp_acct_study_id', columns='pre_adm_type',
-                                 aggfunc=sum, dropna=True, fill_value=0,
-                                 values=['pre_3_month', 'pre_6_month', 'pre_12_month'])
+        windows = [('pre_{}_month'.format(n), pd.DateOffset(months=n)) for n in WINDOW_MONTHS]
+        counts = count_prior_events(admissions, visits, windows, types=ACCOUNT_TYPES)
 
-        df_columns = [top + "_" + bottom.lower() for top, bottom in pivoted.columns.values]
-        df = pd.DataFrame(index=res.hsp_acct_study_id.unique())
-        df[df_columns] = pivoted
-        df.fillna(0, inplace=True)
-        df['er_visits_lace'] = df['pre_6_month_emergency'].apply(lambda cnt: min(cnt, 4))
+        df = pd.DataFrame(index=admissions.index)
+        for (window, adm_type), column in counts.iteritems():
+            df[window + '_' + adm_type.lower()] = column.values
+        df['er_visits_lace'] = df['pre_6_month_emergency'].clip(upper=4)
 
         return self.emit_df(df)
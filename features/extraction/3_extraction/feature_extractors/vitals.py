@@ -2,11 +2,18 @@
 
 from __future__ import absolute_import
 
+import logging
+
 import pandas as pd
 
-from sutter.lib import postgres
+from sutter.lib.asof import latest_in_window, take_latest
 from sutter.lib.feature_extractor import FeatureExtractor
 
+log = logging.getLogger('feature_extraction')
+
+VITALS = ['temperature', 'pulse', 'respirations', 'bp_systolic', 'bp_diastolic',
+          'height', 'weight', 'bmi']
+
 
 class VitalsExtractor(FeatureExtractor):
     """
@@ -14,19 +21,38 @@ class VitalsExtractor(FeatureExtractor):
 
     Vital signs are: temperature, pulse, respiratory rate, blood pressure.
     Also generate features for height (in inches), weight (in lb), and BMI.
+
+    The measurements are those of the last encounter during the stay with a blood pressure,
+    or if there is none, of the last one with a pulse or weight (see sutter.lib.asof). Of the
+    encounters of the same day, the last one (by enc_study_id) is used.
     """
 
     def extract(self):
+        stays = self.read_sql(self.stays_query()).set_index('hsp_acct_study_id')
+        for col in ['adm_date_time', 'disch_date_time']:
+            stays[col] = pd.to_datetime(stays[col]).dt.normalize()
+
+        # Only consider encounters that have some kind of measurements (weight, pulse, and
+        # blood pressure are the most common, but usually appear together).
         query = """
-            SELECT hsp_acct_study_id,
+            SELECT pat_study_id,
+                   contact_date,
                    temperature, pulse, respirations, bp_systolic, bp_diastolic,
-                   height, weight, bmi
-              FROM {}.bayes_m_vw_feature_vitals
-        """.format(self._schema)
-
-        engine = postgres.get_connection()
+                   height, weight, bmi,
+                   (bp_systolic IS NOT NULL) has_bp
+              FROM encounters
+             WHERE pat_study_id IN ({})
+               AND contact_date IS NOT NULL
+               AND (bp_systolic IS NOT NULL OR pulse IS NOT NULL OR weight IS NOT NULL)
+             ORDER BY pat_study_id, contact_date, enc_study_id
+        """.format(self.patients_query())
+        encounters = self.read_sql(query, partitioned=False)
+        log.info('The queried table has %d rows.' % len(encounters))
 
-        res = pd.read_sql(query, engine, index_col='hsp_acct_study_id')
+        # Prioritize encounters that have vitals (e.g. blood pressure) over those that only have
+        # height/weight.
+        pos = latest_in_window(stays, encounters, time='contact_date', priority=['has_bp'])
+        res = take_latest(encounters, pos, stays.index)[VITALS]
 
         res['height_in_inches'] = res.height.apply(_height_to_inches)
         res['weight_in_lb'] = res.weight / 16
@@ -0,0 +1,163 @@
+"""
+An incrementally maintained table of inpatient admissions.
+
+Every view joins the index admissions, whose admit and discharge times are aggregated over all
+`hospital_encounters` of each account. Rather than re-aggregating the whole population on every
+render, the aggregate is stored in the indexed ADMISSIONS_TABLE, one row per inpatient account
+with the account columns that the views filter on:
+
+    - `create_admissions_table` builds it from scratch, and installs triggers on
+      `hospital_account` and `hospital_encounters` that queue the accounts whose rows are
+      inserted, updated or deleted in QUEUE_TABLE.
+    - `refresh_admissions` (or `SELECT bayes_refresh_admissions()`) re-aggregates only the
+      queued accounts. `sutter.lib.views` runs it before (re-)creating the views.
+
+The triggers don't fire on TRUNCATE, nor survive re-creating the source tables, so
+`create_admissions_table` must be re-run whenever they are reloaded.
+"""
+
+import logging
+
+from sutter.lib import postgres
+
+log = logging.getLogger('sutter.lib.admissions')
+
+ADMISSIONS_TABLE = 'bayes_inpatient_admissions'
+QUEUE_TABLE = 'bayes_inpatient_admissions_queue'
+SOURCE_TABLES = ['hospital_account', 'hospital_encounters']
+INDEX_COLUMNS = ['pat_study_id', 'discharge_date_time']
+
+# {0} restricts the accounts to aggregate.
+ADMISSIONS_SQL = """
+SELECT acct.hsp_acct_study_id,
+       acct.pat_study_id,
+       acct.acct_type_name,
+       acct.patient_status_name,
+       acct.admission_type_name,
+       acct.admission_source_name,
+       acct.loc_name,
+       MIN(enc.hosp_admsn_time) AS admit_date_time,
+       MAX(enc.hosp_disch_time) AS discharge_date_time
+  FROM hospital_account acct
+  LEFT JOIN hospital_encounters enc USING (hsp_acct_study_id)
+ WHERE acct.acct_type_name = 'Inpatient' {0}
+ GROUP BY acct.hsp_acct_study_id, acct.pat_study_id, acct.acct_type_name,
+          acct.patient_status_name, acct.admission_type_name, acct.admission_source_name,
+          acct.loc_name
+"""
+
+ENQUEUE_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION bayes_enqueue_admission() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO {0} VALUES (OLD.hsp_acct_study_id);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {0} VALUES (NEW.hsp_acct_study_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""".format(QUEUE_TABLE)
+
+TRIGGER_SQL = """
+CREATE TRIGGER {0}_enqueue_admission
+ AFTER INSERT OR UPDATE OR DELETE ON {0}
+   FOR EACH ROW EXECUTE PROCEDURE bayes_enqueue_admission()
+"""
+
+# Accounts queued while the refresh runs aren't deleted from the queue (they aren't in its
+# snapshot), so they are picked up by the next refresh.
+REFRESH_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION bayes_refresh_admissions() RETURNS BIGINT AS $$
+DECLARE
+    n_accounts BIGINT;
+BEGIN
+    DROP TABLE IF EXISTS bayes_refreshed_accounts;
+    CREATE TEMPORARY TABLE bayes_refreshed_accounts (hsp_acct_study_id BIGINT);
+      WITH queued AS (DELETE FROM {queue} RETURNING hsp_acct_study_id)
+    INSERT INTO bayes_refreshed_accounts
+    SELECT DISTINCT hsp_acct_study_id FROM queued;
+
+    DELETE FROM {table}
+     USING bayes_refreshed_accounts refreshed
+     WHERE {table}.hsp_acct_study_id = refreshed.hsp_acct_study_id;
+    INSERT INTO {table} {select};
+
+    SELECT count(*) INTO n_accounts FROM bayes_refreshed_accounts;
+    DROP TABLE bayes_refreshed_accounts;
+    RETURN n_accounts;
+END;
+$$ LANGUAGE plpgsql
+""".format(queue=QUEUE_TABLE, table=ADMISSIONS_TABLE, select=ADMISSIONS_SQL.format(
+    'AND acct.hsp_acct_study_id IN (SELECT hsp_acct_study_id FROM bayes_refreshed_accounts)'))
+
+
+def create_admissions_table(connection):
+    """
+    (Re-)build ADMISSIONS_TABLE from scratch, and install the triggers that keep it up to date.
+
+    If the table already exists, it is emptied and refilled rather than dropped, so that the
+    views built on it survive.
+
+    Runs in a transaction (see `postgres.transaction`), so that a failure leaves the previous
+    table and triggers in place.
+
+    :param connection: SQLAlchemy engine or connection (e.g. `op.get_bind()` in a migration).
+    """
+    with postgres.transaction(connection) as conn:
+        _drop_triggers(conn)
+
+        exists = conn.execute("SELECT count(*) FROM pg_tables WHERE tablename = '{}'".format(
+            ADMISSIONS_TABLE)).scalar()
+        if exists:
+            log.info('refilling %s ...' % ADMISSIONS_TABLE)
+            conn.execute("TRUNCATE {}".format(ADMISSIONS_TABLE))
+            conn.execute("INSERT INTO {} {}".format(ADMISSIONS_TABLE, ADMISSIONS_SQL.format('')))
+        else:
+            log.info('creating %s ...' % ADMISSIONS_TABLE)
+            conn.execute("CREATE TABLE {} AS {}".format(ADMISSIONS_TABLE,
+                                                        ADMISSIONS_SQL.format('')))
+            conn.execute("ALTER TABLE {} ADD PRIMARY KEY (hsp_acct_study_id)".format(
+                ADMISSIONS_TABLE))
+            for col in INDEX_COLUMNS:
+                conn.execute("CREATE INDEX {0}_{1} ON {0} ({1})".format(ADMISSIONS_TABLE, col))
+        conn.execute("ANALYZE {}".format(ADMISSIONS_TABLE))
+
+        conn.execute("CREATE TABLE {} (hsp_acct_study_id BIGINT)".format(QUEUE_TABLE))
+        conn.execute(ENQUEUE_FUNCTION_SQL)
+        conn.execute(REFRESH_FUNCTION_SQL)
+        for table_name in SOURCE_TABLES:
+            conn.execute(TRIGGER_SQL.format(table_name))
+
+
+def refresh_admissions(connection):
+    """
+    Re-aggregate the admissions of the accounts changed since the last refresh.
+
+    The refresh runs in a transaction, since the engine wouldn't commit the changes made by a
+    `SELECT`.
+
+    :param connection: SQLAlchemy engine or connection.
+    :returns: the number of accounts refreshed.
+    """
+    with postgres.transaction(connection) as conn:
+        n_accounts = conn.execute("SELECT bayes_refresh_admissions()").scalar()
+    log.info('refreshed the admissions of %d accounts' % n_accounts)
+    return n_accounts
+
+
+def _drop_triggers(connection):
+    for table_name in SOURCE_TABLES:
+        connection.execute("DROP TRIGGER IF EXISTS {0}_enqueue_admission ON {0}".format(
+            table_name))
+    connection.execute("DROP FUNCTION IF EXISTS bayes_enqueue_admission()")
+    connection.execute("DROP FUNCTION IF EXISTS bayes_refresh_admissions()")
+    connection.execute("DROP TABLE IF EXISTS {}".format(QUEUE_TABLE))
+
+
+def drop_admissions_table(connection):
+    """Undo `create_admissions_table` (dropping the views built on it too)."""
+    with postgres.transaction(connection) as conn:
+        _drop_triggers(conn)
+        conn.execute("DROP TABLE IF EXISTS {} CASCADE".format(ADMISSIONS_TABLE))
@@ -0,0 +1,115 @@
+"""
+Find the latest event of each account's window (e.g. its stay), by binary search.
+
+The "latest value during the stay" views join every account with every event of its patient,
+then keep one row per account with `DISTINCT ON (hsp_acct_study_id) ... ORDER BY <priority>
+DESC, contact_date DESC`. Here, the events are sorted once by (priority tier, key, time), and
+each window's latest event of a tier is found with two `searchsorted` calls:
+
+    pos = latest_in_window(admissions, encounters, time='contact_date', priority=['has_bp'])
+    vitals = take_latest(encounters, pos, admissions.index)  # one row per admission
+
+Tiers are the distinct values of the `priority` columns, tried from the largest (as in
+`ORDER BY has_bp DESC`): an account only gets an event of a lower tier if it has none of a
+higher tier in its window. Windows are inclusive on both ends; truncate the window bounds
+(e.g. with `dt.normalize()`) to compare datetimes with dates.
+"""
+
+import numpy as np
+
+import pandas as pd
+
+from sutter.lib.segments import nanoseconds
+
+
+def _codes(windows, events, key):
+    """Encode the `key` columns of both frames as dense int codes (-1 if any is null)."""
+    keys = [key] if isinstance(key, basestring) else list(key)
+    n = len(windows)
+    codes = np.zeros(n + len(events), dtype=np.int64)
+    for col in keys:
+        values = np.concatenate([windows[col].values, events[col].values])
+        col_codes, uniques = pd.factorize(values)
+        codes = np.where((codes < 0) | (col_codes < 0), -1, codes * len(uniques) + col_codes)
+        # Keep the combined codes dense, so that they can't overflow.
+        valid = codes >= 0
+        codes[valid] = pd.factorize(codes[valid])[0]
+    return codes[:n], codes[n:]
+
+
+def _tiers(events, priority):
+    """Return the tier of each event (0 for the largest priority values, -1 for nulls)."""
+    tiers = np.zeros(len(events), dtype=np.int64)
+    for col in priority or []:
+        col_codes, uniques = pd.factorize(events[col].values, sort=True)
+        descending = np.where(col_codes < 0, -1, len(uniques) - 1 - col_codes)
+        tiers = np.where((tiers < 0) | (descending < 0), -1, tiers * len(uniques) + descending)
+        valid = tiers >= 0
+        tiers[valid] = pd.factorize(tiers[valid], sort=True)[0]
+    return tiers
+
+
+def latest_in_window(windows, events, key='pat_study_id', start='adm_date_time',
+                     end='disch_date_time', time='contact_date', priority=None):
+    """
+    Find the latest event of each window, among those of its highest priority tier.
+
+    :param windows: DataFrame with `key`, `start` and `end` columns (e.g. the index admissions).
+        Set `start` to None for windows without a lower bound.
+    :param events: DataFrame with `key`, `time` and `priority` columns (e.g. encounters). It
+        only needs to hold the events that qualify.
+    :param key: column, or list of columns, that events must share with their window.
+    :param priority: list of columns to prefer the largest values of, in order, before the
+        latest time (e.g. ['has_bp']). Events with a null priority are ignored.
+    :returns: an int64 array of the position in `events` of each window's event, or -1 if it
+        has none. Ties are resolved in favor of the event that comes last in `events`.
+    """
+    window_key, event_key = _codes(windows, events, key)
+    n_keys = np.concatenate([window_key, event_key, [0]]).max() + 1
+    tiers = _tiers(events, priority)
+    n_tiers = np.concatenate([tiers, [0]]).max() + 1
+
+    event_ns, valid = nanoseconds(events[time])
+    valid &= (event_key >= 0) & (tiers >= 0)
+    end_ns, window_valid = nanoseconds(windows[end])
+    window_valid &= window_key >= 0
+    if start is None:
+        start_ns = np.full(len(windows), np.iinfo(np.int64).min, dtype=np.int64)
+    else:
+        start_ns, start_valid = nanoseconds(windows[start])
+        window_valid &= start_valid
+
+    # (tier, key, time) triples are encoded as int64 keys that sort like the triples: times as
+    # their rank among all the times involved.
+    candidates = np.flatnonzero(valid)
+    times, ranks = np.unique(np.concatenate([event_ns[candidates], start_ns, end_ns]),
+                             return_inverse=True)
+    n_times = len(times)
+    event_rank = ranks[:len(candidates)]
+    start_rank = ranks[len(candidates):len(candidates) + len(windows)]
+    end_rank = ranks[len(candidates) + len(windows):]
+
+    event_keys = (tiers[candidates] * n_keys + event_key[candidates]) * n_times + event_rank
+    order = np.argsort(event_keys, kind='mergesort')
+    event_keys, candidates = event_keys[order], candidates[order]
+
+    found = np.full(len(windows), -1, dtype=np.int64)
+    for tier in range(n_tiers):
+        tier_keys = (tier * n_keys + window_key) * n_times
+        lo = np.searchsorted(event_keys, tier_keys + start_rank)
+        hi = np.searchsorted(event_keys, tier_keys + end_rank, side='right')
+        hit = window_valid & (found < 0) & (hi > lo)
+        found[hit] = candidates[hi[hit] - 1]
+    return found
+
+
+def take_latest(events, pos, index):
+    """
+    Return the rows of `events` at the positions `pos` found by `latest_in_window`.
+
+    :param index: the index of the result (e.g. the index of the windows).
+    :returns: a DataFrame with the columns of `events`, all missing for windows without event.
+    """
+    rows = events.reset_index(drop=True).reindex(pos)
+    rows.index = index
+    return rows
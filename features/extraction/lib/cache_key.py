@@ -0,0 +1,168 @@
+"""
+Content-addressed cache keys for feature extractors.
+
+The results of an extractor only depend on its code, the SQL of the views it reads and the data
+in the underlying tables, so the databuilder cache is keyed by:
+
+    - `source_key`: SHA-256 over the source of the extractor's module, the source of every
+      `sutter.lib` module it (transitively) uses (e.g. `find_cci` in helper.py), the resolved
+      SQL of every view it (transitively) reads, and the target schema.
+    - `data_version`: SHA-256 over the insert/update/delete counters (from
+      `pg_stat_user_tables`) of the tables and materialized views that these sources and this
+      SQL refer to.
+
+A cached result is reused only if both keys match, so editing a view file, a shared helper or
+reloading a table invalidates exactly the extractors that depend on it.
+"""
+
+import glob
+import hashlib
+import inspect
+import os
+import re
+import sys
+import types
+
+import pandas as pd
+
+from sutter.lib import postgres
+from sutter.lib.feature_categorizers import render_categories
+from sutter.lib.helper import get_path
+from sutter.lib.views import DEFAULT_SCHEMA, _filename_to_viewname
+
+LIB_PACKAGE = 'sutter.lib'
+VIEW_NAME = re.compile(r'\bbayes_(?:m_)?vw_\w+')
+IDENTIFIER = re.compile(r'\b[a-z_][a-z0-9_]*\b')
+
+TABLE_STATS_QUERY = """
+    SELECT schemaname, relname, n_tup_ins, n_tup_upd, n_tup_del
+      FROM pg_stat_user_tables
+     ORDER BY schemaname, relname
+"""
+
+
+def _view_dirs():
+    """Return the directories holding view files: the deployed `views` and the repo's."""
+    dirs = ['views', os.path.join(get_path(), 'extraction', '2_views')]
+    return [d for d in dirs if os.path.isdir(d)]
+
+
+def view_files(schema=DEFAULT_SCHEMA):
+    """
+    Return a dict of {view name: path of its SQL file}, as `sutter.lib.views` would deploy them.
+
+    Schema-specific overrides (`<views dir>/<schema>/*.sql`) take precedence.
+    """
+    files = {}
+    for directory in reversed(_view_dirs()):
+        for subdir, prefix in [('', 'bayes_'), ('materialized', 'bayes_m_')]:
+            for path in glob.glob(os.path.join(directory, subdir, '*.sql')):
+                override = os.path.join(directory, schema, os.path.basename(path))
+                if os.path.exists(override):
+                    path = override
+                files[_filename_to_viewname(path, prefix)] = path
+    return files
+
+
+def _referenced_views(text, files):
+    """Return the views (transitively) referenced by `text`, as {view name: SQL}."""
+    found = {}
+    pending = set(VIEW_NAME.findall(text))
+    while pending:
+        name = pending.pop()
+        if name in found or name not in files:
+            continue
+        with open(files[name]) as f:
+            found[name] = render_categories(f.read())
+        pending.update(VIEW_NAME.findall(found[name]))
+    return found
+
+
+def _lib_modules(module):
+    """Return the `sutter.lib` modules that `module` (transitively) uses, by name."""
+    found = {}
+    pending = [module]
+    while pending:
+        for value in vars(pending.pop()).values():
+            if isinstance(value, types.ModuleType):
+                name = value.__name__
+            else:
+                name = getattr(value, '__module__', None)
+            if isinstance(name, basestring) and name.startswith(LIB_PACKAGE) and \
+                    name not in found and name in sys.modules:
+                found[name] = sys.modules[name]
+                pending.append(found[name])
+    return found
+
+
+def _module_source(module):
+    try:
+        return inspect.getsource(module)
+    except (IOError, TypeError):
+        # No source available (e.g. only the .pyc was deployed): fall back to the module name.
+        return module.__name__
+
+
+def extractor_sql(extractor):
+    """
+    Return the sources and the SQL that the extractor's results depend on.
+
+    :returns: (source of the extractor's module, {name: source} of the `sutter.lib` modules it
+        uses, {view name: SQL} of the views that any of them reads).
+    """
+    schema = getattr(extractor, '_schema', DEFAULT_SCHEMA)
+    module = sys.modules[extractor.__class__.__module__]
+    source = _module_source(module)
+    lib_sources = {name: _module_source(lib_module)
+                   for name, lib_module in _lib_modules(module).iteritems()}
+    # Helpers such as FeatureExtractor.stays_query read views of their own.
+    views = _referenced_views('\n'.join([source] + lib_sources.values()), view_files(schema))
+    return source, lib_sources, views
+
+
+def source_key(extractor):
+    """
+    Return the SHA-256 hex digest of everything that defines the extractor's results.
+
+    :param extractor: a feature extractor (only its class and `_schema` are used).
+    """
+    source, lib_sources, views = extractor_sql(extractor)
+
+    sha = hashlib.sha256()
+    sha.update('schema:{}\n'.format(getattr(extractor, '_schema', DEFAULT_SCHEMA)))
+    sha.update('class:{}\n'.format(extractor.__class__.__name__))
+    sha.update(source)
+    for name, lib_source in sorted(lib_sources.iteritems()):
+        sha.update('module:{}\n'.format(name))
+        sha.update(lib_source)
+    for name, sql in sorted(views.iteritems()):
+        sha.update('view:{}\n'.format(name))
+        sha.update(sql)
+    return sha.hexdigest()
+
+
+def table_stats(engine=None):
+    """Return the modification counters of every table and materialized view in the database."""
+    return pd.read_sql(TABLE_STATS_QUERY, engine or postgres.get_connection())
+
+
+def data_version(extractor, stats):
+    """
+    Return the SHA-256 hex digest of the modification counters of the tables the extractor reads.
+
+    Views don't have counters of their own, so the tables and materialized views referenced by
+    the extractor, the `sutter.lib` modules it uses and their views are looked up (by name) in
+    `stats`.
+
+    :param stats: result of `table_stats`, fetched once per run.
+    """
+    source, lib_sources, views = extractor_sql(extractor)
+    identifiers = set()
+    for text in [source] + lib_sources.values() + views.values():
+        identifiers.update(IDENTIFIER.findall(text.lower()))
+
+    used = stats[stats.relname.isin(identifiers)]
+    sha = hashlib.sha256()
+    for row in used.itertuples(index=False):
+        sha.update('{}.{}:{}:{}:{}\n'.format(*row))
+    return sha.hexdigest()
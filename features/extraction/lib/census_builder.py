@@ -6,38 +6,117 @@ import json
 import os
 import sys
 
+import numpy as np
+
 import pandas as pd
 
+import scipy.sparse as sp
+
 from sutter.lib.helper import get_path
 
+INDEX_COL = 'Geo_FIPS'
 
-def build_census_dataset(inputfile, outputfile, field_dict, export=True):
+
+def compile_field_dict(col_dict):
     """
-    Given a CSV input file and a field-mapping JSON dict, build a census dataset.
+    Compile a field-mapping dict into a sparse aggregation matrix.
 
-    Map the column names using the field mapping, and do other processing tasks.
+    Each output column `<col_type>__<col_bin>` is the sum of the input columns listed for it
+    (or a copy of a single input column), so the whole mapping is one matrix product.
+
+    :returns: (input column names, output column names, matrix of shape (n_outputs, n_inputs),
+        boolean array flagging the outputs that copy a single input column).
     """
+    input_cols, output_cols, rows, cols, single = [], [], [], [], []
+    input_index = {}
+    for col_type, cat_cols in col_dict.iteritems():
+        for col_bin, col_title in cat_cols.iteritems():
+            titles = col_title if type(col_title) == list else [col_title]
+            for title in titles:
+                if title not in input_index:
+                    input_index[title] = len(input_cols)
+                    input_cols.append(title)
+                rows.append(len(output_cols))
+                cols.append(input_index[title])
+            single.append(type(col_title) != list)
+            output_cols.append('__'.join([col_type, col_bin]))
+
+    matrix = sp.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                           shape=(len(output_cols), len(input_cols)))
+    return input_cols, output_cols, matrix, np.array(single, dtype=bool)
+
+
+def iter_census_chunks(inputfile, col_dict, chunksize=100000, dtype=np.float64):
+    """
+    Yield the mapped census dataset in chunks of `chunksize` rows.
+
+    Only the input columns used by the mapping are parsed. As with `DataFrame.sum`, missing
+    values count as 0 in summed columns, while copied columns keep them missing.
+    """
+    input_cols, output_cols, matrix, single = compile_field_dict(col_dict)
+    # Input column feeding each single-column output.
+    single_sources = matrix[single].indices
+
+    usecols = set([INDEX_COL] + input_cols)
+
     with open(inputfile, 'r') as f:
-        df = pd.read_csv(f, index_col='Geo_FIPS')
-    census = pd.DataFrame(index=df.index)
+        for df in pd.read_csv(f, index_col=INDEX_COL, usecols=lambda col: col in usecols,
+                              chunksize=chunksize):
+            values = df[input_cols].values.astype(np.float64)
+            missing = np.isnan(values)
+            values[missing] = 0
+            mapped = matrix.dot(values.T).T
+            mapped[:, single] = np.where(missing[:, single_sources], np.nan, mapped[:, single])
+            yield pd.DataFrame(mapped.astype(dtype), index=df.index, columns=output_cols)
 
+
+def _write_parquet(chunks, output_path):
+    """Write DataFrame chunks to a single parquet file (requires pyarrow)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=True)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def build_census_dataset(inputfile, outputfile, field_dict, export=True, chunksize=100000,
+                         dtype=np.float64):
+    """
+    Given a CSV input file and a field-mapping JSON dict, build a census dataset.
+
+    Map the column names using the field mapping, and do other processing tasks. The input is
+    streamed in chunks, so tables larger than memory (e.g. nationwide or multi-year) can be
+    processed when exporting.
+
+    :param outputfile: output file name, under data/census. Written as parquet if it ends with
+        '.parquet' (requires pyarrow), and as CSV otherwise.
+    :param export: if False, don't write anything and return the whole dataset instead.
+    :param dtype: type of the output columns (e.g. np.float32 to halve the output size).
+    :returns: the dataset if `export` is False. When exporting, nothing is returned (the
+        dataset is never held in memory as a whole); read the output file instead.
+    """
     with open(field_dict, 'r') as f:
         col_dict = json.load(f)
+    chunks = iter_census_chunks(inputfile, col_dict, chunksize, dtype)
 
-    for col_type, cat_cols in col_dict.iteritems():
-        for col_bin, col_title in cat_cols.iteritems():
-            final_col_name = '__'.join([col_type, col_bin])
-            if type(col_title) == list:
-                census[final_col_name] = df[col_title].sum(axis=1)
-            else:
-                census[final_col_name] = df[col_title]
-
-    if export:
-        output_path = os.path.join(get_path(), 'data', 'census', outputfile)
-        with open(output_path, 'w') as outfile:
-            census.to_csv(outfile)
+    if not export:
+        return pd.concat(chunks)
 
-    return census
+    output_path = os.path.join(get_path(), 'data', 'census', outputfile)
+    if output_path.endswith('.parquet'):
+        _write_parquet(chunks, output_path)
+    else:
+        with open(output_path, 'w') as outfile:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(outfile, header=(i == 0))
 
 
 if __name__ == '__main__':
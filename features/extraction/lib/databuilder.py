@@ -3,9 +3,12 @@
 from __future__ import absolute_import
 
 import inspect
+import json
 import logging
 import os
-from collections import defaultdict
+import time
+from collections import OrderedDict, defaultdict
+from functools import partial
 
 try:
     import cPickle as pickle
@@ -14,11 +17,71 @@ except:
 
 import pandas as pd
 
+from sutter.lib import cache_key
+from sutter.lib.dtypes import compact_dtypes
 from sutter.lib.helper import recursive_update
+from sutter.lib.postgres import run_concurrently
+from sutter.lib.profiling import ExtractorProfile, peak_rss_mb, profile_extractor, write_run_report
+
+try:
+    import pyarrow  # noqa: F401 (only needed by pandas' parquet support)
+    PARTITION_FORMAT = 'parquet'
+except ImportError:
+    PARTITION_FORMAT = 'csv'
+
+# Written by `run_partitioned` next to the partitions: the missing value of each feature.
+PARTITION_META_FILE = 'meta.json'
 
 log = logging.getLogger('sutter.lib.databuilder')
 
 
+def reset_extractor(extractor):
+    """Clear the results of a previous run from a feature extractor."""
+    extractor._data_store = defaultdict(dict)
+    extractor._debug_store = defaultdict(dict)
+    extractor._meta_store = defaultdict(dict)
+
+
+def write_partition(features, output_dir, name):
+    """Write one partition of the feature matrix, as parquet if pyarrow is installed."""
+    path = os.path.join(output_dir, '{}.{}'.format(name, PARTITION_FORMAT))
+    if PARTITION_FORMAT == 'parquet':
+        features.to_parquet(path)
+    else:
+        features.to_csv(path)
+    return path
+
+
+def load_partitioned_features(output_dir, columns=None):
+    """
+    Load and concatenate the partitions written by `DatabuilderFramework.run_partitioned`.
+
+    Partitions may have different columns (e.g. dummy columns only appear in the partitions
+    that have them): the result has the union of their columns, and the cells of the columns
+    that a partition doesn't have are filled with the feature's missing value, as if the whole
+    population had been extracted at once.
+
+    :param columns: if given, return only these columns (in this order).
+    """
+    frames, missing = [], {}
+    for fname in sorted(os.listdir(output_dir)):
+        path = os.path.join(output_dir, fname)
+        if fname.endswith('.parquet'):
+            frames.append(pd.read_parquet(path))
+        elif fname.endswith('.csv'):
+            frames.append(pd.read_csv(path, index_col=0))
+        elif fname == PARTITION_META_FILE:
+            with open(path) as f:
+                missing = json.load(f)['missing']
+    features = pd.concat(frames, sort=False)
+    features.fillna(missing, inplace=True)
+    # (e.g. boolean columns that some partitions lack are object columns until filled)
+    features = compact_dtypes(features.infer_objects())
+    if columns is not None:
+        features = features.reindex(columns=columns)
+    return features
+
+
 class MetaInconsistentException(Exception):
     """
     This exception is thrown when someone tries to set the meta variables for a row inconsistently.
@@ -50,19 +113,33 @@ class FeatureExtractor(object):
         """Override this function."""
         raise NotImplementedError
 
-    def emit_df(self, df):
+    def emit_df(self, df, missing=None):
         """
-        Emit all cells in a DataFrame of extracted features.
+        Emit all cells in a DataFrame of extracted features (as `emit` would, one row at a time).
 
         If in testing mode, only emit a subset of columns.
+
+        :param missing: the missing value of the columns (see `emit`), either one for every
+            column or a dict of {column: missing value}.
         """
         columns = df.columns
         if self._test_column_subset:
             columns = df.columns[:(self._test_column_subset)]
 
-        for feature in columns:
-            for hsp_acct_study_id, value in df[feature].iteritems():
-                self.emit(hsp_acct_study_id, feature, value)
+        df = df[columns]
+        if not df.index.is_unique:
+            df = df[~df.index.duplicated(keep='last')]  # later cells overwrite earlier ones
+        df.columns = [self.prefix + '__' + str(feature) for feature in columns]
+
+        for row_id, values in df.to_dict(orient='index').iteritems():
+            self._data_store[str(row_id)].update(values)
+        for feature, feature_id in zip(columns, df.columns):
+            value = missing.get(feature) if isinstance(missing, dict) else missing
+            meta = self._meta_store[feature_id]
+            if meta and meta['missing'] != value:
+                msg = "All rows must have the same missing value"
+                raise MetaInconsistentException(msg)
+            meta['missing'] = value
 
     def emit(self, row_id, feature_id, value, missing=None, debug=None):
         """
@@ -93,14 +170,26 @@ class FeatureExtractor(object):
 class DatabuilderFramework(object):
     """Represents a set of feature extractors that can be run and cached."""
 
-    def __init__(self, load_state=True):
+    def __init__(self, load_state=True, report_path=None, profile_dir=None, profiler='cprofile',
+                 feature_store=None):
         """
         Instantiate a DatabuilderFramework.
 
         Set load_state=False in tests to save a few minutes of unpickling time.
+
+        If `report_path` is given, a JSON report with per-extractor timings (see
+        :mod:`sutter.lib.profiling`) is written there after each run. If `profile_dir` is given,
+        a `profiler` ('cprofile' or 'pyinstrument') dump is written there for each extractor run.
+        If a :class:`sutter.lib.feature_store.FeatureStore` is given, the results of every
+        extractor run (but not cache hits) are also written to it.
         """
         self.feature_extractors_ = []
         self.cache_path = 'databuilder-cache.pckl'
+        self.report_path = report_path
+        self.profile_dir = profile_dir
+        self.profiler = profiler
+        self.feature_store = feature_store
+        self.missing_values_ = {}
         if load_state and os.path.exists(self.cache_path):
             log.info('loading state from %s ...' % self.cache_path)
             self._cache = pickle.load(open(self.cache_path))
@@ -111,39 +200,125 @@ class DatabuilderFramework(object):
         """Add a feature extractor to be run."""
         self.feature_extractors_.append(feature_extractor)
 
-    def run(self, dataset_path, debug_path=None):
+    def run(self, dataset_path, debug_path=None, use_cache=True):
         """Run the feature extractor framework, saving results to the given path."""
-        features, debug = self.generate_features(self.feature_extractors_)
+        features, debug = self.generate_features(self.feature_extractors_, use_cache=use_cache)
 
         features.to_csv(dataset_path)
         if debug_path is not None:
             debug.to_csv(debug_path)
 
-    def generate_features(self, feature_extractors):
+    def run_partitioned(self, output_dir, partitions):
+        """
+        Run the feature extractors one range of accounts at a time, writing one file per range.
+
+        Peak memory is bounded by the largest partition rather than by the whole population.
+        Every extractor must support `set_account_range(lo, hi)`. The cache is bypassed, since
+        it holds the results of whole-population runs.
+
+        Note that dummy columns only appear in the partitions that have them, so partitions may
+        have different columns. The missing value of each feature is written to a `meta.json`
+        file, so that `load_partitioned_features` can fill the columns that a partition lacks.
+        Values imputed from a statistic of the population (e.g. the median vitals) are imputed
+        from that of the partition instead.
+
+        :param output_dir: directory to write `part-<lo>-<hi>.parquet` (or `.csv`) files to.
+        :param partitions: iterable of (lo, hi) ranges of hsp_acct_study_id, `hi` exclusive.
+        :returns: the list of paths written.
+        """
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        report_path, paths, missing = self.report_path, [], {}
+        try:
+            for lo, hi in partitions:
+                name = 'part-{}-{}'.format(lo, hi)
+                log.info('extracting partition %s ...' % name)
+                if report_path is not None:
+                    base, ext = os.path.splitext(report_path)
+                    self.report_path = '{}.{}{}'.format(base, name, ext)
+                for extractor in self.feature_extractors_:
+                    reset_extractor(extractor)
+                    extractor.set_account_range(lo, hi)
+
+                features, _ = self.generate_features(self.feature_extractors_, use_cache=False)
+                paths.append(write_partition(features, output_dir, name))
+                del features
+
+                missing.update(self.missing_values_)
+                with open(os.path.join(output_dir, PARTITION_META_FILE), 'w') as f:
+                    json.dump({'missing': missing}, f, indent=2, sort_keys=True)
+        finally:
+            self.report_path = report_path
+            for extractor in self.feature_extractors_:
+                extractor.set_account_range(None, None)
+        return paths
+
+    def _extract(self, extractor, profile, info_str):
+        """Run a single feature extractor, recording its timings in `profile`."""
+        log.info('running: ' + info_str)
+        extractor.profile = profile
+        with profile.timed('extract_time'), \
+                profile_extractor(extractor.name, self.profile_dir, self.profiler):
+            extractor.extract()
+        profile.peak_rss_mb = peak_rss_mb()
+
+    def generate_features(self, feature_extractors, use_cache=True, n_threads=1):
         """
         Run all feature extractors, dump results, and return as a DataFrame.
 
+        The features are converted to compact dtypes once assembled (see sutter.lib.dtypes).
+
         :param feature_extractors: iterable of :class:`FeatureExtractor`
             objects.
+        :param use_cache: set to False to neither read from nor write to the cache. Cached
+            results are reused only if the extractor's code, views and input tables haven't
+            changed since (see :mod:`sutter.lib.cache_key`).
+        :param n_threads: run this many extractors at once. Extractors mostly wait on the
+            database, so this helps when their queries are small (e.g. a single account).
         """
         results, debug, meta = {}, {}, {}
+        profiles, cached_extractors = [], []
+        to_run = OrderedDict()
         n_ext = len(feature_extractors)
+        stats = cache_key.table_stats() if use_cache else None
 
         for i, extractor in enumerate(feature_extractors):
             info_str = "'{}' ({}/{})".format(extractor.name, i + 1, n_ext)
-            cached_extractor = self._cache[extractor.name]
-            if cached_extractor and extractor.hash == cached_extractor.hash:
+            profile = ExtractorProfile(extractor.name)
+            extractor.hash = cache_key.source_key(extractor)
+            cached_extractor = None
+            if use_cache:
+                extractor.data_version = cache_key.data_version(extractor, stats)
+                cached_extractor = self._cache[extractor.name]
+            if cached_extractor and extractor.hash == cached_extractor.hash and \
+                    extractor.data_version == getattr(cached_extractor, 'data_version', None):
                 log.info('from cache: ' + info_str)
+                profile.cache = 'hit'
+                profile.peak_rss_mb = peak_rss_mb()
+            else:
+                profile.cache = 'miss'
+                cached_extractor = None
+                to_run[i] = partial(self._extract, extractor, profile, info_str)
+            profiles.append(profile)
+            cached_extractors.append(cached_extractor)
+
+        run_concurrently(to_run, n_threads)
+
+        for extractor, cached_extractor in zip(feature_extractors, cached_extractors):
+            if cached_extractor is not None:
                 recursive_update(results, cached_extractor._data_store)
                 recursive_update(meta, cached_extractor._meta_store)
             else:
-                log.info('running: ' + info_str)
-                extractor.extract()
+                if self.feature_store is not None:
+                    self.feature_store.write(extractor)
                 recursive_update(results, extractor._data_store)
                 recursive_update(meta, extractor._meta_store)
-                self._cache[extractor.name] = extractor
+                if use_cache:
+                    self._cache[extractor.name] = extractor
 
         log.info('extraction complete, assembling dataframe ...')
+        assemble_start = time.time()
         features = pd.DataFrame.from_dict(results, orient='index')
         debug = pd.DataFrame.from_dict(debug, orient='index')
         features.index.name = 'hsp_acct_study_id'
@@ -152,9 +327,19 @@ class DatabuilderFramework(object):
         fill_vals = {k: v["missing"] for (k, v) in meta.items()
                      if v["missing"] is not None}
         features.fillna(fill_vals, inplace=True)
-
-        log.info('writing state to %s ...' % self.cache_path)
-        with open(self.cache_path, 'wb') as f:
-            pickle.dump(self._cache, f)
+        self.missing_values_ = fill_vals
+        features = compact_dtypes(features)
+        assemble_time = time.time() - assemble_start
+
+        if self.report_path is not None:
+            write_run_report(self.report_path, profiles,
+                             assemble_time=round(assemble_time, 3),
+                             num_rows=features.shape[0],
+                             num_columns=features.shape[1])
+
+        if use_cache:
+            log.info('writing state to %s ...' % self.cache_path)
+            with open(self.cache_path, 'wb') as f:
+                pickle.dump(self._cache, f)
 
         return features, debug
@@ -0,0 +1,119 @@
+"""
+Drop duplicate accounts from an extractor's input, with a declared rule.
+
+Some views return more than one row for a handful of accounts. `groupby(level=0).first()`
+hashes every row of the frame, and picks whatever row the database happened to return first.
+Instead, `dedupe` checks for duplicates on the sorted index (a single comparison of adjacent
+keys), and only the rows of duplicated accounts are ever looked at again:
+
+    res = dedupe(res, 'latest', order_by=['discharge_date_time'])
+
+Rules:
+    - 'first': the first row of each account.
+    - 'latest': the last row of each account, in `order_by` order.
+    - 'first_non_null': for each column, the first non-null value of each account (what
+      `groupby(...).first()` computes).
+    - 'aggregate': for each column of `aggregations`, the 'min', 'max' or 'sum' of the values of
+      each account (ignoring missing values), and the first row for the other columns.
+
+Rows of an account are ordered by `order_by`, then by their content, so that the result doesn't
+depend on the order in which the database returned them. The result is sorted by account.
+"""
+
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+import pandas as pd
+
+from sutter.lib.segments import segment_starts
+
+log = logging.getLogger('sutter.lib.dedup')
+
+RULES = ('first', 'latest', 'first_non_null', 'aggregate')
+AGGREGATES = {'min': np.fmin, 'max': np.fmax, 'sum': np.add}
+
+
+def _sorted_order(keys):
+    """Return the positions of the rows in key order (stable)."""
+    if pd.Index(keys).is_monotonic_increasing:
+        return np.arange(len(keys))
+    return np.argsort(keys, kind='mergesort')
+
+
+def _order_duplicates(df, order, dup_rows, order_by):
+    """Reorder the positions `order[dup_rows]` by (key, order_by, content)."""
+    positions = order[dup_rows]
+    rows = df.iloc[positions]
+    # np.lexsort sorts by its last key first. Missing `order_by` values sort first.
+    sort_keys = [pd.util.hash_pandas_object(rows, index=False).values]
+    sort_keys += [pd.factorize(rows[col], sort=True)[0] for col in reversed(order_by or [])]
+    sort_keys.append(pd.factorize(rows.index, sort=True)[0])
+    order[dup_rows] = positions[np.lexsort(sort_keys)]
+
+
+def dedupe(df, rule='first', order_by=None, aggregations=None, name=None):
+    """
+    Return `df` with one row per index value.
+
+    :param df: DataFrame indexed by account (hsp_acct_study_id).
+    :param rule: one of RULES (see above).
+    :param order_by: columns to order the rows of each account by (required by 'latest').
+    :param aggregations: dict of {column: 'min', 'max' or 'sum'}, for the 'aggregate' rule.
+    :param name: name to report the dropped rows under (e.g. the extractor's).
+    :returns: `df` itself if it has no duplicates, or a new DataFrame sorted by account.
+    """
+    if rule not in RULES:
+        raise ValueError('rule must be one of %s, not %r' % (RULES, rule))
+    if rule == 'latest' and not order_by:
+        raise ValueError("the 'latest' rule needs order_by columns")
+
+    keys = df.index.values
+    order = _sorted_order(keys)
+    sorted_keys = keys[order]
+    if not len(keys) or not (sorted_keys[1:] == sorted_keys[:-1]).any():
+        return df
+
+    starts = segment_starts(sorted_keys)
+    counts = np.diff(np.append(starts, len(keys)))
+    duplicated = counts > 1
+    dup_rows = np.repeat(duplicated, counts)
+    _order_duplicates(df, order, dup_rows, order_by)
+
+    # Positions in sorted order of the row kept for each account.
+    picks = starts + counts - 1 if rule == 'latest' else starts
+    if rule in ('first', 'latest'):
+        res = df.take(order[picks])
+    else:
+        # The rows of the duplicated accounts, and where each account starts among them.
+        dup_positions = order[dup_rows]
+        dup_counts = counts[duplicated]
+        dup_starts = np.cumsum(dup_counts) - dup_counts
+
+        columns = []
+        for i, col in enumerate(df.columns):
+            values = df.iloc[:, i].values
+            col_values = values.take(order[picks])
+            if rule == 'first_non_null':
+                notnull = pd.notnull(values.take(dup_positions))
+                if not notnull.all():
+                    # The first non-null row of each duplicated account (or its first row).
+                    sorted_pos = np.where(notnull, np.flatnonzero(dup_rows), len(keys))
+                    first = np.minimum.reduceat(sorted_pos, dup_starts)
+                    chosen = np.where(first < len(keys), first, starts[duplicated])
+                    col_values[duplicated] = values.take(order[chosen])
+            elif col in (aggregations or {}):
+                how = aggregations[col]
+                dup_values = values.take(dup_positions).astype(np.float64)
+                if how == 'sum':
+                    dup_values = np.nan_to_num(dup_values)
+                col_values = col_values.astype(np.float64)
+                col_values[duplicated] = AGGREGATES[how].reduceat(dup_values, dup_starts)
+            columns.append(col_values)
+        res = pd.DataFrame(OrderedDict(enumerate(columns)), index=df.index.take(order[picks]))
+        res.columns = df.columns
+
+    log.info('%s: dropped %d duplicate rows of %d accounts (rule: %s)' % (
+        name or 'dedupe', len(df) - len(res), duplicated.sum(), rule))
+    return res
@@ -0,0 +1,79 @@
+"""
+Compact dtypes for extracted features.
+
+Without a policy, extractors emit whatever pandas infers: float64 for small counts, object for
+categorical strings and object or bool mixes for boolean flags. The dtype of a feature column
+is instead decided by the naming conventions of its column:
+
+    `*_bool`  -> bool (float32 if it has missing values, which bool can't hold)
+    `*_cat`   -> pandas categorical
+    otherwise -> int16 or int32 if the values are whole numbers that fit, float32 otherwise
+
+Columns that aren't numeric (e.g. the datetimes of the labels) are left untouched, and
+COLUMN_DTYPES can override the policy for individual columns.
+"""
+
+import numpy as np
+
+import pandas as pd
+
+# Column name suffix -> kind of column.
+SUFFIX_KINDS = [
+    ('_bool', 'bool'),
+    ('_cat', 'category'),
+]
+
+# Explicit per-column dtypes, taking precedence over the suffix conventions.
+COLUMN_DTYPES = {}
+
+INT_DTYPES = [np.int16, np.int32]
+
+
+def column_kind(name):
+    """Return the kind of a column ('bool', 'category' or 'numeric') from its name."""
+    for suffix, kind in SUFFIX_KINDS:
+        if str(name).endswith(suffix):
+            return kind
+    return 'numeric'
+
+
+def _compact_numeric(column):
+    if column.dtype.kind not in 'iuf' or not len(column):
+        return column
+
+    values = column.values
+    if column.dtype.kind == 'f':
+        if np.isnan(values).any() or not (values == np.floor(values)).all():
+            return column.astype(np.float32)
+
+    lo, hi = values.min(), values.max()
+    for dtype in INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return column.astype(dtype)
+    return column if column.dtype.kind in 'iu' else column.astype(np.float32)
+
+
+def compact_column(column):
+    """Return the column converted to the dtype given by the policy."""
+    if column.name in COLUMN_DTYPES:
+        return column.astype(COLUMN_DTYPES[column.name])
+
+    kind = column_kind(column.name)
+    if kind == 'category':
+        return column.astype('category')
+    elif kind == 'bool' and column.dtype != bool:
+        values = pd.to_numeric(column, errors='coerce')
+        if values.isnull().any():
+            return values.astype(np.float32)
+        return values.astype(bool)
+    elif kind == 'numeric':
+        return _compact_numeric(column)
+    return column
+
+
+def compact_dtypes(df):
+    """Return a copy of `df` with every column converted to the dtype given by the policy."""
+    return pd.DataFrame({col: compact_column(df[col]) for col in df.columns},
+                        index=df.index, columns=df.columns)
+
@@ -0,0 +1,216 @@
+"""
+A persistent table of every patient's Charlson comorbidity diagnoses.
+
+The comorbidity view used to union three views that re-join hospital_dx, hospital_problems,
+hospital_px and encounter_dx with the Charlson crosswalk, and then compute the days since the
+prior diagnosis of each condition with a window over the whole union, on every render. Instead,
+the diagnoses are stored once in DX_EVENTS_TABLE, one row per (patient, date, mode, source,
+code) with its condition, weight and `days_since_prior_dx`, indexed by patient:
+
+    - `create_dx_events_table` creates the table, and fills it from scratch.
+    - `append_dx_events` (or `SELECT bayes_append_dx_events()`) only adds the diagnoses of the
+      hospital accounts and encounters loaded since the last call, then recomputes
+      `days_since_prior_dx` for the (patient, condition) pairs that got new diagnoses.
+      `sutter.lib.views` runs it before (re-)creating the views.
+
+New rows are found with a watermark per source table: the largest hsp_acct_study_id and
+enc_study_id already processed. This assumes that new accounts and encounters get larger ids,
+and that their diagnoses are loaded along with them; re-run `create_dx_events_table` otherwise.
+"""
+
+import logging
+
+from sutter.lib import postgres
+
+log = logging.getLogger('sutter.lib.dx_events')
+
+DX_EVENTS_TABLE = 'bayes_dx_events'
+WATERMARKS_TABLE = 'bayes_dx_events_watermarks'
+
+CREATE_TABLES_SQL = """
+CREATE TABLE {events} (
+    event_id BIGSERIAL PRIMARY KEY,
+    pat_study_id BIGINT,
+    hsp_acct_study_id BIGINT,
+    enc_study_id BIGINT,
+    noted_date TIMESTAMP,
+    dx_mode VARCHAR,
+    dx_source VARCHAR,
+    icd_9_cm_code VARCHAR,
+    condition_cat VARCHAR,
+    weight FLOAT,
+    days_since_prior_dx FLOAT
+);
+CREATE TABLE {watermarks} (
+    source VARCHAR PRIMARY KEY,
+    max_id BIGINT
+);
+INSERT INTO {watermarks} VALUES ('hospital_account', NULL), ('encounters', NULL);
+""".format(events=DX_EVENTS_TABLE, watermarks=WATERMARKS_TABLE)
+
+# The diagnoses of hospital accounts (as in the hospital inpatient/outpatient dx views), and of
+# encounters that aren't part of a hospital stay (as in the non-hospital dx view). The keys of
+# the new diagnoses are computed here, rather than read from their `icd_9_cm_key` columns, so
+# that they don't depend on when those were filled (see sutter.lib.icd9).
+APPEND_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION bayes_append_dx_events() RETURNS BIGINT AS $$
+DECLARE
+    acct_from BIGINT;
+    acct_to BIGINT;
+    enc_from BIGINT;
+    enc_to BIGINT;
+    first_event BIGINT;
+    n_events BIGINT;
+BEGIN
+    SELECT coalesce(max_id, -1) INTO acct_from FROM {watermarks} WHERE source = 'hospital_account';
+    SELECT coalesce(max_id, -1) INTO enc_from FROM {watermarks} WHERE source = 'encounters';
+    SELECT coalesce(max(hsp_acct_study_id), acct_from) INTO acct_to FROM hospital_account;
+    SELECT coalesce(max(enc_study_id), enc_from) INTO enc_to FROM encounters;
+    SELECT coalesce(max(event_id), 0) INTO first_event FROM {events};
+
+    INSERT INTO {events} (pat_study_id, hsp_acct_study_id, noted_date, dx_mode, dx_source,
+                          icd_9_cm_code, condition_cat, weight)
+    SELECT problems.pat_study_id,
+           problems.hsp_acct_study_id,
+           problems.noted_date,
+           problems.dx_mode,
+           problems.dx_source,
+           problems.icd_9_cm_code,
+           xwalk.condition_cat,
+           xwalk.weight
+      FROM (SELECT acct.hsp_acct_study_id,
+                   acct.pat_study_id,
+                   CASE acct.acct_type_name
+                       WHEN 'Inpatient' THEN acct.disch_date_time
+                       ELSE acct.adm_date_time
+                   END AS noted_date,
+                   acct.acct_type_name AS dx_mode,
+                   dx.icd_9_cm_code,
+                   dx.icd_9_cm_key,
+                   dx.dx_source
+              FROM hospital_account acct
+                   JOIN (SELECT hsp_acct_study_id,
+                                icd_9_cm_code,
+                                icd9_key(icd_9_cm_code) AS icd_9_cm_key,
+                                'hospital_dx'::VARCHAR AS dx_source
+                           FROM hospital_dx
+                          WHERE hsp_acct_study_id > acct_from
+                            AND hsp_acct_study_id <= acct_to
+                         UNION
+                         SELECT hsp_acct_study_id,
+                                icd_9_cm_code,
+                                icd9_key(icd_9_cm_code) AS icd_9_cm_key,
+                                'hospital_problems'::VARCHAR AS dx_source
+                           FROM hospital_problems
+                          WHERE hsp_acct_study_id > acct_from
+                            AND hsp_acct_study_id <= acct_to
+                         UNION
+                         SELECT hsp_px.hsp_acct_study_id,
+                                px_id_xwalk.icd_9_cm_code,
+                                icd9_key(px_id_xwalk.icd_9_cm_code) AS icd_9_cm_key,
+                                'hospital_px'::VARCHAR AS dx_source
+                           FROM hospital_px hsp_px
+                                JOIN px_id_xwalk USING (final_icd_px_id)
+                          WHERE hsp_px.hsp_acct_study_id > acct_from
+                            AND hsp_px.hsp_acct_study_id <= acct_to) dx
+                   USING (hsp_acct_study_id)
+             WHERE acct.acct_type_name IS NOT NULL) problems
+           JOIN icd_9_cci_xwalk xwalk
+           USING (icd_9_cm_key);
+
+    INSERT INTO {events} (pat_study_id, enc_study_id, noted_date, dx_mode, dx_source,
+                          icd_9_cm_code, condition_cat, weight)
+    SELECT DISTINCT ON (encs.enc_study_id)
+           encs.pat_study_id,
+           encs.enc_study_id,
+           encs.contact_date,
+           'outpatient'::VARCHAR,
+           'encounter_dx'::VARCHAR,
+           enc_dx.icd_9_cm_code,
+           xwalk.condition_cat,
+           xwalk.weight
+      FROM encounters encs
+           LEFT JOIN hospital_encounters hsp_encs
+           ON hsp_encs.enc_study_id = encs.enc_study_id
+           JOIN encounter_dx enc_dx
+           ON enc_dx.enc_study_id = encs.enc_study_id
+           JOIN icd_9_cci_xwalk xwalk
+           ON xwalk.icd_9_cm_key = icd9_key(enc_dx.icd_9_cm_code)
+     WHERE hsp_encs.enc_study_id IS NULL
+       AND encs.enc_study_id > enc_from
+       AND encs.enc_study_id <= enc_to;
+
+    -- Only the (patient, condition) pairs with new diagnoses need their windows recomputed.
+    DROP TABLE IF EXISTS bayes_dx_partitions;
+    CREATE TEMPORARY TABLE bayes_dx_partitions AS
+    SELECT DISTINCT pat_study_id, condition_cat
+      FROM {events}
+     WHERE event_id > first_event;
+
+    UPDATE {events} events
+       SET days_since_prior_dx = windowed.days_since_prior_dx
+      FROM (SELECT event_id,
+                   EXTRACT(DAY FROM noted_date - lag(noted_date) OVER (
+                       PARTITION BY pat_study_id, condition_cat
+                       ORDER BY noted_date, event_id)) AS days_since_prior_dx
+              FROM {events}
+                   JOIN bayes_dx_partitions
+                   USING (pat_study_id, condition_cat)) windowed
+     WHERE events.event_id = windowed.event_id
+       AND events.days_since_prior_dx IS DISTINCT FROM windowed.days_since_prior_dx;
+
+    DROP TABLE bayes_dx_partitions;
+    UPDATE {watermarks} SET max_id = acct_to WHERE source = 'hospital_account';
+    UPDATE {watermarks} SET max_id = enc_to WHERE source = 'encounters';
+    SELECT count(*) INTO n_events FROM {events} WHERE event_id > first_event;
+    RETURN n_events;
+END;
+$$ LANGUAGE plpgsql
+""".format(events=DX_EVENTS_TABLE, watermarks=WATERMARKS_TABLE)
+
+
+def create_dx_events_table(connection):
+    """
+    (Re-)create DX_EVENTS_TABLE and fill it with the diagnoses of all patients.
+
+    The comorbidity view is built on the table, so it is dropped along with it. Runs in a
+    transaction (see `postgres.transaction`).
+
+    :param connection: SQLAlchemy engine or connection (e.g. `op.get_bind()` in a migration).
+    """
+    with postgres.transaction(connection) as conn:
+        drop_dx_events_table(conn)
+        log.info('creating %s ...' % DX_EVENTS_TABLE)
+        conn.execute(CREATE_TABLES_SQL)
+        conn.execute(APPEND_FUNCTION_SQL)
+        append_dx_events(conn)
+
+        conn.execute("CREATE INDEX {0}_pat_study_id ON {0} "
+                     "(pat_study_id, condition_cat, noted_date)".format(DX_EVENTS_TABLE))
+        # Store each patient's diagnoses together, since they are always read per patient.
+        conn.execute("CLUSTER {0} USING {0}_pat_study_id".format(DX_EVENTS_TABLE))
+        conn.execute("ANALYZE {}".format(DX_EVENTS_TABLE))
+
+
+def append_dx_events(connection):
+    """
+    Add the diagnoses of the accounts and encounters loaded since the last call.
+
+    The diagnoses are added in a transaction, since the engine wouldn't commit the changes made
+    by a `SELECT`.
+
+    :param connection: SQLAlchemy engine or connection.
+    :returns: the number of diagnoses added.
+    """
+    with postgres.transaction(connection) as conn:
+        n_events = conn.execute("SELECT bayes_append_dx_events()").scalar()
+    log.info('added %d diagnoses to %s' % (n_events, DX_EVENTS_TABLE))
+    return n_events
+
+
+def drop_dx_events_table(connection):
+    """Undo `create_dx_events_table`."""
+    with postgres.transaction(connection) as conn:
+        conn.execute("DROP FUNCTION IF EXISTS bayes_append_dx_events()")
+        conn.execute("DROP TABLE IF EXISTS {}".format(WATERMARKS_TABLE))
+        conn.execute("DROP TABLE IF EXISTS {} CASCADE".format(DX_EVENTS_TABLE))
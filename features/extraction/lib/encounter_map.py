@@ -0,0 +1,176 @@
+"""
+A precomputed mapping of hospital accounts to the encounters that happened during their stay.
+
+The encounters of a stay are those of the same patient with
+`adm_date_time::DATE <= contact_date <= disch_date_time::DATE`. Postgres can't serve this range
+join from B-tree indexes, so every view joining on it scans and sorts `encounters`. Instead,
+the mapping is computed once, per chunk of patients, by sorting the encounters by
+(patient, contact date) and finding each stay's encounters with two `searchsorted` calls:
+
+    build_encounter_map()
+
+and stored in the ENCOUNTER_MAP_TABLE table, indexed by account and encounter, so that views
+and queries join `encounters` with equi-joins:
+
+    FROM hospital_account acct
+         JOIN bayes_account_encounters USING (hsp_acct_study_id)
+         JOIN encounters enc USING (enc_study_id)
+
+The mapping must be rebuilt whenever rows are added to `hospital_account` or `encounters`
+(e.g. the encounters of a stay can be loaded after its account): `sutter.lib.views` rebuilds it
+before (re-)creating the views, and then refreshes the materialized views built on it. In
+between, the encounters of single accounts (e.g. of a patient discharged since the last build)
+can be (re-)mapped with `map_accounts`.
+"""
+
+import logging
+
+import numpy as np
+
+import pandas as pd
+
+import sqlalchemy as sa
+
+from sutter.lib import postgres
+from sutter.lib.upload import bulk_load, copy_df
+
+log = logging.getLogger('sutter.lib.encounter_map')
+
+ENCOUNTER_MAP_TABLE = 'bayes_account_encounters'
+INDEXES = ['hsp_acct_study_id', 'enc_study_id']
+
+# Keys are (patient, day) pairs packed into an int64: 2 ** 17 days is more than 350 years.
+_EPOCH = np.datetime64('1900-01-01', 'D')
+_DAY_SPAN = 2 ** 17
+
+STAGING_TABLE = 'bayes_account_encounters_staging'
+DTYPE = {'contact_date': sa.types.Date}
+
+# {} restricts the accounts, or the patients of the encounters.
+ACCOUNTS_QUERY = """
+    SELECT hsp_acct_study_id, pat_study_id, adm_date_time, disch_date_time
+      FROM hospital_account
+     WHERE adm_date_time IS NOT NULL AND disch_date_time IS NOT NULL
+       AND {}
+"""
+
+ENCOUNTERS_QUERY = """
+    SELECT enc_study_id, pat_study_id, contact_date
+      FROM encounters
+     WHERE contact_date IS NOT NULL
+       AND {}
+"""
+
+
+def _keys(pat_study_ids, dates):
+    """Pack (patient, date) pairs into sortable int64 keys, ignoring the time of day."""
+    days = pd.to_datetime(dates).values.astype('datetime64[D]') - _EPOCH
+    days = np.clip(days.astype(np.int64), 0, _DAY_SPAN - 1)
+    return np.asarray(pat_study_ids, dtype=np.int64) * _DAY_SPAN + days
+
+
+def map_encounters(accounts, encounters):
+    """
+    Find the encounters of each account's stay.
+
+    :param accounts: DataFrame with `hsp_acct_study_id`, `pat_study_id`, `adm_date_time` and
+        `disch_date_time` columns, without nulls.
+    :param encounters: DataFrame with `enc_study_id`, `pat_study_id` and `contact_date` columns,
+        without nulls.
+    :returns: DataFrame of (hsp_acct_study_id, enc_study_id, contact_date), one row per encounter
+        of each stay, ordered by account and contact date.
+    """
+    enc_keys = _keys(encounters.pat_study_id, encounters.contact_date)
+    order = np.argsort(enc_keys, kind='mergesort')
+    enc_keys = enc_keys[order]
+
+    lo = np.searchsorted(enc_keys, _keys(accounts.pat_study_id, accounts.adm_date_time))
+    hi = np.searchsorted(enc_keys, _keys(accounts.pat_study_id, accounts.disch_date_time),
+                         side='right')
+    counts = np.maximum(hi - lo, 0)
+
+    # Positions lo, lo + 1, ..., hi - 1 of each account, all at once.
+    starts = np.cumsum(counts) - counts
+    offsets = np.arange(counts.sum()) - np.repeat(starts, counts)
+    enc_pos = order[np.repeat(lo, counts) + offsets]
+    acct_pos = np.repeat(np.arange(len(accounts)), counts)
+
+    return pd.DataFrame({
+        'hsp_acct_study_id': accounts.hsp_acct_study_id.values[acct_pos],
+        'enc_study_id': encounters.enc_study_id.values[enc_pos],
+        'contact_date': pd.to_datetime(encounters.contact_date.values[enc_pos]),
+    }, columns=['hsp_acct_study_id', 'enc_study_id', 'contact_date'])
+
+
+def _iter_chunks(bind, patients_per_chunk):
+    pat_ids = pd.read_sql("""
+        SELECT DISTINCT pat_study_id
+          FROM hospital_account
+         WHERE pat_study_id IS NOT NULL
+         ORDER BY pat_study_id
+    """, bind).pat_study_id.values
+
+    for start in range(0, len(pat_ids), patients_per_chunk):
+        lo, hi = pat_ids[start], pat_ids[min(start + patients_per_chunk, len(pat_ids)) - 1]
+        patients = 'pat_study_id BETWEEN {} AND {}'.format(lo, hi)
+        accounts = pd.read_sql(ACCOUNTS_QUERY.format(patients), bind)
+        encounters = pd.read_sql(ENCOUNTERS_QUERY.format(patients), bind)
+        yield map_encounters(accounts, encounters)
+        log.info('mapped the encounters of %d patients so far ...' %
+                 min(start + patients_per_chunk, len(pat_ids)))
+
+
+def build_encounter_map(bind=None, patients_per_chunk=50000):
+    """
+    (Re-)build ENCOUNTER_MAP_TABLE from `hospital_account` and `encounters`.
+
+    The new mapping is built in a temporary table, and swapped in (TRUNCATE and INSERT) at the
+    end of a single transaction: readers see the previous mapping until then, and the views built
+    on it (e.g. `bayes_m_vw_account_medications`) are kept, to be refreshed afterwards.
+
+    :param bind: SQLAlchemy engine or connection (defaults to `postgres.get_connection()`).
+        Through a connection, the build is part of its transaction.
+    :param patients_per_chunk: number of patients whose encounters are held in memory at once.
+    :returns: the number of (account, encounter) pairs.
+    """
+    bind = bind or postgres.get_connection()
+    with postgres.transaction(bind) as conn:
+        if not conn.dialect.has_table(conn, ENCOUNTER_MAP_TABLE):
+            return bulk_load(ENCOUNTER_MAP_TABLE, conn, _iter_chunks(conn, patients_per_chunk),
+                             indexes=INDEXES, dtype=DTYPE)
+
+        conn.execute("CREATE TEMPORARY TABLE {} (LIKE {}) ON COMMIT DROP".format(
+            STAGING_TABLE, ENCOUNTER_MAP_TABLE))
+        n_rows = bulk_load(STAGING_TABLE, conn, _iter_chunks(conn, patients_per_chunk),
+                           if_exists='append')
+        log.info('swapping in the new mapping ...')
+        conn.execute("TRUNCATE {}".format(ENCOUNTER_MAP_TABLE))
+        conn.execute("INSERT INTO {} SELECT * FROM {}".format(ENCOUNTER_MAP_TABLE, STAGING_TABLE))
+        conn.execute("ANALYZE {}".format(ENCOUNTER_MAP_TABLE))
+    return n_rows
+
+
+def map_accounts(hsp_acct_study_ids, bind=None):
+    """
+    (Re-)map the encounters of some accounts, e.g. of those created since the last build.
+
+    :param hsp_acct_study_ids: the accounts to map. Their previous mapping, if any, is replaced.
+    :param bind: SQLAlchemy engine or connection (defaults to `postgres.get_connection()`).
+    :returns: the number of (account, encounter) pairs of these accounts.
+    """
+    ids = ', '.join(str(int(hsp_acct_study_id)) for hsp_acct_study_id in hsp_acct_study_ids)
+    accounts = 'hsp_acct_study_id IN ({})'.format(ids)
+    patients = 'pat_study_id IN (SELECT pat_study_id FROM hospital_account WHERE {})'.format(
+        accounts)
+
+    bind = bind or postgres.get_connection()
+    with postgres.transaction(bind) as conn:
+        mapping = map_encounters(pd.read_sql(ACCOUNTS_QUERY.format(accounts), conn),
+                                 pd.read_sql(ENCOUNTERS_QUERY.format(patients), conn))
+        conn.execute("DELETE FROM {} WHERE {}".format(ENCOUNTER_MAP_TABLE, accounts))
+        cursor = conn.connection.cursor()
+        try:
+            copy_df(cursor, ENCOUNTER_MAP_TABLE, mapping)
+        finally:
+            cursor.close()
+    return len(mapping)
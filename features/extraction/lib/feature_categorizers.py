@@ -3,30 +3,169 @@ Helper methods for categorizing features.
 
 These methods categorize features from a large number of possible categories
 in the database into a small number of useful categories.
+
+Each categorization is a CategoryMapping registered in CATEGORY_MAPPINGS, so that it is defined
+in a single place and can be applied either way:
+    - on a fetched column, with `CATEGORY_MAPPINGS['race'].apply(res.race_name)`: the distinct
+      values are mapped once, and the result is a single `take` of their codes.
+    - in SQL, as a `CASE` expression: view files refer to a mapping with a placeholder such as
+      `{{race(race_name)}}`, which `render_categories` replaces when the views are created.
 """
 
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+import pandas as pd
+
+# As a default, maps the values that aren't listed to themselves, lowercased.
+LOWER = object()
+
+PLACEHOLDER = re.compile(r'\{\{\s*(\w+)\((\w+(?:\.\w+)?)\)\s*\}\}')
+
+
+def _sql_literal(value):
+    return 'NULL' if value is None else "'{}'".format(value.replace("'", "''"))
+
+
+class CategoryMapping(object):
+    """
+    A mapping of raw database values to categories.
+
+    Missing values, and values that aren't in `mapping`, are mapped to `default` (as in a SQL
+    `CASE <column> WHEN ... ELSE <default> END`). A category of None means missing.
+    """
+
+    def __init__(self, name, mapping, default='other'):
+        """
+        :param mapping: dict (or list of pairs) of {raw value: category}.
+        :param default: category of the other values, or LOWER to lowercase them.
+        """
+        self.name = name
+        self.mapping = OrderedDict(mapping)
+        self.default = default
+        self._index = pd.Index(self.mapping.keys())
+        self._categories = np.array(self.mapping.values() + [None], dtype=object)
+
+    def __call__(self, value):
+        """Map a single value."""
+        return self.apply(pd.Series([value]))[0]
+
+    def apply(self, values):
+        """Map a Series of raw values, returning an object Series of categories."""
+        codes, uniques = pd.factorize(values)
+        positions = self._index.get_indexer(uniques)
+        categories = self._categories.take(positions)  # -1 (not listed) takes the last one
+        unlisted = positions < 0
+        if self.default is LOWER:
+            categories[unlisted] = pd.Series(uniques[unlisted], dtype=object).str.lower().values
+            missing = None
+        else:
+            categories[unlisted] = self.default
+            missing = self.default
+        # Missing values have code -1 as well, so they take the appended last category.
+        categories = np.append(categories, np.array([missing], dtype=object))
+        return pd.Series(categories.take(codes), index=values.index, name=values.name)
+
+    def sql(self, column):
+        """Return the mapping as a SQL `CASE` expression on `column`."""
+        default = 'lower({})'.format(column) if self.default is LOWER else \
+            _sql_literal(self.default)
+        lines = ['CASE {}'.format(column)]
+        lines += ['    WHEN {} THEN {}'.format(_sql_literal(value), _sql_literal(category))
+                  for value, category in self.mapping.iteritems()]
+        lines += ['    ELSE {}'.format(default), 'END']
+        return '\n'.join(lines)
+
+
+CATEGORY_MAPPINGS = OrderedDict()
+
+
+def register(mapping):
+    """Add a CategoryMapping to CATEGORY_MAPPINGS, and return it."""
+    CATEGORY_MAPPINGS[mapping.name] = mapping
+    return mapping
+
+
+def render_categories(sql):
+    """Replace the `{{<mapping name>(<column>)}}` placeholders of `sql` by CASE expressions."""
+    def _render(match):
+        return CATEGORY_MAPPINGS[match.group(1)].sql(match.group(2))
+    return PLACEHOLDER.sub(_render, sql)
+
+
+race = register(CategoryMapping('race', [
+    ('White/Caucasian', 'white'),
+    ('Black/African American', 'black'),
+    ('Unknown', None),
+    ('', None),
+]))
+
+marital_status = register(CategoryMapping('marital_status', [
+    ('Single', 'single'),
+    ('Significant other', 'partner'),
+    ('Life Partner', 'partner'),
+    ('Married', 'married'),
+    ('Divorced', 'separated'),
+    ('Legally Separated', 'separated'),
+    ('Separated', 'separated'),
+    ('Widowed', 'widowed'),
+]))
+
+disch_location = register(CategoryMapping('disch_location', [
+    ('Discharged to Home or Self Care (Routine Discharge)', 'home_no_service'),
+    ('Discharged/transferred to Home Under Care of Organized Home Health Service Org',
+     'home_health'),
+    ('Discharged/transferred to a Facility that Provides Custodial or Supportive Care',
+     'assisted_living'),
+    ('Discharged/transferred to a Medicare Certified Long Term Care Hospital (LTCH)',
+     'assisted_living'),
+    ('Discharged/transferred to a Nursing Fac Certified under Medicaid but not Medicare', 'snf'),
+    ('Discharged/transferred to Skilled Nursing Facility (SNF) with Medicare Certification',
+     'snf'),
+    ('Hospice - Home', 'hospice'),
+    ('Hospice - Medical Facility (Certified) Providing Hospice Level of Care', 'hospice'),
+    ('Discharged/transferred to a Psychiatric Hospital or Psychiatric Hospital Unit',
+     'hospital'),
+    ('Left Against Medical Advice or Discontinued Care', 'discontinued'),
+    ('Discharged/transferred to an Inpatient Rehab Facility (IRF)', 'rehab'),
+]))
+
+admission_source = register(CategoryMapping('admission_source', [
+    ('Transfer from a Hospital (Different Facility)', 'transfer'),
+    ('Transfer from Another Health Care Facility', 'transfer'),
+    ('Transfer from One Distinct Unit to another Distinct Unit in Same Hospital', 'transfer'),
+    ('Transfer from Skilled Nursing (SNF), Intermediate Care (ICF) or Assisted Living (ALF)',
+     'transfer'),
+    ('Non-Health Care Facility Point of Origin', 'home'),
+    ("Clinic or Physician's Office", 'outpatient'),
+    ('', None),
+    ('Information Not Available', None),
+]))
+
+admission_type = register(CategoryMapping('admission_type', [
+    ('Trauma Center', 'other'),
+    ('Newborn', 'other'),
+    ('Information Not Available', 'other'),
+], default=LOWER))
+
+tobacco = register(CategoryMapping('tobacco', [
+    ('', None),
+    ('Not Asked', None),
+], default=LOWER))
+
+yes_no = register(CategoryMapping('yes_no', [
+    ('Yes', 'yes'),
+    ('No', 'no'),
+], default=None))
+
 
 def race_from_string(str):
     """Convert race to one of ['white', 'black', None]."""
-    race_dict = {
-        "White/Caucasian": 'white',
-        "Black/African American": 'black',
-        "Unknown": None,
-        "": None
-    }
-    return race_dict.get(str, 'other')
+    return race(str)
 
 
 def marital_status_from_string(str):
     """Convert marital status to one of ['single', 'partner', 'married', 'separated', 'widowed']."""
-    marital_status_dict = {
-        'Single': 'single',
-        'Significant other': 'partner',
-        'Life Partner': 'partner',
-        'Married': 'married',
-        'Divorced': 'separated',
-        'Legally Separated': 'separated',
-        'Separated': 'separated',
-        'Widowed': 'widowed'
-    }
-    return marital_status_dict.get(str, 'other')
+    return marital_status(str)
@@ -1,23 +1,61 @@
-"""Our subclass of Fex."""
+"""Our subclass of the databuilder FeatureExtractor."""
 
 import logging
 import re
+import time
 
-import fex
-
-import numpy as np
+import pandas as pd
 
+from sutter.lib import cache_key, postgres, views
+from sutter.lib.databuilder import FeatureExtractor as BaseFeatureExtractor
+from sutter.lib.dedup import dedupe
+from sutter.lib.profiling import ExtractorProfile
+from sutter.lib.validation import validate_df
 
 log = logging.getLogger('feature_extraction')
 
+MATERIALIZED_VIEW = re.compile(r'\b\w+\.(bayes_m_vw_\w+)\b')
+
 
-class FeatureExtractor(fex.FeatureExtractor):
+def account_partitions(n_partitions, schema='features'):
     """
-    Our subclass of fex.FeatureExtractor.
+    Split the index admissions into `n_partitions` ranges of hsp_acct_study_id of similar size.
+
+    Returns a list of (lo, hi) tuples, `hi` exclusive, to be passed to
+    `DatabuilderFramework.run_partitioned`.
+    """
+    fractions = ', '.join(str(float(i) / n_partitions) for i in range(1, n_partitions))
+    query = """
+        SELECT min(hsp_acct_study_id) lo,
+               max(hsp_acct_study_id) hi,
+               percentile_disc(ARRAY[{}]::FLOAT[]) WITHIN GROUP (ORDER BY hsp_acct_study_id) cuts
+          FROM {}.bayes_vw_index_admissions
+    """.format(fractions or 'NULL', schema)
+    res = pd.read_sql(query, postgres.get_connection())
+    cuts = [c for c in (res.cuts[0] or []) if c is not None]
+    bounds = sorted(set([res.lo[0]] + cuts + [res.hi[0] + 1]))
+    return zip(bounds[:-1], bounds[1:])
+
+
+class FeatureExtractor(BaseFeatureExtractor):
+    """
+    Our subclass of sutter.lib.databuilder.FeatureExtractor.
+
+    Features are named `<extractor class name>__<column>` (e.g. `UtilizationExtractor__...`),
+    as in the feature lists (e.g. features_100.txt).
 
     Offers some additional functionality:
         - _validate_df() does some sanity checks for testing FeatureExtractor output.
         - "df" output mode to output the DataFrame rather than saving to CSV.
+        - read_sql() and emit_df() record query, transform and emit timings in `self.profile`.
+        - set_account_range() restricts read_sql() to a range of accounts, for out-of-core runs.
+        - patients_query() selects the patients of the index admissions in that range.
+        - stays_query() selects the index admissions with their stay dates.
+        - read_sql() reads the materialized views from their SQL instead, if
+          `inline_materialized_views` is set (e.g. for accounts discharged since they were
+          rendered, see sutter.lib.realtime).
+        - dedupe() keeps one row per account, with a declared rule (see sutter.lib.dedup).
+        - read_sql_chunks() streams large query results in DataFrames of bounded size.
     """
 
     def __init__(self, output_mode='csv', schema='features'):
@@ -26,37 +64,145 @@ class FeatureExtractor(fex.FeatureExtractor):
 
         Output mode can be "csv" or "df".
         """
-        fex.FeatureExtractor.__init__(self)
+        BaseFeatureExtractor.__init__(self)
+        self.prefix = self.name
         self._schema = schema  # set to "sample_features" in tests to use a smaller sample
         self._output_mode = output_mode  # toggle between output to csv or df
+        self.profile = ExtractorProfile(self.name)  # replaced by the framework on each run
+        self._account_range = None
+        self.validation = None  # defaults to the SUTTER_VALIDATION env variable
+        self.inline_materialized_views = False
+
+    def set_account_range(self, lo, hi):
+        """Only extract features for accounts with lo <= hsp_acct_study_id < hi (None to reset)."""
+        self._account_range = None if lo is None else (int(lo), int(hi))
+
+    def patients_query(self):
+        """
+        Return a query of the pat_study_id of the index admissions (within the account range).
+
+        To fetch rows about the patients rather than their index admissions (e.g. all of their
+        visits), filter on `pat_study_id IN (<this query>)` and pass `partitioned=False`.
+        """
+        query = "SELECT DISTINCT pat_study_id FROM {}.bayes_vw_index_admissions".format(
+            self._schema)
+        if self._account_range is not None:
+            query += " WHERE hsp_acct_study_id >= {} AND hsp_acct_study_id < {}".format(
+                *self._account_range)
+        return query
+
+    def stays_query(self):
+        """
+        Return a query of the index admissions, with their patient and stay dates.
+
+        The stay of an account spans the days from `adm_date_time` to `disch_date_time`
+        (inclusive), as the views compare them with dates (see sutter.lib.asof).
+        """
+        return """
+            SELECT acct.hsp_acct_study_id,
+                   acct.pat_study_id,
+                   acct.adm_date_time,
+                   acct.disch_date_time
+              FROM hospital_account acct
+                   JOIN {}.bayes_vw_index_admissions
+                   USING (hsp_acct_study_id)
+        """.format(self._schema)
+
+    def read_sql(self, query, partitioned=True, **kwargs):
+        """
+        Run a query against the database and return the result as a DataFrame.
+
+        If an account range is set (and `partitioned` is True), only rows of the query whose
+        `hsp_acct_study_id` falls within that range are fetched. Set `partitioned=False` for
+        queries that aren't keyed by account (e.g. lookup tables).
+        """
+        query = self._partition_query(query, partitioned)
+        engine = postgres.get_connection()
+        start = time.time()
+        res = pd.read_sql(query, engine, **kwargs)
+        self.profile.record_query(res, time.time() - start)
+        return res
+
+    def read_sql_chunks(self, query, order_by=None, chunksize=500000, partitioned=True):
+        """
+        Run a query and yield its result in DataFrames of at most `chunksize` rows.
+
+        Rows are fetched with a server-side cursor, so only one chunk is held in memory at a time.
+        See `read_sql` for `partitioned`.
+
+        :param order_by: ORDER BY clause of the whole result (e.g. 'hsp_acct_study_id'), applied
+            after the account range filter.
+        """
+        query = self._partition_query(query, partitioned)
+        if order_by:
+            query = "SELECT * FROM ({}) ordered ORDER BY {}".format(query, order_by)
+        connection = postgres.get_connection().connect().execution_options(stream_results=True)
+        try:
+            start = time.time()
+            for chunk in pd.read_sql(query, connection, chunksize=chunksize):
+                self.profile.record_query(chunk, time.time() - start)
+                yield chunk
+                start = time.time()
+        finally:
+            connection.close()
+
+    def _inline_materialized_views(self, query):
+        """Replace the materialized views that `query` reads with their (current) SQL."""
+        files = cache_key.view_files(self._schema)
+
+        def inline(match):
+            name = match.group(1)
+            sql = views._read_view_file(files[name], self._schema).replace('%', '%%')
+            return '(\n{}\n) {}'.format(sql, name)
+
+        return MATERIALIZED_VIEW.sub(inline, query)
+
+    def _partition_query(self, query, partitioned):
+        if self.inline_materialized_views:
+            query = self._inline_materialized_views(query)
+        if partitioned and self._account_range is not None:
+            query = """
+                SELECT *
+                  FROM ({}) q
+                 WHERE q.hsp_acct_study_id >= {} AND q.hsp_acct_study_id < {}
+            """.format(query, *self._account_range)
+        return query
+
+    def dedupe(self, df, rule='first', **kwargs):
+        """
+        Keep one row per account of `df` (indexed by hsp_acct_study_id), by `rule`.
+
+        See sutter.lib.dedup for the rules and their arguments. The number of rows dropped is
+        recorded in `self.profile`.
+        """
+        res = dedupe(df, rule, name=self.name, **kwargs)
+        self.profile.duplicates_dropped += len(df) - len(res)
+        return res
 
-    def emit_df(self, df):
-        """Run verification, then emit a DataFrame of extracted features."""
+    def emit_df(self, df, missing=None):
+        """
+        Run verification, then emit a DataFrame of extracted features.
+
+        :param missing: the missing value of the columns, e.g. False for dummy columns (see
+            `sutter.lib.databuilder.FeatureExtractor.emit_df`).
+        """
         log.info('The final table has %d rows.' % len(df))
-        self._validate_df(df)
+        with self.profile.timed('emit_time'):
+            self.profile.record_emit(df)
+            self._validate_df(df)
 
-        if self._output_mode == 'df':
-            return df
+            if self._output_mode == 'df':
+                return df
 
-        else:
-            self.emit(df)
+            else:
+                BaseFeatureExtractor.emit_df(self, df, missing)
 
     def _validate_df(self, df):
         """Perform several checks on the dataframe, raising an Exception if one fails.
 
         - For boolean (`*_bool`) columns, check to make sure that all values are bool or NaN.
         - For all columns, check that the column name is valid.
+
+        See sutter.lib.validation: `self.validation` can be 'full', 'sample' or 'off'.
         """
-        for colname in df:
-            # print "  * " + colname  # Uncomment to display all column names while testing
-            column = df[colname]
-
-            if re.match("[A-Z] ", colname):
-                # Column names shouldn't contain spaces or uppercase characters.
-                raise Exception("Bad column name: %s!" % colname)
-            elif colname.endswith("_bool"):
-                # Check that the column contains only boolean values and None/NaN.
-                values = set(column.values)
-                if not values <= {True, False, None, np.NaN}:
-                    raise Exception("Column %s contains non-boolean values (%s)!"
-                                    % (colname, values))
+        validate_df(df, self.validation)
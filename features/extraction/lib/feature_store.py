@@ -0,0 +1,192 @@
+"""
+A file-based feature store with point-in-time reads.
+
+Every extractor run can be written to the store, keyed by (hsp_acct_study_id, as_of, extractor
+hash). `as_of` is the time at which the features of an account became valid, i.e. the discharge
+time of the index admission that they are computed relative to. The layout is
+
+    <root>/<extractor name>/<extractor hash>/part-<written at>.parquet   (or .csv)
+    <root>/<extractor name>/<extractor hash>/meta.json
+
+so that each version of an extractor keeps its own partitions, and backtests can re-read the
+features of a historical cohort (or compare two versions of an extractor) without re-running
+the pipeline. A point-in-time read only sees the parts written up to that time (`written at` is
+in microseconds since the epoch, so `as_of` times are read as UTC), and the features that were
+valid then:
+
+    store = FeatureStore('feature-store')
+    framework = DatabuilderFramework(feature_store=store)
+    ...
+    features = store.read(as_of='2014-12-31')  # only what was known at the end of 2014
+"""
+
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+import pandas as pd
+
+from sutter.lib import postgres
+from sutter.lib.databuilder import write_partition
+
+log = logging.getLogger('sutter.lib.feature_store')
+
+META_FILE = 'meta.json'
+
+
+def _read_part(path):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, index_col=0, parse_dates=['as_of'])
+
+
+def _written_at(fname):
+    """Return the (UTC) time at which a part was written, from its `part-<microseconds>` name."""
+    return np.datetime64(int(os.path.splitext(fname)[0].split('-', 1)[1]), 'us')
+
+
+def _cutoff(as_of, index):
+    """Return the `as_of` time of each row of `index` (see `FeatureStore.read_extractor`)."""
+    if isinstance(as_of, pd.Series):
+        return as_of.reindex(index).values
+    return np.datetime64(pd.Timestamp(as_of))
+
+
+class FeatureStore(object):
+    """Feature values of each extractor version, with the time from which they are valid."""
+
+    def __init__(self, root, schema='features'):
+        """
+        Open (or create) a feature store.
+
+        :param root: directory holding the store.
+        :param schema: database schema to read the index admissions' discharge times from.
+        """
+        self.root = root
+        self.schema = schema
+        self._as_of = None
+
+    def as_of_times(self):
+        """Return a Series of the time at which each index admission's features become valid."""
+        if self._as_of is None:
+            query = """
+                SELECT hsp_acct_study_id, discharge_date_time
+                  FROM {}.bayes_vw_index_admissions
+            """.format(self.schema)
+            res = pd.read_sql(query, postgres.get_connection(), index_col='hsp_acct_study_id')
+            self._as_of = res.discharge_date_time
+        return self._as_of
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *[str(p) for p in parts])
+
+    def write(self, extractor):
+        """
+        Write the results of an extractor run to the store.
+
+        :param extractor: a :class:`FeatureExtractor` that has just run `extract()`.
+        :returns: the path written, or None if the extractor didn't emit anything.
+        """
+        if not extractor._data_store:
+            return None
+
+        features = pd.DataFrame.from_dict(extractor._data_store, orient='index')
+        # Row ids are emitted as strings.
+        features.index = pd.to_numeric(features.index).astype(np.int64)
+        features.index.name = 'hsp_acct_study_id'
+        features.sort_index(inplace=True)
+        features.insert(0, 'as_of', self.as_of_times().reindex(features.index).values)
+
+        directory = self._path(extractor.name, extractor.hash)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        meta = {'name': extractor.name,
+                'hash': extractor.hash,
+                'written_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime()),
+                'missing': {k: v['missing'] for k, v in extractor._meta_store.items()
+                            if v['missing'] is not None}}
+        with open(os.path.join(directory, META_FILE), 'w') as f:
+            json.dump(meta, f, indent=2, sort_keys=True)
+
+        name = 'part-{}'.format(int(time.time() * 1e6))
+        log.info('writing %d rows of %s to the feature store ...' % (len(features), extractor.name))
+        return write_partition(features, directory, name)
+
+    def extractors(self):
+        """Return the names of the extractors in the store."""
+        if not os.path.exists(self.root):
+            return []
+        return sorted(os.listdir(self.root))
+
+    def versions(self, name):
+        """Return the metadata of each stored version of an extractor, oldest first."""
+        metas = []
+        for extractor_hash in os.listdir(self._path(name)):
+            with open(self._path(name, extractor_hash, META_FILE)) as f:
+                metas.append(json.load(f))
+        return sorted(metas, key=lambda meta: meta['written_at'])
+
+    def _read(self, name, extractor_hash, as_of):
+        """Return the features of an extractor and the values to fill its missing cells with."""
+        if extractor_hash is None:
+            extractor_hash = self.versions(name)[-1]['hash']
+        directory = self._path(name, extractor_hash)
+        frames = []
+        for fname in os.listdir(directory):
+            if fname.startswith('part-'):
+                part = _read_part(os.path.join(directory, fname))
+                part['written_at'] = _written_at(fname)
+                frames.append(part)
+        features = pd.concat(frames, sort=False)
+
+        # Writes made after `as_of` weren't known then.
+        if as_of is not None:
+            features = features[features.written_at.values <= _cutoff(as_of, features.index)]
+
+        # An account written more than once (e.g. by overlapping runs) keeps its latest write.
+        features = features.sort_values('written_at', kind='mergesort')
+        features = features[~features.index.duplicated(keep='last')].sort_index()
+
+        if as_of is not None:
+            features = features[features.as_of.values <= _cutoff(as_of, features.index)]
+
+        with open(os.path.join(directory, META_FILE)) as f:
+            missing = json.load(f)['missing']
+        return features.drop(['as_of', 'written_at'], axis=1), missing
+
+    def read_extractor(self, name, extractor_hash=None, as_of=None):
+        """
+        Read the features of one extractor, as known at a point in time.
+
+        :param extractor_hash: version of the extractor to read (default: the latest written).
+        :param as_of: only return accounts whose features were valid at this time, with the
+            values of their latest write up to this time. Either a single timestamp, or a Series
+            of timestamps indexed by hsp_acct_study_id.
+        :returns: a DataFrame indexed by hsp_acct_study_id, without the `as_of` column.
+        """
+        features, missing = self._read(name, extractor_hash, as_of)
+        return features.fillna(missing)
+
+    def read(self, names=None, hashes=None, as_of=None):
+        """
+        Read the feature matrix of several extractors, as known at a point in time.
+
+        :param names: extractor names (default: all extractors in the store).
+        :param hashes: optional dict of {extractor name: hash} pinning extractor versions.
+        :param as_of: see `read_extractor`.
+        """
+        names = names or self.extractors()
+        hashes = hashes or {}
+        frames, missing = [], {}
+        for name in names:
+            features, extractor_missing = self._read(name, hashes.get(name), as_of)
+            frames.append(features)
+            missing.update(extractor_missing)
+
+        # As in DatabuilderFramework, accounts that an extractor didn't emit get its missing values.
+        features = pd.concat(frames, axis=1, sort=True).fillna(missing)
+        features.index.name = 'hsp_acct_study_id'
+        return features
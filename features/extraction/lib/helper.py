@@ -13,6 +13,7 @@ import pandas as pd
 import sklearn.metrics as sk_m
 
 import sutter
+from sutter.lib.feature_categorizers import render_categories
 
 
 def get_metrics(predictions, actual, intervention_threshold=None):
@@ -34,32 +35,107 @@ def get_metrics(predictions, actual, intervention_threshold=None):
     }
 
     if intervention_threshold is not None:
-        intervened = np.array(predictions > intervention_threshold).astype(bool)
-        actual = np.array(actual).astype(bool)
-
-        tp = float((intervened & actual).sum())
-        tn = float((~intervened & ~actual).sum())
-        fp = float((intervened & ~actual).sum())
-        fn = float((~intervened & actual).sum())
-        p = float(intervened.sum())
-        n = float((~intervened).sum())
-
-        metrics['precision'] = tp / p if p else np.nan
-        metrics['recall'] = tp / actual.sum() if actual.sum() else np.nan
-        metrics['sensitivity'] = metrics['recall']
-        metrics['specificity'] = tn / (~actual).sum() if (~actual).sum() else np.nan
-        metrics['num_intervened'] = p
-        metrics['num_intervened_correct'] = tp
-        metrics['fraction_intervened'] = float(p) / (p + n) if (p + n) else np.nan
-        metrics['ppv'] = metrics['precision']
-        metrics['npv'] = tn / n if n else np.nan
-        metrics['tp'] = tp
-        metrics['tn'] = tn
-        metrics['fp'] = fp
-        metrics['fn'] = fn
+        threshold_metrics = get_threshold_metrics(predictions, actual, [intervention_threshold])
+        metrics.update(threshold_metrics.iloc[0].to_dict())
     return metrics
 
 
+def _confusion_metrics(tp, fp, tn, fn, index):
+    """Return a DataFrame of metrics from arrays of confusion matrix counts (one row per entry)."""
+    tp, fp, tn, fn = [np.asarray(x, dtype=float) for x in (tp, fp, tn, fn)]
+    p, n = tp + fp, tn + fn  # intervened, not intervened
+
+    def ratio(num, den):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(den > 0, num / den, np.nan)
+
+    metrics = pd.DataFrame(index=index)
+    metrics['precision'] = ratio(tp, p)
+    metrics['recall'] = ratio(tp, tp + fn)
+    metrics['sensitivity'] = metrics['recall']
+    metrics['specificity'] = ratio(tn, tn + fp)
+    metrics['num_intervened'] = p
+    metrics['num_intervened_correct'] = tp
+    metrics['fraction_intervened'] = ratio(p, p + n)
+    metrics['ppv'] = metrics['precision']
+    metrics['npv'] = ratio(tn, n)
+    metrics['tp'] = tp
+    metrics['tn'] = tn
+    metrics['fp'] = fp
+    metrics['fn'] = fn
+    return metrics
+
+
+def get_threshold_metrics(predictions, actual, thresholds):
+    """
+    Return the intervention metrics of `get_metrics` for many thresholds at once.
+
+    Patients are intervened on if their prediction is > threshold, so patients without a
+    prediction (NaN) are never intervened on. The predictions are sorted once, and the confusion
+    matrix for every threshold is read off a cumulative sum of the sorted labels, so sweeping
+    thousands of thresholds costs about as much as a single one.
+
+    :returns: a DataFrame with one row per threshold (indexed by threshold).
+    """
+    predictions = np.asarray(predictions, dtype=float)
+    # NaN > threshold is False, as -inf > threshold is (argsort would sort NaNs last instead).
+    predictions = np.where(np.isnan(predictions), -np.inf, predictions)
+    actual = np.asarray(actual).astype(bool)
+    thresholds = np.asarray(thresholds, dtype=float)
+
+    order = np.argsort(predictions, kind='mergesort')
+    # cum_pos[i] is the number of positives among the i lowest predictions.
+    cum_pos = np.concatenate([[0], np.cumsum(actual[order])])
+    num_not_intervened = np.searchsorted(predictions[order], thresholds, side='right')
+
+    fn = cum_pos[num_not_intervened]
+    tn = num_not_intervened - fn
+    tp = cum_pos[-1] - fn
+    fp = (len(predictions) - num_not_intervened) - tp
+    return _confusion_metrics(tp, fp, tn, fn, pd.Index(thresholds, name='threshold'))
+
+
+def get_capacity_metrics(predictions, actual, capacities, groups=None):
+    """
+    Return the intervention metrics of `get_metrics` for intervening on the top-k patients.
+
+    Patients without a prediction (NaN) rank last, as in `get_threshold_metrics`: they are only
+    intervened on if the capacity exceeds the number of the other patients of their group.
+
+    :param capacities: array of k's (the number of patients that can be intervened on).
+    :param groups: optional array (e.g. hospital names) giving each prediction's group. If
+        given, each group intervenes on its own top-k patients.
+    :returns: a DataFrame with one row per capacity (indexed by capacity).
+    """
+    predictions = np.asarray(predictions, dtype=float)
+    predictions = np.where(np.isnan(predictions), -np.inf, predictions)
+    actual = np.asarray(actual).astype(bool)
+    capacities = np.asarray(capacities, dtype=int)
+    if groups is None:
+        group_codes = np.zeros(len(predictions), dtype=int)
+    else:
+        group_codes = pd.factorize(np.asarray(groups))[0]
+
+    # Sort by group, then by decreasing prediction within each group.
+    order = np.lexsort((-predictions, group_codes))
+    cum_pos = np.concatenate([[0], np.cumsum(actual[order])])
+    group_sizes = np.bincount(group_codes)
+    group_starts = np.concatenate([[0], np.cumsum(group_sizes)[:-1]])
+
+    # intervened[g, k] = min(k, size of group g); tp is summed over groups.
+    intervened = np.minimum(capacities[np.newaxis, :], group_sizes[:, np.newaxis])
+    tp_per_group = (cum_pos[group_starts[:, np.newaxis] + intervened] -
+                    cum_pos[group_starts][:, np.newaxis])
+    tp = tp_per_group.sum(axis=0)
+    p = intervened.sum(axis=0)
+
+    total_pos = cum_pos[-1]
+    fp = p - tp
+    fn = total_pos - tp
+    tn = (len(predictions) - p) - fn
+    return _confusion_metrics(tp, fp, tn, fn, pd.Index(capacities, name='capacity'))
+
+
 def combine_fold_metrics(folds):
     """Combine a list of dictionaries into one by averaging their numeric values."""
     combined = {}
@@ -204,7 +280,7 @@ def get_view_query(feature_name):
         if fnmatch.fnmatch(file, fname):
             print("Loading script from %s." % file)
             with open(os.path.join(views_path, file), 'r') as sql:
-                query = sql.read()
+                query = render_categories(sql.read())
                 return query
     print("Could not find a view file for %s!" % feature_name)
     return False
@@ -0,0 +1,313 @@
+"""
+In-memory ICD-9 crosswalk lookups.
+
+The HCUP CCS tables (`bayes_hcup_ccs_dx`, `bayes_hcup_ccs_pr`) and the Charlson crosswalk
+(`icd_9_cci_xwalk`) store codes in the quoted, space-padded form produced by
+`helper.format_icd9_code` (e.g. `'4280 '`), so joining against them means re-formatting every
+code with `rpad/replace/format`. Here, codes are instead encoded as integers and looked up in a
+sorted key array, which maps millions of codes in one vectorized call:
+
+    crosswalks = load_crosswalks()
+    ccs = crosswalks['ccs_dx'].lookup(problems['icd9'], 'ccs_category_description')
+    charlson = crosswalks['charlson'].lookup(dx['ref_bill_code'], ['condition_cat', 'weight'])
+
+Codes are normalized by dropping quotes, dots and whitespace, then right-padded to 5 characters,
+so '428.0', '4280' and "'4280 '" all map to the same key (as they do in the SQL joins), while
+'4280' and '42800' remain different codes. ICD-9-CM codes have at most 5 characters (e.g.
+'V4581', 'E8889'): longer codes are malformed, and map to MISSING (NULL in SQL), whereas the
+`rpad(code, 5)` of the former joins truncated them, e.g. matching '428001' with '42800'. Codes
+must be strings, since numbers lose their leading zeros ('0389') and trailing dots ('428.0').
+
+`create_key_columns` stores the same keys in the database (as indexed `icd_9_cm_key` columns),
+so that views can join on them too. Triggers compute the keys of the rows inserted later, so
+that new diagnoses and problems don't drop out of the views.
+"""
+
+import logging
+
+import numpy as np
+
+import pandas as pd
+
+from sutter.lib import postgres
+
+log = logging.getLogger('sutter.lib.icd9')
+
+CODE_WIDTH = 5
+# Each character of a padded code is one base-37 digit: ' ' is 0, '0'-'9' are 1-10 and
+# 'A'-'Z' are 11-36. 37 ** 5 keys fit comfortably in an int64.
+_ALPHABET = ' 0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_BASE = len(_ALPHABET)
+_DIGITS = np.full(256, -1, dtype=np.int64)
+_DIGITS[[ord(ch) for ch in _ALPHABET]] = np.arange(_BASE)
+_POWERS = _BASE ** np.arange(CODE_WIDTH - 1, -1, -1, dtype=np.int64)
+
+MISSING = -1
+
+CROSSWALK_TABLES = {
+    'ccs_dx': 'bayes_hcup_ccs_dx',
+    'ccs_pr': 'bayes_hcup_ccs_pr',
+    'charlson': 'icd_9_cci_xwalk',
+}
+
+# Tables that get an indexed `icd_9_cm_key` column computed from their `icd_9_cm_code` column.
+KEY_TABLES = ['icd_9_cci_xwalk', 'bayes_hcup_ccs_dx', 'bayes_hcup_ccs_pr', 'px_id_xwalk',
+              'hospital_dx', 'encounter_dx', 'hospital_problems']
+# One row per (account, code) in the comma-separated code lists of hospital_problems.
+PROBLEM_CODES_TABLE = 'bayes_hospital_problem_codes'
+
+# The SQL version of encode_icd9, so that the database computes the same keys.
+KEY_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION icd9_key(code VARCHAR) RETURNS BIGINT AS $$
+    SELECT CASE WHEN c ~ '^[0-9A-Z]{{0,{width}}}$' THEN {key} END
+      FROM (SELECT upper(regexp_replace(code, '[.''[:space:]]', '', 'g')) AS c) normalized
+$$ LANGUAGE SQL IMMUTABLE
+""".format(width=CODE_WIDTH, key=' + '.join(
+    "(strpos('{}', substr(rpad(c, {}), {}, 1)) - 1) * {}::BIGINT".format(
+        _ALPHABET, CODE_WIDTH, i + 1, power) for i, power in enumerate(_POWERS)))
+
+ADD_KEY_COLUMN_SQL = """
+DO $$
+BEGIN
+    ALTER TABLE {0} ADD COLUMN icd_9_cm_key BIGINT;
+EXCEPTION
+    WHEN duplicate_column THEN RAISE NOTICE 'column icd_9_cm_key already exists in {0}.';
+END;
+$$
+"""
+
+# Sets the key of each inserted (or updated) row of the KEY_TABLES.
+KEY_TRIGGER_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION bayes_set_icd9_key() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.icd_9_cm_key := icd9_key(NEW.icd_9_cm_code);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+KEY_TRIGGER_SQL = """
+CREATE TRIGGER {0}_icd_9_cm_key
+BEFORE INSERT OR UPDATE OF icd_9_cm_code ON {0}
+   FOR EACH ROW EXECUTE PROCEDURE bayes_set_icd9_key()
+"""
+
+# {0} is the hospital_problems rows to split into codes.
+PROBLEM_CODES_SQL = """
+SELECT DISTINCT hsp_acct_study_id,
+       icd9_key(icd9) AS icd_9_cm_key
+  FROM (SELECT hsp_acct_study_id,
+               unnest(string_to_array(concat_ws(', ', ref_bill_code, current_icd9_list), ', ')) icd9
+          FROM {0}) problems
+"""
+
+# Keeps PROBLEM_CODES_TABLE up to date with hospital_problems: the codes of inserted rows are
+# added, and the codes of the accounts whose rows are updated or deleted are recomputed.
+PROBLEM_CODES_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION bayes_sync_problem_codes() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM {table} WHERE hsp_acct_study_id = OLD.hsp_acct_study_id;
+        INSERT INTO {table} {account_codes};
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {table}
+        SELECT *
+          FROM ({new_codes}) new_codes
+         WHERE NOT EXISTS (SELECT 1
+                             FROM {table} codes
+                            WHERE codes.hsp_acct_study_id = new_codes.hsp_acct_study_id
+                              AND codes.icd_9_cm_key IS NOT DISTINCT FROM new_codes.icd_9_cm_key);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""".format(table=PROBLEM_CODES_TABLE,
+           account_codes=PROBLEM_CODES_SQL.format(
+               '(SELECT * FROM hospital_problems '
+               'WHERE hsp_acct_study_id = OLD.hsp_acct_study_id) account_problems'),
+           new_codes=PROBLEM_CODES_SQL.format('(SELECT (NEW).*) new_problem'))
+
+PROBLEM_CODES_TRIGGER_SQL = """
+CREATE TRIGGER hospital_problems_problem_codes
+ AFTER INSERT OR UPDATE OR DELETE ON hospital_problems
+   FOR EACH ROW EXECUTE PROCEDURE bayes_sync_problem_codes()
+"""
+
+# Crosswalks are small and static, so they are loaded at most once per process.
+_crosswalks = {}
+
+
+def normalize_icd9(codes):
+    """
+    Return the codes as a Series of unquoted, undotted codes right-padded to 5 characters.
+
+    :raises TypeError: if a code is neither a string nor null.
+    """
+    codes = pd.Series(codes).astype(object)
+    not_strings = [c for c in codes[codes.notnull()] if not isinstance(c, basestring)]
+    if not_strings:
+        raise TypeError('ICD-9 codes must be strings, got {!r}'.format(not_strings[0]))
+    return codes.str.replace(r"[.'\s]", '').str.upper().str.ljust(CODE_WIDTH)
+
+
+def encode_icd9(codes):
+    """
+    Encode ICD-9 codes as int64 keys.
+
+    :param codes: array-like of codes (strings), in any of the raw, dotted or `'%5s'` formats.
+    :returns: an int64 array, with MISSING for null or malformed codes.
+    :raises TypeError: if a code is neither a string nor null.
+    """
+    # There are only ~15k distinct ICD-9 codes, so only the distinct values are normalized.
+    labels, uniques = pd.factorize(np.asarray(codes, dtype=object))
+    uniques = normalize_icd9(uniques)
+    valid = (uniques.str.len() == CODE_WIDTH).values
+    unique_keys = np.full(len(uniques) + 1, MISSING, dtype=np.int64)  # last entry: nulls
+    if valid.any():
+        chars = np.frombuffer(uniques.values[valid].astype('S%d' % CODE_WIDTH).tobytes(),
+                              dtype=np.uint8).reshape(-1, CODE_WIDTH)
+        digits = _DIGITS[chars]
+        unique_keys[:-1][valid] = np.where((digits >= 0).all(axis=1), digits.dot(_POWERS),
+                                           MISSING)
+    return unique_keys[labels]
+
+
+def decode_icd9(keys):
+    """Decode int64 keys back into padded codes (None for MISSING)."""
+    keys = np.asarray(keys, dtype=np.int64)
+    alphabet = np.array(list(_ALPHABET), dtype=object)
+    digits = (keys[:, np.newaxis] // _POWERS) % _BASE
+    codes = alphabet[digits].sum(axis=1) if len(keys) else np.array([], dtype=object)
+    return np.where(keys >= 0, codes, None)
+
+
+class CodeTable(object):
+    """A crosswalk table indexed by integer-encoded ICD-9 code."""
+
+    def __init__(self, df, code_column='icd_9_cm_code'):
+        """
+        Index the crosswalk `df` by its code column.
+
+        :param df: DataFrame with a code column and one or more value columns.
+        :param code_column: name of the code column.
+        """
+        keys = encode_icd9(df[code_column])
+        valid = keys != MISSING
+        if not valid.all():
+            log.warning('dropping %d malformed codes from the crosswalk' % (~valid).sum())
+
+        order = np.argsort(keys[valid], kind='mergesort')
+        keys = keys[valid][order]
+        values = df.drop(code_column, axis=1)[valid].iloc[order]
+
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        if not first.all():
+            log.warning('%d duplicate codes in the crosswalk, keeping the first of each' %
+                        (~first).sum())
+
+        self.keys = keys[first]
+        self.values = values[first].reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def positions(self, codes):
+        """Return the row of each code in `self.values`, or MISSING if it isn't in the table."""
+        keys = encode_icd9(codes)
+        if not len(self.keys):
+            return np.full(len(keys), MISSING, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where((self.keys[pos] == keys) & (keys != MISSING), pos, MISSING)
+
+    def lookup(self, codes, columns=None):
+        """
+        Map codes to crosswalk values.
+
+        :param codes: array-like of codes. If a Series, its index is kept.
+        :param columns: a column name (returns a Series) or list of names (returns a DataFrame).
+            Defaults to all value columns.
+        :returns: values aligned with `codes`, NaN where the code isn't in the table.
+        """
+        values = self.values if columns is None else self.values[columns]
+        result = values.reindex(self.positions(codes))
+        result.index = codes.index if isinstance(codes, pd.Series) else pd.RangeIndex(len(codes))
+        return result
+
+
+def load_crosswalks(engine=None, reload=False):
+    """
+    Load the ICD-9 crosswalks from the database.
+
+    :returns: dict with 'ccs_dx', 'ccs_pr' and 'charlson' :class:`CodeTable` entries.
+    """
+    if _crosswalks and not reload:
+        return _crosswalks
+
+    engine = engine or postgres.get_connection()
+    for name, table_name in CROSSWALK_TABLES.iteritems():
+        log.info('loading %s ...' % table_name)
+        _crosswalks[name] = CodeTable(pd.read_sql_table(table_name, engine))
+    return _crosswalks
+
+
+def create_key_columns(connection):
+    """
+    (Re-)compute the integer ICD-9 keys in the database, and keep them up to date.
+
+    Creates the `icd9_key(code)` SQL function, fills an indexed `icd_9_cm_key` column on each of
+    KEY_TABLES and rebuilds PROBLEM_CODES_TABLE, so that views can join on integer keys rather
+    than re-formatting codes for every row. Triggers then compute the keys of the rows inserted
+    or updated later (including rows appended by `upload.bulk_load`), and add their codes to
+    PROBLEM_CODES_TABLE. Triggers don't survive re-creating the tables, so this must be re-run
+    whenever they are replaced (e.g. `bulk_load(..., if_exists='replace')`).
+
+    Runs in a transaction (see `postgres.transaction`).
+
+    :param connection: SQLAlchemy engine or connection (e.g. `op.get_bind()` in a migration).
+    """
+    with postgres.transaction(connection) as conn:
+        _drop_triggers(conn)
+        conn.execute(KEY_FUNCTION_SQL)
+        conn.execute(KEY_TRIGGER_FUNCTION_SQL)
+        for table_name in KEY_TABLES:
+            log.info('computing icd_9_cm_key on %s ...' % table_name)
+            conn.execute(ADD_KEY_COLUMN_SQL.format(table_name))
+            conn.execute("UPDATE {} SET icd_9_cm_key = icd9_key(icd_9_cm_code)".format(
+                table_name))
+            conn.execute("DROP INDEX IF EXISTS {0}_icd_9_cm_key".format(table_name))
+            conn.execute("CREATE INDEX {0}_icd_9_cm_key ON {0} (icd_9_cm_key)".format(
+                table_name))
+            conn.execute(KEY_TRIGGER_SQL.format(table_name))
+            conn.execute("ANALYZE {}".format(table_name))
+
+        log.info('creating %s ...' % PROBLEM_CODES_TABLE)
+        conn.execute("DROP TABLE IF EXISTS {}".format(PROBLEM_CODES_TABLE))
+        conn.execute("CREATE TABLE {} AS {}".format(
+            PROBLEM_CODES_TABLE, PROBLEM_CODES_SQL.format('hospital_problems')))
+        for col in ['hsp_acct_study_id', 'icd_9_cm_key']:
+            conn.execute("CREATE INDEX {0}_{1} ON {0} ({1})".format(PROBLEM_CODES_TABLE, col))
+        conn.execute(PROBLEM_CODES_FUNCTION_SQL)
+        conn.execute(PROBLEM_CODES_TRIGGER_SQL)
+        conn.execute("ANALYZE {}".format(PROBLEM_CODES_TABLE))
+
+
+def _drop_triggers(connection):
+    for table_name in KEY_TABLES:
+        connection.execute("DROP TRIGGER IF EXISTS {0}_icd_9_cm_key ON {0}".format(table_name))
+    connection.execute("DROP TRIGGER IF EXISTS hospital_problems_problem_codes "
+                       "ON hospital_problems")
+    connection.execute("DROP FUNCTION IF EXISTS bayes_set_icd9_key()")
+    connection.execute("DROP FUNCTION IF EXISTS bayes_sync_problem_codes()")
+
+
+def drop_key_columns(connection):
+    """Undo `create_key_columns`."""
+    with postgres.transaction(connection) as conn:
+        _drop_triggers(conn)
+        conn.execute("DROP TABLE IF EXISTS {}".format(PROBLEM_CODES_TABLE))
+        for table_name in KEY_TABLES:
+            conn.execute("ALTER TABLE {} DROP COLUMN IF EXISTS icd_9_cm_key CASCADE".format(
+                table_name))
+        conn.execute("DROP FUNCTION IF EXISTS icd9_key(VARCHAR)")
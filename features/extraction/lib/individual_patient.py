@@ -7,6 +7,9 @@ Provides methods to get different data for that account/patient.
 
 import pandas as pd
 
+from sutter.lib import encounter_map
+from sutter.lib.postgres import run_concurrently
+
 
 class Account(object):
     """Hospital Account object with methods to get data from different tables."""
@@ -16,6 +19,37 @@ class Account(object):
         self.engine = engine
         self.hsp_id = hsp_id
         self.pat_id = self._get_pat_id()
+        # The encounter queries join through the encounter map, which may predate the account
+        # (or the encounters of its stay).
+        encounter_map.map_accounts([hsp_id], engine)
+
+    def load_all(self, n_threads=8):
+        """
+        Fetch all the data about the account, running independent queries concurrently.
+
+        The queries run in three stages: the hospital account (which sets the admission and
+        discharge dates), then everything that only depends on those, then the order results
+        (which depend on the encounter picked by `_get_order_procedures`).
+
+        :returns: dict of {name: DataFrame}, e.g. 'encounters' for `_get_encounters()`.
+        """
+        data = {'hospital_account': self._get_hospital_account()}
+        data.update(run_concurrently({
+            'demographics': self._get_demographics,
+            'encounters': self._get_encounters,
+            'encounters_dx': self._get_encounters_dx,
+            'encounters_rsn': self._get_encounters_rsn,
+            'order_medications': self._get_order_medications,
+            'order_procedures': self._get_order_procedures,
+            'problem_list': self._get_problem_list,
+            'hospital_problems': self._get_hospital_problems,
+            'health_history': self._get_health_history,
+            'hospital_dx': self._get_hospital_dx,
+            'hospital_procedures': self._get_hospital_procedures,
+            'hospital_cpt': self._get_hospital_cpt,
+        }, n_threads))
+        data['order_results'] = self._get_order_results()
+        return data
 
     def _get_pat_id(self):
         q = """SELECT hsp_acct_study_id, pat_study_id
@@ -63,12 +97,11 @@ class Account(object):
         query = """
             select
                 enc.*
-            from encounters enc
-            where enc.pat_study_id = {}
-            and contact_date >= '{}'::date
-            and contact_date <= '{}'::date
-            order by contact_date
-    """.format(self.pat_id, str(self.adm_date).split(' ')[0], str(self.disch_date).split(' ')[0])
+            from bayes_account_encounters stay
+            join encounters enc using (enc_study_id)
+            where stay.hsp_acct_study_id = {}
+            order by enc.contact_date
+    """.format(self.hsp_id)
         res = pd.read_sql(query, self.engine)
         msg_str = """There are %d encounters in that period. All except %d has hsp_acct_study_id."""
 
@@ -84,13 +117,12 @@ class Account(object):
                 dx.line,
                 dx.dx_code,
                 dx.dx_name
-            from encounters enc
+            from bayes_account_encounters stay
+            join encounters enc using (enc_study_id)
             left join encounter_dx dx using (enc_study_id)
-            where enc.pat_study_id = {}
-            and contact_date >= '{}'::date
-            and contact_date <= '{}'::date
+            where stay.hsp_acct_study_id = {}
             order by enc.contact_date, enc.enc_study_id
-    """.format(self.pat_id, str(self.adm_date).split(' ')[0], str(self.disch_date).split(' ')[0])
+    """.format(self.hsp_id)
         res = pd.read_sql(query, self.engine)
 
         self.enc_dx_list = set(res.dx_code.unique())
@@ -104,13 +136,12 @@ class Account(object):
                 enc.enc_type_name,
                 rsn.line,
                 rsn.enc_reason_name
-            from encounters enc
+            from bayes_account_encounters stay
+            join encounters enc using (enc_study_id)
             left join encounter_rsn rsn using (enc_study_id)
-            where enc.pat_study_id = {}
-            and contact_date >= '{}'::date
-            and contact_date <= '{}'::date
+            where stay.hsp_acct_study_id = {}
             order by enc.contact_date, enc.enc_study_id
-    """.format(self.pat_id, str(self.adm_date).split(' ')[0], str(self.disch_date).split(' ')[0])
+    """.format(self.hsp_id)
         res = pd.read_sql(query, self.engine)
         return res
 
@@ -121,13 +152,12 @@ class Account(object):
                 enc.enc_study_id encounter_study_id,
                 enc.enc_type_name,
                 med.*
-            from encounters enc
+            from bayes_account_encounters stay
+            join encounters enc using (enc_study_id)
             left join order_medication med using (enc_study_id)
-            where enc.pat_study_id = {}
-            and contact_date >= '{}'::date
-            and contact_date <= '{}'::date
+            where stay.hsp_acct_study_id = {}
             order by enc.contact_date, enc.enc_study_id
-    """.format(self.pat_id, str(self.adm_date).split(' ')[0], str(self.disch_date).split(' ')[0])
+    """.format(self.hsp_id)
         res = pd.read_sql(query, self.engine)
 
         print("%d unique medicines have been ordered." % res.order_med_study_id.nunique())
@@ -140,13 +170,12 @@ class Account(object):
                 enc.enc_study_id encounter_study_id,
                 enc.enc_type_name,
                 proc.*
-            from encounters enc
+            from bayes_account_encounters stay
+            join encounters enc using (enc_study_id)
             left join order_procedures proc using (enc_study_id)
-            where enc.pat_study_id = {}
-            and contact_date >= '{}'::date
-            and contact_date <= '{}'::date
+            where stay.hsp_acct_study_id = {}
             order by enc.contact_date, enc.enc_study_id
-    """.format(self.pat_id, str(self.adm_date).split(' ')[0], str(self.disch_date).split(' ')[0])
+    """.format(self.hsp_id)
         res = pd.read_sql(query, self.engine)
 
         print("%d unique procedures have been ordered." % res.order_proc_study_id.nunique())
@@ -206,13 +235,12 @@ class Account(object):
                 enc.enc_study_id encounter_study_id,
                 enc.enc_type_name,
                 social.*
-            from encounters enc
+            from bayes_account_encounters stay
+            join encounters enc using (enc_study_id)
             left join social_hx social using (enc_study_id)
-            where enc.pat_study_id = {}
-            and contact_date >= '{}'::date
-            and contact_date <= '{}'::date
+            where stay.hsp_acct_study_id = {}
             order by enc.contact_date, enc.enc_study_id
-    """.format(self.pat_id, str(self.adm_date).split(' ')[0], str(self.disch_date).split(' ')[0])
+    """.format(self.hsp_id)
         res = pd.read_sql(query, self.engine)
         return res
 
@@ -1,9 +1,16 @@
 """Database-related methods."""
 
+import os
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+
 import sqlalchemy as sa
 
 from sutter.lib import config
 
+# Engines (and so their connection pools) are shared within a process.
+_engines = {}
+
 
 def get_connection():
     """
@@ -14,9 +21,15 @@ def get_connection():
 
     Information for the connection read from our config system. This allows
     to use the connection e.g. with pd.read_sql(query, connection)
+
+    The SUTTER_DB env variable, if set, overrides the configured default database
+    (e.g. to point the benchmarks at a scratch database).
+
+    The engine is created once per process and database, so that its pooled connections are
+    reused across queries (and can be used from several threads, see `run_concurrently`).
     """
     config.reload()
-    db_name = config.get("default-db")
+    db_name = os.environ.get('SUTTER_DB') or config.get("default-db")
     db_config = config.get("databases.{}".format(db_name))
 
     config_string = "postgresql://{}:{}@{}:{}/{}".format(db_config['user'],
@@ -24,4 +37,54 @@ def get_connection():
                                                          db_config['host'],
                                                          db_config['port'],
                                                          db_config['database'])
-    return sa.create_engine(config_string)
+    # Keyed by pid too, since pooled connections must not be shared with forked processes.
+    key = (os.getpid(), config_string)
+    if key not in _engines:
+        _engines[key] = sa.create_engine(config_string, pool_size=8, max_overflow=8)
+    return _engines[key]
+
+
+@contextmanager
+def transaction(connection):
+    """
+    Run the statements of a `with` block in a transaction, committed at the end of the block.
+
+    Engines only autocommit statements that look like they change data (INSERT, CREATE, ...),
+    so e.g. `SELECT bayes_refresh_admissions()` or a `DO` block would be rolled back when the
+    connection is returned to the pool. Within a transaction (e.g. `op.get_bind()` in a
+    migration), the statements are part of it, and committed with it.
+
+        with transaction(engine) as conn:
+            conn.execute("SELECT bayes_refresh_admissions()")
+
+    :param connection: SQLAlchemy engine or connection.
+    """
+    if isinstance(connection, sa.engine.Engine):
+        with connection.begin() as conn:
+            yield conn
+    else:
+        with connection.begin():
+            yield connection
+
+
+def run_concurrently(tasks, n_threads=8):
+    """
+    Run independent database-bound functions concurrently, in a pool of threads.
+
+    psycopg2 releases the GIL while waiting for the server, so e.g. the independent queries
+    about one account take as long as the slowest of them rather than the sum of them all.
+
+    :param tasks: dict of {name: function taking no arguments}.
+    :returns: dict of {name: return value}.
+    """
+    if n_threads <= 1 or len(tasks) <= 1:
+        return {name: func() for name, func in tasks.iteritems()}
+
+    names = list(tasks)
+    pool = ThreadPool(min(n_threads, len(names)))
+    try:
+        results = pool.map(lambda name: tasks[name](), names)
+    finally:
+        pool.close()
+        pool.join()
+    return dict(zip(names, results))
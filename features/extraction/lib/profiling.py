@@ -0,0 +1,149 @@
+"""
+Timing and resource instrumentation for the feature extraction pipeline.
+
+Each feature extractor gets an `ExtractorProfile` that records how long it spent waiting on the
+database, transforming data in pandas and emitting cells, along with the peak RSS of the process
+and whether its results came from the cache. `write_run_report` dumps these as a JSON run report
+that can be diffed between runs to spot regressions.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import resource
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger('sutter.lib.profiling')
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of the current process, in megabytes."""
+    # ru_maxrss is reported in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class ExtractorProfile(object):
+    """Timing and resource counters collected during a single feature extractor run."""
+
+    def __init__(self, name):
+        """Instantiate an empty profile for the extractor with the given name."""
+        self.name = name
+        self.cache = None  # 'hit' or 'miss', set by the framework
+        self.num_queries = 0
+        self.query_time = 0.0
+        self.fetch_bytes = 0
+        self.fetch_rows = 0
+        self.extract_time = 0.0
+        self.emit_time = 0.0
+        self.emit_rows = 0
+        self.emit_columns = 0
+        self.duplicates_dropped = 0
+        self.peak_rss_mb = None
+
+    @property
+    def transform_time(self):
+        """Time spent in extract() that was neither spent querying nor emitting."""
+        return max(0.0, self.extract_time - self.query_time - self.emit_time)
+
+    @contextmanager
+    def timed(self, attribute):
+        """Add the wall-clock time spent inside the `with` block to the given attribute."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            setattr(self, attribute, getattr(self, attribute) + time.time() - start)
+
+    def record_query(self, df, elapsed):
+        """Record a query that took `elapsed` seconds and returned the DataFrame `df`."""
+        self.num_queries += 1
+        self.query_time += elapsed
+        self.fetch_rows += len(df)
+        self.fetch_bytes += int(df.memory_usage(index=True, deep=True).sum())
+
+    def record_emit(self, df):
+        """Record the shape of an emitted DataFrame."""
+        self.emit_rows += df.shape[0]
+        self.emit_columns += df.shape[1]
+
+    def to_dict(self):
+        """Return the profile as a JSON-serializable dict."""
+        return {
+            'name': self.name,
+            'cache': self.cache,
+            'num_queries': self.num_queries,
+            'query_time': round(self.query_time, 3),
+            'fetch_bytes': self.fetch_bytes,
+            'fetch_rows': self.fetch_rows,
+            'transform_time': round(self.transform_time, 3),
+            'emit_time': round(self.emit_time, 3),
+            'emit_rows': self.emit_rows,
+            'emit_columns': self.emit_columns,
+            'duplicates_dropped': self.duplicates_dropped,
+            'extract_time': round(self.extract_time, 3),
+            'peak_rss_mb': self.peak_rss_mb,
+        }
+
+
+@contextmanager
+def profile_extractor(name, profile_dir, profiler='cprofile'):
+    """
+    Dump a profile of the code run inside the `with` block to `profile_dir`.
+
+    :param name: name of the extractor, used as the file name.
+    :param profile_dir: directory to write to. If None, nothing is profiled.
+    :param profiler: 'cprofile' (writes `<name>.prof`, readable with pstats or snakeviz) or
+        'pyinstrument' (writes `<name>.txt`). Falls back to cProfile if pyinstrument is missing.
+    """
+    if profile_dir is None:
+        yield
+        return
+
+    if not os.path.exists(profile_dir):
+        os.makedirs(profile_dir)
+
+    if profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            log.warning('pyinstrument is not installed, falling back to cProfile')
+            profiler = 'cprofile'
+
+    if profiler == 'pyinstrument':
+        p = Profiler()
+        p.start()
+        try:
+            yield
+        finally:
+            p.stop()
+            with open(os.path.join(profile_dir, name + '.txt'), 'w') as f:
+                f.write(p.output_text())
+    else:
+        p = cProfile.Profile()
+        p.enable()
+        try:
+            yield
+        finally:
+            p.disable()
+            p.dump_stats(os.path.join(profile_dir, name + '.prof'))
+
+
+def write_run_report(path, profiles, **extra):
+    """
+    Write a JSON report for a pipeline run.
+
+    :param path: where to write the report.
+    :param profiles: iterable of :class:`ExtractorProfile`, in run order.
+    :param extra: additional top-level entries (e.g. assembly time, matrix shape).
+    """
+    report = dict(extra)
+    report['created_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    report['peak_rss_mb'] = peak_rss_mb()
+    report['extractors'] = [p.to_dict() for p in profiles]
+
+    log.info('writing run report to %s ...' % path)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    return report
@@ -0,0 +1,112 @@
+"""
+Readmission labels for any set of horizons and readmission rules, in one sorted pass.
+
+The labels view finds each index admission's next qualifying admission with a `DISTINCT ON`
+inequality join. Here, the qualifying admissions are instead sorted once by (patient, admit
+time), and the next one after each index discharge is found with a single `searchsorted`:
+
+    stays = ...  # all inpatient stays, e.g. from bayes_inpatient_admissions
+    labels = readmission_labels(index_admissions, stays, horizons=[7, 30, 90])
+
+A readmission is the first qualifying stay of the same patient (other than the index stay
+itself) admitted at or after the index discharge. READMISSION_RULES are those of
+`2_vw_index_admissions_and_readmissions.sql`; other definitions of readmission are other lists
+of rules.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+import pandas as pd
+
+from sutter.lib.segments import nanoseconds
+
+TRANSFER_SOURCES = [
+    'Transfer from Another Health Care Facility',
+    'Transfer from One Distinct Unit to another Distinct Unit in Same Hospital',
+    'Transfer from a Hospital (Different Facility)',
+]
+
+# Each rule maps the DataFrame of candidate stays to a boolean mask of those that qualify.
+# As in SQL, stays with a missing value don't qualify.
+READMISSION_RULES = OrderedDict([
+    ('inpatient', lambda stays: stays.acct_type_name == 'Inpatient'),
+    ('not_elective', lambda stays: stays.admission_type_name.notnull() &
+        (stays.admission_type_name != 'Elective')),
+    ('not_transfer', lambda stays: stays.admission_source_name.notnull() &
+        ~stays.admission_source_name.isin(TRANSFER_SOURCES)),
+])
+
+DEFAULT_HORIZONS = [7, 30, 90]
+NS_PER_DAY = 24 * 3600 * 10 ** 9
+
+
+def next_admissions(index, stays, rules=READMISSION_RULES.values(), key='pat_study_id',
+                    stay_id='hsp_acct_study_id'):
+    """
+    Find the next qualifying stay after each index stay.
+
+    :param index: DataFrame with `stay_id`, `key` and `discharge_date_time` columns.
+    :param stays: DataFrame with `stay_id`, `key` and `admit_date_time` columns, plus the
+        columns that `rules` use.
+    :param rules: functions mapping `stays` to a boolean mask of the stays that qualify.
+    :returns: an int64 array of the position in `stays` of each index stay's readmission, or -1.
+    """
+    valid = stays[key].notnull().values & stays.admit_date_time.notnull().values
+    for rule in rules:
+        valid &= np.asarray(rule(stays), dtype=bool)
+    candidates = np.flatnonzero(valid)
+    n = len(candidates)
+    if not n:
+        return np.full(len(index), -1, dtype=np.int64)
+
+    # (patient, time) pairs are encoded as int64 keys that sort like the pairs: patients as
+    # dense codes, times as their rank among all the times involved.
+    pat_codes, _ = pd.factorize(np.concatenate([index[key].values, stays[key].values[candidates]]))
+    index_pat, stay_pat = pat_codes[:len(index)], pat_codes[len(index):]
+    disch_ns = nanoseconds(index.discharge_date_time)[0]
+    admit_ns = nanoseconds(stays.admit_date_time.values[candidates])[0]
+    times, ranks = np.unique(np.concatenate([disch_ns, admit_ns]), return_inverse=True)
+    disch_rank, admit_rank = ranks[:len(index)], ranks[len(index):]
+
+    stay_keys = stay_pat * len(times) + admit_rank
+    order = np.argsort(stay_keys, kind='mergesort')
+    stay_keys, candidates, stay_pat = stay_keys[order], candidates[order], stay_pat[order]
+
+    # The first candidate admitted at or after the discharge, or the one after it if it is the
+    # index stay itself.
+    pos = np.searchsorted(stay_keys, index_pat * len(times) + disch_rank)
+    at = np.minimum(pos, n - 1)
+    pos += (pos < n) & (stays[stay_id].values[candidates[at]] == index[stay_id].values)
+    at = np.minimum(pos, n - 1)
+
+    found = (pos < n) & (stay_pat[at] == index_pat) & (index_pat >= 0) & \
+        index.discharge_date_time.notnull().values
+    return np.where(found, candidates[at], -1)
+
+
+def readmission_labels(index, stays, horizons=DEFAULT_HORIZONS, rules=READMISSION_RULES.values(),
+                       key='pat_study_id', stay_id='hsp_acct_study_id'):
+    """
+    Label each index stay with its days to readmission, and whether it was readmitted in time.
+
+    :param index: DataFrame with `stay_id`, `key` and `discharge_date_time` columns.
+    :param stays: DataFrame with `stay_id`, `key` and `admit_date_time` columns (e.g. all
+        inpatient stays), plus the columns that `rules` use.
+    :param horizons: numbers of days, e.g. [30] for the usual 30-day readmission label.
+    :returns: a DataFrame indexed like `index` with
+        - `days_to_readmit`: complete days between the discharge and the readmission (NaN if
+          there was none), as `date_part('day', admit - discharge)` in Postgres.
+        - `readmit_[n]_day_bool`: whether the patient was readmitted within `n` days.
+    """
+    pos = next_admissions(index, stays, rules, key, stay_id)
+    readmit_ns = np.full(len(index), 0, dtype=np.int64)
+    readmit_ns[pos >= 0] = nanoseconds(stays.admit_date_time.values[pos[pos >= 0]])[0]
+    full_days = (readmit_ns - nanoseconds(index.discharge_date_time)[0]) // NS_PER_DAY
+
+    labels = pd.DataFrame({'days_to_readmit': np.where(pos >= 0, full_days, np.nan)},
+                          index=index.index)
+    for horizon in horizons:
+        labels['readmit_{}_day_bool'.format(horizon)] = (pos >= 0) & (full_days <= horizon)
+    return labels
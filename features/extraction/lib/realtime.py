@@ -0,0 +1,123 @@
+"""
+Compute the features of a single hospital account, e.g. for a patient being discharged today.
+
+Instead of running the batch pipeline over the whole population, every extractor is restricted
+to one account (see `FeatureExtractor.set_account_range`), so the filter on hsp_acct_study_id
+is pushed down into the views and served from the indexes on the raw tables and materialized
+views. The result is then converted into model inputs in the column order of a feature list
+such as features/features_100.txt:
+
+    features = extract_account(hsp_acct_study_id, feature_extractors)
+    model_input = featurize(features, read_feature_list(get_path('features_100.txt')),
+                            fill_values=training_means)
+
+The model was trained on features whose missing values were imputed with the training means
+(see `helper.load_sutter_csv`), so `fill_values` is required to produce model inputs; see
+`training_fill_values`.
+
+The account may have been discharged since the views were last brought up to date (see
+`sutter.lib.views`): the incrementally maintained tables (admissions, diagnoses) are brought up
+to date first, the encounters of the account are mapped (see `encounter_map.map_accounts`), and
+the extractors read the materialized views from their SQL rather than from their last
+rendering.
+"""
+
+import logging
+
+import pandas as pd
+
+from sutter.lib import admissions, dx_events, encounter_map, postgres
+from sutter.lib.databuilder import DatabuilderFramework, reset_extractor
+
+log = logging.getLogger('sutter.lib.realtime')
+
+
+def read_feature_list(path):
+    """Read the ordered feature names from a feature list file (e.g. features_100.txt)."""
+    names = []
+    with open(path) as f:
+        for line in f:
+            if line.strip() and not line.startswith('#') and not line[0].isspace():
+                names.append(line.split(' - ')[0].strip())
+    return names
+
+
+def extract_account(hsp_acct_study_id, feature_extractors, n_threads=8):
+    """
+    Run the feature extractors for a single account.
+
+    :param feature_extractors: extractors supporting `set_account_range` (leave out the
+        ReadmissionExtractor, since the labels of a new discharge aren't known yet).
+    :param n_threads: number of extractors to run concurrently.
+    :returns: a one-row DataFrame of raw features, as assembled by the databuilder.
+    """
+    hsp_acct_study_id = int(hsp_acct_study_id)
+    engine = postgres.get_connection()
+    admissions.refresh_admissions(engine)
+    dx_events.append_dx_events(engine)
+    encounter_map.map_accounts([hsp_acct_study_id], engine)
+
+    framework = DatabuilderFramework(load_state=False)
+    try:
+        for extractor in feature_extractors:
+            reset_extractor(extractor)
+            extractor.set_account_range(hsp_acct_study_id, hsp_acct_study_id + 1)
+            extractor.inline_materialized_views = True
+        features, _ = framework.generate_features(feature_extractors, use_cache=False,
+                                                  n_threads=n_threads)
+    finally:
+        for extractor in feature_extractors:
+            extractor.set_account_range(None, None)
+            extractor.inline_materialized_views = False
+
+    if features.empty:
+        log.warning('no features found for account %d' % hsp_acct_study_id)
+    return features
+
+
+def training_fill_values(features_df):
+    """
+    Return the values that the missing features of the training set were imputed with.
+
+    :param features_df: the training features, as returned by `helper.load_sutter_csv` (whose
+        imputation with the mean of each column leaves the means unchanged).
+    :returns: dict of {column: mean} of the columns that aren't dummies, to be passed to
+        `featurize` (e.g. saved as JSON for `feature_extraction.py --fill-values`).
+    """
+    return {col: float(value) for col, value in features_df.mean().iteritems()
+            if '_cat_' not in col and not pd.isnull(value)}
+
+
+def featurize(features, feature_names, fill_values=None, offsets=None):
+    """
+    Convert raw features into model inputs, as `helper.load_sutter_csv` does for the batch.
+
+    Categorical (`*_cat`) columns are dummified, and the result is reordered to `feature_names`.
+    Dummies (`*_cat_<value>`) that don't appear in `features` are set to 0.
+
+    :param fill_values: dict of {column: value} to impute missing values with (the training
+        means, as imputed by `load_sutter_csv`). If given, it must cover every column of
+        `feature_names` but the dummies.
+    :param offsets: dict of {column: value} to subtract from columns that were normalized over
+        the training population (e.g. the minimum of LabResultsExtractor__tabak_lab_score).
+    :returns: a float DataFrame with the columns `feature_names`.
+    """
+    dummy_cols = [c for c in feature_names if '_cat_' in c]
+    if fill_values is not None:
+        unfilled = [c for c in feature_names if c not in fill_values and c not in dummy_cols]
+        if unfilled:
+            raise ValueError('No fill value for {}'.format(', '.join(unfilled)))
+
+    categorical_cols = [c for c in features.columns if c.endswith('_cat')]
+    dummies = pd.get_dummies(features[categorical_cols].astype('str'))
+    values = features.drop(categorical_cols, axis=1).astype('float')
+    if offsets:
+        for col, offset in offsets.iteritems():
+            if col in values:
+                values[col] -= offset
+
+    result = pd.concat([values, dummies], axis=1).reindex(columns=feature_names)
+    if fill_values:
+        result = result.fillna(fill_values)
+    result[dummy_cols] = result[dummy_cols].fillna(0)
+    return result.astype('float')
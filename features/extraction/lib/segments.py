@@ -0,0 +1,105 @@
+"""
+Per-group aggregates of sorted rows, with segment reductions instead of a groupby.
+
+When rows are sorted by their group keys (e.g. by account, lab component and result time), each
+group is a contiguous segment of the arrays, and every aggregate is one `reduceat` over the
+segment starts: no Python loop over the groups, nor hashing of the keys.
+
+    starts = segment_starts(res.hsp_acct_study_id.values, res.common_name.values)
+    stats = segment_stats(starts, days, res.ord_num_value.values)
+    stats['slope']  # least-squares trend of the values per unit of `days`, for each group
+
+Rows streamed in chunks (e.g. from `FeatureExtractor.read_sql_chunks`) are re-cut at group
+boundaries by `iter_segments`, so that no group is split across two chunks.
+"""
+
+import numpy as np
+
+import pandas as pd
+
+STATS = ['count', 'first', 'last', 'min', 'max', 'slope']
+
+
+def nanoseconds(times):
+    """Return datetimes as int64 nanoseconds, and a mask of the non-null ones."""
+    times = pd.to_datetime(pd.Series(times))
+    return times.values.astype('datetime64[ns]').view(np.int64), times.notnull().values
+
+
+def segment_starts(*keys):
+    """
+    Return the positions where a new group starts.
+
+    :param keys: arrays of the same length, sorted by (keys[0], keys[1], ...).
+    :returns: int64 array of the first position of each group (empty if there are no rows).
+    """
+    n = len(keys[0])
+    if not n:
+        return np.zeros(0, dtype=np.int64)
+    changed = np.zeros(n, dtype=bool)
+    changed[0] = True
+    for key in keys:
+        key = np.asarray(key)
+        changed[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(changed)
+
+
+def segment_stats(starts, times, values):
+    """
+    Compute the count, first, last, min, max and trend of the values of each group.
+
+    :param starts: the first position of each group, as returned by `segment_starts`.
+    :param times: float array of the time of each row (e.g. in days), sorted within each group.
+    :param values: float array of the values, without NaNs.
+    :returns: dict of {stat: array with one value per group}, for each of STATS. `slope` is the
+        least-squares slope of the values against the times, NaN for groups whose rows all have
+        the same time.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    counts = np.diff(np.append(starts, len(values)))
+    ends = starts + counts - 1
+
+    # Times relative to the first of their group, to keep the sums of squares small.
+    x = times - np.repeat(times[starts], counts)
+    sum_x = np.add.reduceat(x, starts)
+    sum_y = np.add.reduceat(values, starts)
+    sum_xy = np.add.reduceat(x * values, starts)
+    sum_xx = np.add.reduceat(x * x, starts)
+    denominator = counts * sum_xx - sum_x * sum_x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(denominator > 0, (counts * sum_xy - sum_x * sum_y) / denominator, np.nan)
+
+    return {
+        'count': counts,
+        'first': values[starts],
+        'last': values[ends],
+        'min': np.minimum.reduceat(values, starts),
+        'max': np.maximum.reduceat(values, starts),
+        'slope': slope,
+    }
+
+
+def iter_segments(chunks, keys):
+    """
+    Re-cut a stream of sorted DataFrames so that every group lies within a single chunk.
+
+    The rows of the last group of each chunk are held back and prepended to the next chunk,
+    since that group may continue there.
+
+    :param chunks: iterable of DataFrames, together sorted by `keys`.
+    :param keys: names of the columns identifying a group.
+    """
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        if not len(chunk):
+            continue
+        starts = segment_starts(*[chunk[key].values for key in keys])
+        cut = starts[-1]
+        carry = chunk.iloc[cut:]
+        if cut:
+            yield chunk.iloc[:cut]
+    if carry is not None and len(carry):
+        yield carry
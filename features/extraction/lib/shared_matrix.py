@@ -0,0 +1,115 @@
+"""
+Share a loaded feature matrix between worker processes without copying it.
+
+Cross-validating the 100/500/full models in a process pool used to mean that every worker either
+re-ran `load_sutter_csv` or received a pickled copy of the feature matrix. Instead, the matrices
+are published once as `.npy` files and each worker memory-maps them read-only, so all processes
+share the same pages of the OS page cache.
+
+Usage:
+    features_df, labels_df = load_sutter_csv(path)
+    publish_matrices(features_df, labels_df, '/dev/shm/sutter')  # tmpfs: never touches disk
+    fold_metrics = map_shared(evaluate_fold, '/dev/shm/sutter', folds, n_jobs=8)
+    combine_fold_metrics(fold_metrics)
+
+where `evaluate_fold(features, labels, fold)` is a module-level function (so that it can be
+pickled) that gets the memory-mapped feature array, the labels DataFrame and one item of `folds`.
+"""
+
+import json
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+import pandas as pd
+
+FEATURES_FILE = 'features.npy'
+INDEX_FILE = 'index.npy'
+META_FILE = 'meta.json'
+
+# Set in each worker process by _init_worker().
+_shared = None
+
+
+def _label_path(directory, i):
+    return os.path.join(directory, 'label_%d.npy' % i)
+
+
+def _load(path):
+    """Memory-map an array, unless it holds Python objects (which can't be memory-mapped)."""
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        return np.load(path, allow_pickle=True)
+
+
+def publish_matrices(features_df, labels_df, directory):
+    """
+    Write the feature and label matrices to `directory` so they can be attached zero-copy.
+
+    The features are stored as a single C-contiguous float array (as produced by
+    `load_sutter_csv`); each label column is stored as its own array, since they have mixed
+    types (e.g. datetimes and day counts).
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    np.save(os.path.join(directory, FEATURES_FILE),
+            np.ascontiguousarray(features_df.values, dtype=np.float64))
+    np.save(os.path.join(directory, INDEX_FILE), features_df.index.values)
+    for i, col in enumerate(labels_df.columns):
+        np.save(_label_path(directory, i), labels_df[col].values)
+
+    with open(os.path.join(directory, META_FILE), 'w') as f:
+        json.dump({'feature_columns': list(features_df.columns),
+                   'label_columns': list(labels_df.columns),
+                   'index_name': features_df.index.name}, f)
+
+
+def attach_matrices(directory):
+    """
+    Attach to matrices published by `publish_matrices`.
+
+    Returns a (features, labels, feature_columns) tuple, where `features` is a read-only
+    memory-mapped array (not copied into this process) and `labels` is a DataFrame.
+    """
+    with open(os.path.join(directory, META_FILE)) as f:
+        meta = json.load(f)
+
+    features = np.load(os.path.join(directory, FEATURES_FILE), mmap_mode='r')
+    index = pd.Index(_load(os.path.join(directory, INDEX_FILE)), name=meta['index_name'])
+    labels = pd.DataFrame({col: _load(_label_path(directory, i))
+                           for i, col in enumerate(meta['label_columns'])},
+                          index=index, columns=meta['label_columns'])
+    return features, labels, meta['feature_columns']
+
+
+def _init_worker(directory):
+    global _shared
+    _shared = attach_matrices(directory)
+
+
+def _run_task(args):
+    func, task = args
+    features, labels, _ = _shared
+    return func(features, labels, task)
+
+
+def map_shared(func, directory, tasks, n_jobs=None):
+    """
+    Run `func(features, labels, task)` for each task in a process pool sharing one matrix.
+
+    :param func: module-level function; `features` is a read-only array, so take fancy-indexed
+        copies (e.g. `features[train_idx]`) rather than modifying it in place.
+    :param directory: directory the matrices were published to with `publish_matrices`.
+    :param tasks: iterable of per-call arguments (e.g. fold indices, model variants).
+    :param n_jobs: number of worker processes (defaults to the number of CPUs).
+    :returns: the list of results, in task order.
+    """
+    pool = Pool(n_jobs, initializer=_init_worker, initargs=(directory,))
+    try:
+        return pool.map(_run_task, [(func, task) for task in tasks])
+    finally:
+        pool.close()
+        pool.join()
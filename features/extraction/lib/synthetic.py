@@ -0,0 +1,562 @@
+"""
+Generate a synthetic, Sutter-shaped dataset for benchmarking.
+
+The real Sutter data can't leave its database, so this module fakes the raw tables that the
+views and feature extractors read (`hospital_account`, `encounters`, `order_medication`,
+`order_results`, `hospital_dx`, ...) with roughly realistic cardinalities:
+
+    * ~3 hospital accounts per patient, ~25% of them inpatient stays
+    * one encounter per day of an inpatient stay, one per outpatient/ER visit
+    * ~2 medication orders per encounter, ~3 results per inpatient lab order
+    * ~8 diagnoses, ~2 problems and ~1 procedure per hospital account
+
+The values themselves are random; only the shapes, key relationships and value domains (the
+strings the views' CASE blocks and WHERE clauses look for) are meant to be realistic.
+
+Usage:
+    SUTTER_DB=<scratch db> python synthetic.py <n_accounts> [seed]
+
+This drops and re-creates the tables in the database given by the `SUTTER_DB` environment
+variable, which must be set: it never falls back to the configured default database. Never point
+it at the real data!
+"""
+
+import logging
+import os
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+import pandas as pd
+
+import psycopg2
+
+from sutter.lib import admissions, dx_events, encounter_map, icd9, postgres
+from sutter.lib.upload import copy_df
+
+log = logging.getLogger('sutter.lib.synthetic')
+
+ACCOUNTS_PER_PATIENT = 3
+START_DATE = np.datetime64('2009-01-01T00:00')
+END_DATE = np.datetime64('2015-12-31T00:00')
+
+ACCT_TYPES = ['Inpatient', 'Outpatient', 'Emergency']
+ACCT_TYPE_P = [0.25, 0.55, 0.20]
+
+PATIENT_STATUSES = [
+    'Discharged to Home or Self Care (Routine Discharge)',
+    'Discharged/transferred to Home Under Care of Organized Home Health Service Org',
+    'Discharged/transferred to Skilled Nursing Facility (SNF) with Medicare Certification',
+    'Discharged/transferred to a Short-Term General Hospital for Inpatient Care',
+    'Hospice - Home',
+    'Expired',
+]
+PATIENT_STATUS_P = [0.68, 0.14, 0.13, 0.02, 0.02, 0.01]
+
+ADMISSION_TYPES = ['Emergency', 'Urgent', 'Elective', 'Newborn']
+ADMISSION_TYPE_P = [0.6, 0.2, 0.18, 0.02]
+
+ADMISSION_SOURCES = [
+    'Non-Health Care Facility Point of Origin',
+    'Transfer from Another Health Care Facility',
+    'Emergency Room',
+    'Transfer from Skilled Nursing (SNF), Intermediate Care (ICF) or Assisted Living (ALF)',
+    "Clinic or Physician's Office",
+]
+ADMISSION_SOURCE_P = [0.85, 0.05, 0.05, 0.03, 0.02]
+
+HOSPITALS = [
+    'ALTA BATES SUMMIT - ALTA BATES',
+    'CPMC PACIFIC CAMPUS',
+    'MEMORIAL MEDICAL CTR MODESTO',
+    'SUTTER MEDICAL CENTER SACRAMENTO',
+    'SUTTER ROSEVILLE MEDICAL CENTER',
+]
+
+FIN_CLASSES = ['Medicare', 'Medicaid', 'Commercial', 'Self-pay', 'Other']
+FIN_CLASS_P = [0.45, 0.15, 0.32, 0.05, 0.03]
+
+ORDER_STATUSES = ['Completed', 'Sent', 'Discontinued', 'Canceled']
+ORDER_STATUS_P = [0.6, 0.25, 0.1, 0.05]
+
+PHARM_CLASSES = ['ANALGESICS', 'ANTIBIOTICS', 'ANTICOAGULANTS', 'DIURETICS', 'VITAMINS',
+                 'CARDIOVASCULAR', 'ANTIHYPERGLYCEMICS', 'ANTICONVULSANTS']
+DEA_CLASSES = ['', 'C-II Narcotic', 'C-III', 'C-IV', 'C-V']
+
+LAB_COMPONENTS = ['ALBUMIN', 'BILIRUBIN TOTAL', 'CK', 'SODIUM', 'UREA NITROGEN', 'PCO2', 'WBC',
+                  'TROPONIN I', 'CK MB', 'GLUCOSE', 'INR', 'NT PRO BNP', 'PH', 'HEMOGLOBIN',
+                  'COCAINE']
+RESULT_FLAGS = ['', 'High', 'Low', 'Abnormal']
+RESULT_FLAG_P = [0.75, 0.12, 0.1, 0.03]
+
+CCI_CONDITIONS = ['PVR', 'CPD', 'MDM', 'REN', 'CHF', 'SDM', 'CVR', 'MAL', 'MST', 'MLD', 'MI',
+                  'RD', 'PUD', 'SLD', 'DEM', 'HPL', 'AIDS']
+
+SEXES = ['Female', 'Male']
+RACES = ['White/Caucasian', 'Black/African American', 'Asian', 'Other', 'Unknown']
+RACE_P = [0.6, 0.1, 0.15, 0.1, 0.05]
+ETHNIC_GROUPS = ['Non Hispanic', 'Mexican', 'Unknown', '']
+MARITAL_STATUSES = ['Single', 'Married', 'Widowed', 'Divorced', 'Life Partner', '']
+TOBACCO_USERS = ['Never', 'Quit', 'Yes', 'Passive', 'Not Asked', '']
+YES_NO = ['Yes', 'No', '']
+
+ENCOUNTER_REASONS = ['Chest Pain', 'Shortness of Breath', 'Abdominal Pain', 'Fever', 'Fall',
+                     'Follow-up', 'Nausea & Vomiting', 'Weakness']
+SPECIALTIES = ['Internal Medicine', 'Family Medicine', 'Cardiology', 'Hospitalist',
+               'Obstetrics & Gynecology', 'General Surgery', 'Pulmonary Disease']
+
+N_ICD9_CODES = 2000
+N_PX_CODES = 300
+N_PROVIDERS = 5000
+N_TRACTS = 500
+
+# Column names and types of the generated tables, in output order.
+TABLES = OrderedDict([
+    ('hospital_account', [
+        ('hsp_acct_study_id', 'BIGINT'), ('pat_study_id', 'BIGINT'),
+        ('acct_type_name', 'VARCHAR'), ('patient_status_name', 'VARCHAR'),
+        ('admission_type_name', 'VARCHAR'), ('admission_source_name', 'VARCHAR'),
+        ('loc_name', 'VARCHAR'), ('acct_fin_class_name', 'VARCHAR'),
+        ('adm_date_time', 'TIMESTAMP'), ('disch_date_time', 'TIMESTAMP'),
+        ('prim_enc_study_id', 'BIGINT'), ('attending_prov_study_id', 'BIGINT')]),
+    ('hospital_encounters', [
+        ('hsp_acct_study_id', 'BIGINT'), ('enc_study_id', 'BIGINT'),
+        ('hosp_admsn_time', 'TIMESTAMP'), ('hosp_disch_time', 'TIMESTAMP')]),
+    ('encounters', [
+        ('enc_study_id', 'BIGINT'), ('pat_study_id', 'BIGINT'), ('hsp_acct_study_id', 'BIGINT'),
+        ('contact_date', 'DATE'), ('enc_type_name', 'VARCHAR'),
+        ('temperature', 'FLOAT'), ('pulse', 'FLOAT'), ('respirations', 'FLOAT'),
+        ('bp_systolic', 'FLOAT'), ('bp_diastolic', 'FLOAT'),
+        ('height', 'VARCHAR'), ('weight', 'FLOAT'), ('bmi', 'FLOAT')]),
+    ('order_medication', [
+        ('order_med_study_id', 'BIGINT'), ('enc_study_id', 'BIGINT'), ('medication_id', 'BIGINT'),
+        ('ordering_mode_name', 'VARCHAR'), ('order_status_name', 'VARCHAR')]),
+    ('order_procedures_supp', [
+        ('order_proc_study_id', 'BIGINT'), ('pat_study_id', 'BIGINT'), ('enc_study_id', 'BIGINT'),
+        ('ordering_mode_name', 'VARCHAR')]),
+    ('order_results', [
+        ('order_proc_study_id', 'BIGINT'), ('component_id', 'BIGINT'),
+        ('ord_num_value', 'FLOAT'), ('result_flag_name', 'VARCHAR'), ('result_date', 'DATE')]),
+    ('hospital_dx', [
+        ('hsp_acct_study_id', 'BIGINT'), ('line', 'INTEGER'),
+        ('ref_bill_code', 'VARCHAR'), ('icd_9_cm_code', 'VARCHAR')]),
+    ('encounter_dx', [
+        ('enc_study_id', 'BIGINT'), ('line', 'INTEGER'),
+        ('dx_code', 'VARCHAR'), ('icd_9_cm_code', 'VARCHAR')]),
+    ('social_hx', [
+        ('enc_study_id', 'BIGINT'), ('tobacco_user_name', 'VARCHAR'),
+        ('alcohol_use_name', 'VARCHAR'), ('ill_drug_user_name', 'VARCHAR')]),
+    ('patient_demographics', [
+        ('pat_study_id', 'BIGINT'), ('birth_date', 'DATE'), ('sex_name', 'VARCHAR'),
+        ('ethnic_group_name', 'VARCHAR'), ('marital_status_name', 'VARCHAR'),
+        ('intrptr_needed_yn', 'BOOLEAN')]),
+    ('patient_race', [('pat_study_id', 'BIGINT'), ('race_name', 'VARCHAR')]),
+    ('hospital_problems', [
+        ('hsp_acct_study_id', 'BIGINT'), ('ref_bill_code', 'VARCHAR'),
+        ('current_icd9_list', 'VARCHAR'), ('icd_9_cm_code', 'VARCHAR')]),
+    ('hospital_px', [
+        ('hsp_acct_study_id', 'BIGINT'), ('line', 'INTEGER'), ('final_icd_px_id', 'VARCHAR')]),
+    ('encounter_rsn', [
+        ('enc_study_id', 'BIGINT'), ('line', 'INTEGER'), ('enc_reason_name', 'VARCHAR')]),
+    ('bayes_patient_location', [('pat_study_id', 'BIGINT'), ('tract_id', 'VARCHAR(11)')]),
+    # Small reference tables.
+    ('medication_id', [
+        ('medication_id', 'BIGINT'), ('pharm_class_name', 'VARCHAR'),
+        ('pharm_subclass_name', 'VARCHAR'), ('controlled_med_yn', 'VARCHAR'),
+        ('dea_class_code_name', 'VARCHAR')]),
+    ('component_id', [
+        ('component_id', 'BIGINT'), ('common_name', 'VARCHAR'), ('loinc_code', 'VARCHAR')]),
+    ('icd_9_cci_xwalk', [
+        ('icd_9_cm_code', 'VARCHAR'), ('condition_cat', 'VARCHAR'), ('weight', 'INTEGER')]),
+    ('bayes_hcup_ccs_dx', [
+        ('icd_9_cm_code', 'VARCHAR'), ('ccs_category', 'INTEGER'),
+        ('ccs_category_description', 'VARCHAR')]),
+    ('bayes_hcup_ccs_pr', [
+        ('icd_9_cm_code', 'VARCHAR'), ('ccs_category', 'INTEGER'),
+        ('ccs_category_description', 'VARCHAR')]),
+    ('px_id_xwalk', [('final_icd_px_id', 'VARCHAR'), ('icd_9_cm_code', 'VARCHAR')]),
+    ('providers', [('prov_study_id', 'BIGINT')]),
+    ('provider_specialty', [('prov_study_id', 'BIGINT'), ('specialty', 'VARCHAR')]),
+    ('bayes_census', [
+        ('tract_id', 'VARCHAR(11)'), ('house_value__median_value', 'FLOAT'),
+        ('unemployment__pct_unemployed', 'FLOAT'), ('income__per_capita', 'FLOAT'),
+        ('population__density', 'FLOAT')]),
+])
+
+INDEXES = {
+    'hospital_account': ['hsp_acct_study_id', 'pat_study_id'],
+    'hospital_encounters': ['hsp_acct_study_id', 'enc_study_id'],
+    'encounters': ['enc_study_id', 'pat_study_id'],
+    'order_medication': ['enc_study_id'],
+    'order_procedures_supp': ['order_proc_study_id', 'pat_study_id'],
+    'order_results': ['order_proc_study_id'],
+    'hospital_dx': ['hsp_acct_study_id', 'icd_9_cm_code'],
+    'encounter_dx': ['enc_study_id', 'icd_9_cm_code'],
+    'social_hx': ['enc_study_id'],
+    'patient_demographics': ['pat_study_id'],
+    'patient_race': ['pat_study_id'],
+    'hospital_problems': ['hsp_acct_study_id'],
+    'hospital_px': ['hsp_acct_study_id'],
+    'encounter_rsn': ['enc_study_id'],
+    'bayes_patient_location': ['pat_study_id'],
+    'px_id_xwalk': ['final_icd_px_id'],
+    'provider_specialty': ['prov_study_id'],
+    'bayes_census': ['tract_id'],
+    'icd_9_cci_xwalk': ['icd_9_cm_code'],
+    'bayes_hcup_ccs_dx': ['icd_9_cm_code'],
+    'bayes_hcup_ccs_pr': ['icd_9_cm_code'],
+}
+
+
+def _choice(rng, values, size, p=None):
+    """Draw `size` values from `values` as an object array."""
+    return np.array(values, dtype=object)[rng.choice(len(values), size=size, p=p)]
+
+
+def _icd9_codes(n):
+    """Return `n` ICD-9 codes in the raw (dotted) and formatted (`'%5s'`) forms."""
+    raw = np.array(['%03d.%d' % (i // 10 % 1000, i % 10) for i in range(n)], dtype=object)
+    formatted = np.array(["'%-5s'" % c.replace('.', '') for c in raw], dtype=object)
+    return raw, formatted
+
+
+def reference_tables(seed=0):
+    """Return the small reference tables as a dict of {table name: DataFrame}."""
+    rng = np.random.RandomState(seed)
+    n_meds = 500
+    raw_codes, codes = _icd9_codes(N_ICD9_CODES)
+    cci_codes = codes[rng.choice(N_ICD9_CODES, size=N_ICD9_CODES // 10, replace=False)]
+    px_codes = codes[:N_PX_CODES]
+
+    return {
+        'medication_id': pd.DataFrame({
+            'medication_id': np.arange(1, n_meds + 1),
+            'pharm_class_name': _choice(rng, PHARM_CLASSES, n_meds),
+            'pharm_subclass_name': _choice(rng, PHARM_CLASSES, n_meds),
+            'controlled_med_yn': _choice(rng, ['Y', 'N'], n_meds, p=[0.1, 0.9]),
+            'dea_class_code_name': _choice(rng, DEA_CLASSES, n_meds, p=[0.8, .05, .05, .05, .05]),
+        }),
+        'component_id': pd.DataFrame({
+            'component_id': np.arange(1, len(LAB_COMPONENTS) + 1),
+            'common_name': LAB_COMPONENTS,
+            'loinc_code': ['%05d-0' % i for i in range(len(LAB_COMPONENTS))],
+        }),
+        'icd_9_cci_xwalk': pd.DataFrame({
+            'icd_9_cm_code': cci_codes,
+            'condition_cat': _choice(rng, CCI_CONDITIONS, len(cci_codes)),
+            'weight': rng.choice([1, 2, 3, 6], size=len(cci_codes)),
+        }),
+        'bayes_hcup_ccs_dx': pd.DataFrame({
+            'icd_9_cm_code': codes,
+            'ccs_category': np.arange(N_ICD9_CODES) // 8,
+            'ccs_category_description': ['ccs_%d' % (i // 8) for i in range(N_ICD9_CODES)],
+        }),
+        'bayes_hcup_ccs_pr': pd.DataFrame({
+            'icd_9_cm_code': px_codes,
+            'ccs_category': np.arange(N_PX_CODES) // 4,
+            'ccs_category_description': ['px_ccs_%d' % (i // 4) for i in range(N_PX_CODES)],
+        }),
+        'px_id_xwalk': pd.DataFrame({
+            'final_icd_px_id': [str(i) for i in range(N_PX_CODES)],
+            'icd_9_cm_code': px_codes,
+        }),
+        'providers': pd.DataFrame({'prov_study_id': np.arange(1, N_PROVIDERS)}),
+        'provider_specialty': pd.DataFrame({
+            'prov_study_id': np.arange(1, N_PROVIDERS),
+            'specialty': _choice(rng, SPECIALTIES, N_PROVIDERS - 1),
+        }),
+        'bayes_census': pd.DataFrame({
+            'tract_id': ['060%08d' % i for i in range(N_TRACTS)],
+            'house_value__median_value': rng.lognormal(12.5, 0.5, size=N_TRACTS).round(),
+            'unemployment__pct_unemployed': rng.uniform(2, 20, size=N_TRACTS).round(1),
+            'income__per_capita': rng.lognormal(10.3, 0.4, size=N_TRACTS).round(),
+            'population__density': rng.lognormal(7, 1.5, size=N_TRACTS).round(1),
+        }),
+    }
+
+
+def generate_chunk(rng, first_pat_id, n_patients, first_ids):
+    """
+    Generate the patient-level tables for a contiguous block of patients.
+
+    :param rng: a numpy RandomState.
+    :param first_pat_id: id of the first patient in this block.
+    :param n_patients: number of patients in this block.
+    :param first_ids: dict of the next free id for 'account', 'encounter', 'order_med' and
+        'order_proc'. Updated in place.
+    :returns: a dict of {table name: DataFrame}.
+    """
+    pat_ids = np.arange(first_pat_id, first_pat_id + n_patients)
+    n_accts_per_pat = 1 + rng.poisson(ACCOUNTS_PER_PATIENT - 1, size=n_patients)
+    n_accts = n_accts_per_pat.sum()
+
+    # Hospital accounts.
+    acct_ids = first_ids['account'] + np.arange(n_accts)
+    acct_pat = np.repeat(pat_ids, n_accts_per_pat)
+    acct_type = _choice(rng, ACCT_TYPES, n_accts, p=ACCT_TYPE_P)
+    inpatient = acct_type == 'Inpatient'
+    span_minutes = int((END_DATE - START_DATE) / np.timedelta64(1, 'm'))
+    adm = START_DATE + rng.randint(0, span_minutes, size=n_accts).astype('timedelta64[m]')
+    los_days = np.where(inpatient, rng.geometric(0.25, size=n_accts), 0)
+    los_minutes = los_days * 1440 + rng.randint(30, 600, size=n_accts)
+    disch = adm + los_minutes.astype('timedelta64[m]')
+
+    # One encounter per day of an inpatient stay, one per other visit.
+    n_encs_per_acct = los_days + 1
+    n_encs = n_encs_per_acct.sum()
+    enc_ids = first_ids['encounter'] + np.arange(n_encs)
+    enc_acct_pos = np.repeat(np.arange(n_accts), n_encs_per_acct)
+    enc_day = np.arange(n_encs) - np.repeat(np.cumsum(n_encs_per_acct) - n_encs_per_acct,
+                                            n_encs_per_acct)
+    enc_date = (adm[enc_acct_pos].astype('datetime64[D]') + enc_day.astype('timedelta64[D]'))
+    enc_type = np.where(rng.rand(n_encs) < 0.05, 'History',
+                        np.where(inpatient[enc_acct_pos], 'Hospital Encounter', 'Office Visit'))
+    has_vitals = rng.rand(n_encs) < 0.7
+    prim_enc = enc_ids[np.cumsum(n_encs_per_acct) - n_encs_per_acct]
+
+    def vital(mean, sd):
+        return np.where(has_vitals, rng.normal(mean, sd, size=n_encs).round(1), np.nan)
+
+    height_in = rng.normal(66, 4, size=n_encs).astype(int)
+    heights = np.array(["%d' %d.0\"" % (h // 12, h % 12) for h in height_in], dtype=object)
+
+    hospital_account = pd.DataFrame(OrderedDict([
+        ('hsp_acct_study_id', acct_ids),
+        ('pat_study_id', acct_pat),
+        ('acct_type_name', acct_type),
+        ('patient_status_name', _choice(rng, PATIENT_STATUSES, n_accts, p=PATIENT_STATUS_P)),
+        ('admission_type_name', _choice(rng, ADMISSION_TYPES, n_accts, p=ADMISSION_TYPE_P)),
+        ('admission_source_name', _choice(rng, ADMISSION_SOURCES, n_accts, p=ADMISSION_SOURCE_P)),
+        ('loc_name', _choice(rng, HOSPITALS, n_accts)),
+        ('acct_fin_class_name', _choice(rng, FIN_CLASSES, n_accts, p=FIN_CLASS_P)),
+        ('adm_date_time', adm),
+        ('disch_date_time', disch),
+        ('prim_enc_study_id', prim_enc),
+        ('attending_prov_study_id', rng.randint(1, 5000, size=n_accts)),
+    ]))
+    hospital_encounters = pd.DataFrame(OrderedDict([
+        ('hsp_acct_study_id', acct_ids[inpatient]),
+        ('enc_study_id', prim_enc[inpatient]),
+        ('hosp_admsn_time', adm[inpatient]),
+        ('hosp_disch_time', disch[inpatient]),
+    ]))
+    encounters = pd.DataFrame(OrderedDict([
+        ('enc_study_id', enc_ids),
+        ('pat_study_id', acct_pat[enc_acct_pos]),
+        ('hsp_acct_study_id', acct_ids[enc_acct_pos]),
+        ('contact_date', enc_date),
+        ('enc_type_name', enc_type),
+        ('temperature', vital(98.4, 0.8)),
+        ('pulse', vital(80, 12)),
+        ('respirations', vital(17, 2)),
+        ('bp_systolic', vital(128, 18)),
+        ('bp_diastolic', vital(76, 10)),
+        ('height', np.where(has_vitals, heights, None)),
+        ('weight', vital(2800, 600)),  # in ounces
+        ('bmi', vital(28, 6)),
+    ]))
+
+    # ~2 medication orders per encounter.
+    n_meds_per_enc = rng.poisson(2, size=n_encs)
+    n_meds = n_meds_per_enc.sum()
+    med_enc_pos = np.repeat(np.arange(n_encs), n_meds_per_enc)
+    order_medication = pd.DataFrame(OrderedDict([
+        ('order_med_study_id', first_ids['order_med'] + np.arange(n_meds)),
+        ('enc_study_id', enc_ids[med_enc_pos]),
+        ('medication_id', rng.randint(1, 501, size=n_meds)),
+        ('ordering_mode_name', np.where(inpatient[enc_acct_pos][med_enc_pos],
+                                        'Inpatient', 'Outpatient')),
+        ('order_status_name', _choice(rng, ORDER_STATUSES, n_meds, p=ORDER_STATUS_P)),
+    ]))
+
+    # One lab order per inpatient encounter, ~3 results each.
+    lab_enc_pos = np.flatnonzero(inpatient[enc_acct_pos])
+    n_procs = len(lab_enc_pos)
+    proc_ids = first_ids['order_proc'] + np.arange(n_procs)
+    order_procedures_supp = pd.DataFrame(OrderedDict([
+        ('order_proc_study_id', proc_ids),
+        ('pat_study_id', acct_pat[enc_acct_pos][lab_enc_pos]),
+        ('enc_study_id', enc_ids[lab_enc_pos]),
+        ('ordering_mode_name', 'Inpatient'),
+    ]))
+    n_results_per_proc = 1 + rng.poisson(2, size=n_procs)
+    n_results = n_results_per_proc.sum()
+    result_proc_pos = np.repeat(np.arange(n_procs), n_results_per_proc)
+    order_results = pd.DataFrame(OrderedDict([
+        ('order_proc_study_id', proc_ids[result_proc_pos]),
+        ('component_id', rng.randint(1, len(LAB_COMPONENTS) + 1, size=n_results)),
+        ('ord_num_value', rng.lognormal(2, 1.5, size=n_results).round(2)),
+        ('result_flag_name', _choice(rng, RESULT_FLAGS, n_results, p=RESULT_FLAG_P)),
+        ('result_date', enc_date[lab_enc_pos][result_proc_pos]),
+    ]))
+
+    # ~8 diagnoses per hospital account and ~1 per encounter.
+    raw_codes, codes = _icd9_codes(N_ICD9_CODES)
+    n_dx_per_acct = 1 + rng.poisson(7, size=n_accts)
+    n_dx = n_dx_per_acct.sum()
+    dx_codes = rng.randint(0, N_ICD9_CODES, size=n_dx)
+    hospital_dx = pd.DataFrame(OrderedDict([
+        ('hsp_acct_study_id', np.repeat(acct_ids, n_dx_per_acct)),
+        ('line', np.arange(n_dx) - np.repeat(np.cumsum(n_dx_per_acct) - n_dx_per_acct,
+                                             n_dx_per_acct) + 1),
+        ('ref_bill_code', raw_codes[dx_codes]),
+        ('icd_9_cm_code', codes[dx_codes]),
+    ]))
+    enc_dx_codes = rng.randint(0, N_ICD9_CODES, size=n_encs)
+    encounter_dx = pd.DataFrame(OrderedDict([
+        ('enc_study_id', enc_ids),
+        ('line', 1),
+        ('dx_code', raw_codes[enc_dx_codes]),
+        ('icd_9_cm_code', codes[enc_dx_codes]),
+    ]))
+
+    # ~2 problems and ~1 procedure per inpatient account.
+    inp_ids = acct_ids[inpatient]
+    n_prob_per_acct = rng.poisson(2, size=len(inp_ids))
+    n_probs = n_prob_per_acct.sum()
+    prob_codes = rng.randint(0, N_ICD9_CODES, size=n_probs)
+    hospital_problems = pd.DataFrame(OrderedDict([
+        ('hsp_acct_study_id', np.repeat(inp_ids, n_prob_per_acct)),
+        ('ref_bill_code', raw_codes[prob_codes]),
+        ('current_icd9_list', raw_codes[prob_codes]),
+        ('icd_9_cm_code', codes[prob_codes]),
+    ]))
+    n_px_per_acct = rng.poisson(1, size=len(inp_ids))
+    n_px = n_px_per_acct.sum()
+    hospital_px = pd.DataFrame(OrderedDict([
+        ('hsp_acct_study_id', np.repeat(inp_ids, n_px_per_acct)),
+        ('line', 1),
+        ('final_icd_px_id', rng.randint(0, N_PX_CODES, size=n_px).astype(str)),
+    ]))
+    encounter_rsn = pd.DataFrame(OrderedDict([
+        ('enc_study_id', enc_ids),
+        ('line', 1),
+        ('enc_reason_name', _choice(rng, ENCOUNTER_REASONS, n_encs)),
+    ]))
+    bayes_patient_location = pd.DataFrame(OrderedDict([
+        ('pat_study_id', pat_ids),
+        ('tract_id', np.array(['060%08d' % i for i in range(N_TRACTS)], dtype=object)[
+            rng.randint(0, N_TRACTS, size=n_patients)]),
+    ]))
+
+    history = enc_type == 'History'
+    n_hx = history.sum()
+    social_hx = pd.DataFrame(OrderedDict([
+        ('enc_study_id', enc_ids[history]),
+        ('tobacco_user_name', _choice(rng, TOBACCO_USERS, n_hx)),
+        ('alcohol_use_name', _choice(rng, YES_NO, n_hx)),
+        ('ill_drug_user_name', _choice(rng, YES_NO, n_hx)),
+    ]))
+
+    birth_days = rng.randint(0, 365 * 90, size=n_patients).astype('timedelta64[D]')
+    patient_demographics = pd.DataFrame(OrderedDict([
+        ('pat_study_id', pat_ids),
+        ('birth_date', np.datetime64('2009-01-01') - birth_days),
+        ('sex_name', _choice(rng, SEXES, n_patients)),
+        ('ethnic_group_name', _choice(rng, ETHNIC_GROUPS, n_patients)),
+        ('marital_status_name', _choice(rng, MARITAL_STATUSES, n_patients)),
+        ('intrptr_needed_yn', rng.rand(n_patients) < 0.08),
+    ]))
+    patient_race = pd.DataFrame(OrderedDict([
+        ('pat_study_id', pat_ids),
+        ('race_name', _choice(rng, RACES, n_patients, p=RACE_P)),
+    ]))
+
+    first_ids['account'] += n_accts
+    first_ids['encounter'] += n_encs
+    first_ids['order_med'] += n_meds
+    first_ids['order_proc'] += n_procs
+
+    return {
+        'hospital_account': hospital_account,
+        'hospital_encounters': hospital_encounters,
+        'encounters': encounters,
+        'order_medication': order_medication,
+        'order_procedures_supp': order_procedures_supp,
+        'order_results': order_results,
+        'hospital_dx': hospital_dx,
+        'encounter_dx': encounter_dx,
+        'social_hx': social_hx,
+        'patient_demographics': patient_demographics,
+        'patient_race': patient_race,
+        'hospital_problems': hospital_problems,
+        'hospital_px': hospital_px,
+        'encounter_rsn': encounter_rsn,
+        'bayes_patient_location': bayes_patient_location,
+    }
+
+
+def generate(n_accounts, seed=0, patients_per_chunk=50000):
+    """
+    Generate a synthetic dataset of roughly `n_accounts` hospital accounts.
+
+    Yields dicts of {table name: DataFrame}; the first one holds the reference tables, the rest
+    one block of patients each, so that 10M-account datasets never have to fit in memory at once.
+    """
+    rng = np.random.RandomState(seed)
+    yield reference_tables(seed)
+
+    n_patients = max(1, n_accounts // ACCOUNTS_PER_PATIENT)
+    first_ids = {'account': 1, 'encounter': 1, 'order_med': 1, 'order_proc': 1}
+    for first_pat_id in range(1, n_patients + 1, patients_per_chunk):
+        n = min(patients_per_chunk, n_patients + 1 - first_pat_id)
+        yield generate_chunk(rng, first_pat_id, n, first_ids)
+
+
+def load(n_accounts, engine=None, seed=0, patients_per_chunk=50000):
+    """
+    (Re-)create all synthetic tables in the database and fill them with `n_accounts` accounts.
+
+    :param engine: SQLAlchemy engine of a scratch database. Defaults to the database named by the
+        SUTTER_DB environment variable, and refuses to run if it isn't set, since the raw tables
+        are dropped.
+    :returns: a dict of {table name: number of rows loaded}.
+    """
+    if engine is None:
+        if not os.environ.get('SUTTER_DB'):
+            raise ValueError('set SUTTER_DB to a scratch database: loading synthetic data drops '
+                             'the raw tables!')
+        engine = postgres.get_connection()
+    conn = psycopg2.connect(str(engine.url))
+    cursor = conn.cursor()
+
+    for table_name, columns in TABLES.iteritems():
+        cursor.execute("DROP TABLE IF EXISTS {} CASCADE".format(table_name))
+        cursor.execute("CREATE TABLE {} ({})".format(
+            table_name, ', '.join('{} {}'.format(c, t) for c, t in columns)))
+    conn.commit()
+
+    row_counts = dict.fromkeys(TABLES, 0)
+    for tables in generate(n_accounts, seed, patients_per_chunk):
+        for table_name, df in tables.iteritems():
+            copy_df(cursor, table_name, df[[c for c, _ in TABLES[table_name]]])
+            row_counts[table_name] += len(df)
+        conn.commit()
+        log.info('loaded %d accounts so far ...' % row_counts['hospital_account'])
+
+    for table_name, columns in INDEXES.iteritems():
+        for col in columns:
+            cursor.execute("CREATE INDEX {0}_{1} ON {0} ({1})".format(table_name, col))
+        cursor.execute("ANALYZE {}".format(table_name))
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    icd9.create_key_columns(engine)
+    admissions.create_admissions_table(engine)
+    encounter_map.build_encounter_map(engine)
+    dx_events.create_dx_events_table(engine)
+    return row_counts
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(levelname)s:%(name)s:%(asctime)s=> %(message)s',
+                        datefmt='%m/%d %H:%M:%S',
+                        level=logging.INFO)
+    if not os.environ.get('SUTTER_DB'):
+        sys.exit('set SUTTER_DB to a scratch database: this drops the raw tables!')
+    n_accounts = int(sys.argv[1])
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    for table_name, count in sorted(load(n_accounts, seed=seed).items()):
+        log.info('%s: %d rows' % (table_name, count))
@@ -4,6 +4,9 @@ This file contains a class for uploading csv data files to a database.
 It supports chunksize uploading and returns the
 error lines as a dataframe by .get_errors method for further
 cleaning and re-uploading.
+
+It also has a `bulk_load` helper that streams DataFrames into a new table
+with COPY, for the reference data loaded in migrations.
 """
 
 import json
@@ -13,10 +16,13 @@ import string
 import subprocess
 from StringIO import StringIO
 
+import numpy as np
+
 import pandas as pd
 
 import psycopg2
 
+from sutter.lib import postgres
 from sutter.lib.helper import get_path
 
 log = logging.getLogger('sutter.lib.upload')
@@ -73,6 +79,86 @@ def change_table_indices(table_name, indices_list, engine, kind):
         conn.close()
 
 
+def _integral_floats_as_ints(df):
+    """
+    Return `df` with its float columns of whole numbers as (object) integers.
+
+    Integer columns with nulls are read by pandas as floats, whose '1.0' an integer column
+    doesn't accept; '1' is accepted by both integer and float columns.
+    """
+    for col in df.columns:
+        values = df[col]
+        if values.dtype.kind != 'f':
+            continue
+        notnull = values.notnull().values
+        if notnull.any() and (values.values[notnull] % 1 == 0).all():
+            ints = np.full(len(values), None, dtype=object)
+            ints[notnull] = values.values[notnull].astype(np.int64)
+            df = df.assign(**{col: pd.Series(ints, index=values.index, dtype=object)})
+    return df
+
+
+def copy_df(cursor, table_name, df):
+    """Stream a DataFrame into an existing table with COPY. Nulls (NaN, None, NaT) stay null."""
+    df = _integral_floats_as_ints(df)
+    buf = StringIO()
+    df.to_csv(buf, sep='\t', header=False, index=False, na_rep='\\N')
+    buf.seek(0)
+    cursor.copy_expert("COPY {} ({}) FROM STDIN WITH CSV DELIMITER E'\\t' NULL '\\N'".format(
+        table_name, ', '.join(df.columns)), buf)
+
+
+def bulk_load(table_name, bind, chunks, indexes=(), if_exists='fail', dtype=None):
+    """
+    Load DataFrames into a table with COPY, then index and ANALYZE it.
+
+    This is much faster than DataFrame.to_sql, which INSERTs row by row, and building the
+    indexes after the load is faster than maintaining them during it.
+
+    :param bind: SQLAlchemy engine, or connection. Through an engine, the load is committed
+        here; through a connection (e.g. `op.get_bind()` in a migration), it is part of the
+        connection's transaction, and committed (or rolled back) with it.
+    :param chunks: a DataFrame, or an iterable of DataFrames with the same columns
+        (e.g. `pd.read_csv(f, chunksize=100000)`, so that the file is streamed).
+    :param indexes: columns to index after the load. Use a list of columns for a multi-column index.
+    :param if_exists: 'fail', 'replace' or 'append', as in DataFrame.to_sql.
+    :param dtype: optional dict of {column: SQLAlchemy type}, overriding the column types that
+        are inferred from the first chunk.
+    :returns: the number of rows loaded.
+    """
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+
+    n_rows = 0
+    with postgres.transaction(bind) as conn:
+        exists = conn.dialect.has_table(conn, table_name)
+        if if_exists == 'fail' and exists:
+            raise ValueError("Table '{}' already exists.".format(table_name))
+
+        cursor = conn.connection.cursor()
+        try:
+            for i, df in enumerate(chunks):
+                if i == 0:
+                    if if_exists == 'replace':
+                        cursor.execute("DROP TABLE IF EXISTS {}".format(table_name))
+                    if not (if_exists == 'append' and exists):
+                        cursor.execute(pd.io.sql.get_schema(df, table_name, con=conn,
+                                                            dtype=dtype))
+                copy_df(cursor, table_name, df)
+                n_rows += len(df)
+            log.info("Copied {} rows into {}.".format(n_rows, table_name))
+
+            for columns in indexes:
+                columns = [columns] if isinstance(columns, basestring) else columns
+                log.info("Creating index on {}.".format(', '.join(columns)))
+                cursor.execute("CREATE INDEX {}_{} ON {} ({})".format(
+                    table_name, '_'.join(columns), table_name, ', '.join(columns)))
+            cursor.execute("ANALYZE {}".format(table_name))
+        finally:
+            cursor.close()
+    return n_rows
+
+
 def get_table_name_dict():
     """Load a dictionary with table name mappings."""
     with open(get_path() + '/sutter/json/file_tablename_dict.json') as f:
@@ -102,8 +188,12 @@ class CsvToSql(object):
                 self.params[key] = value
 
         self.error_chunks, self.error_lines = [], []
-        fnames = get_table_name_dict()[tablename]['file_name']
-        self.fpaths = [os.path.join(path, fname) for fname in fnames]
+        if 'fpaths' in self.params:
+            # Explicit list of files (e.g. synthetic benchmark data) instead of the Sutter files.
+            self.fpaths = self.params['fpaths']
+        else:
+            fnames = get_table_name_dict()[tablename]['file_name']
+            self.fpaths = [os.path.join(path, fname) for fname in fnames]
 
         # filename = csv_file_path.split('/')[-1]
 
@@ -133,7 +223,7 @@ class CsvToSql(object):
     def find_columns(self):
         """Populate self.columns based on the columns of the first CSV file passed in."""
         def string_filter(s):
-            filter(lambda x: x in string.printable, str(s).lower())
+            return filter(lambda x: x in string.printable, str(s).lower())
 
         with open(self.fpaths[0]) as f:
             columns = pd.read_csv(f,
@@ -258,15 +348,17 @@ class CsvToSql(object):
     def upload_errors(self):
         """Attempt to re-upload rows that encountered errors."""
         def clean_str(s):
-            filter(lambda x: x in string.printable, str(s).replace('\\', '_'))
+            # Nulls stay null, rather than becoming 'nan' or 'None'.
+            if pd.isnull(s):
+                return s
+            return filter(lambda x: x in string.printable, str(s).replace('\\', '_'))
 
         for col in self.error_db.columns[1:]:
             self.error_db[col] = self.error_db[col].apply(clean_str)
 
         try:
             log.info('Trying to upload rows with errors.')
-            self.error_db.to_sql(
-                self.table_name, self.engine, if_exists='append', index=False)
+            bulk_load(self.table_name, self.engine, self.error_db, if_exists='append')
             self.error_db = pd.DataFrame()
         except Exception, e:
             log.info('Error on writing the error table: %s' % e)
@@ -0,0 +1,81 @@
+"""
+Sanity checks on the DataFrames emitted by feature extractors.
+
+The checks run once per emitted block, with vectorized operations:
+    - column names must not start with an uppercase letter followed by a space
+    - `*_bool` columns may only hold True/False (or 1/0) and missing values
+
+The validation mode is 'full' (check every row), 'sample' (check a random sample of the rows)
+or 'off'. It defaults to the SUTTER_VALIDATION environment variable, or 'full' if it's unset,
+so that production runs can sample or skip validation without code changes.
+"""
+
+import os
+import re
+
+import numpy as np
+
+MODES = ('full', 'sample', 'off')
+SAMPLE_SIZE = 10000
+
+BAD_COLUMN_NAME = re.compile("[A-Z] ")
+
+
+def default_mode():
+    """Return the validation mode set by the SUTTER_VALIDATION environment variable."""
+    mode = os.environ.get('SUTTER_VALIDATION', 'full')
+    if mode not in MODES:
+        raise ValueError('SUTTER_VALIDATION must be one of %s, not %r' % (MODES, mode))
+    return mode
+
+
+def invalid_bool_values(column):
+    """Return the values of a `*_bool` column that aren't True/False/1/0 or missing."""
+    if column.dtype == bool:
+        return set()
+    values = column[column.notnull()]
+    invalid = values[~values.isin([0, 1])]
+    return set(invalid.values)
+
+
+def _check_bool_columns(df):
+    """Raise if any `*_bool` column of df holds non-boolean values."""
+    bool_cols = [c for c in df.columns if c.endswith('_bool') and df[c].dtype != bool]
+    numeric_cols = [c for c in bool_cols if df[c].dtype.kind in 'iuf']
+
+    # Numeric columns are checked all at once, as a single 2D array. Only the other columns
+    # (and numeric ones that failed, to report their values) are checked one by one.
+    failed = set()
+    if numeric_cols:
+        values = df[numeric_cols].values.astype(np.float64)
+        valid = (np.isnan(values) | (values == 0) | (values == 1)).all(axis=0)
+        failed = set(c for c, ok in zip(numeric_cols, valid) if not ok)
+
+    for colname in bool_cols:
+        if colname in numeric_cols and colname not in failed:
+            continue
+        invalid_values = invalid_bool_values(df[colname])
+        if invalid_values:
+            raise Exception("Column %s contains non-boolean values (%s)!"
+                            % (colname, invalid_values))
+
+
+def validate_df(df, mode=None, sample_size=SAMPLE_SIZE):
+    """
+    Perform several checks on the dataframe, raising an Exception if one fails.
+
+    :param mode: 'full', 'sample' or 'off' (default: see `default_mode`).
+    :param sample_size: number of rows to check in 'sample' mode.
+    """
+    mode = mode or default_mode()
+    if mode == 'off':
+        return
+
+    for colname in df.columns:
+        if BAD_COLUMN_NAME.match(colname):
+            # Column names shouldn't contain spaces or uppercase characters.
+            raise Exception("Bad column name: %s!" % colname)
+
+    if mode == 'sample' and len(df) > sample_size:
+        df = df.take(np.random.choice(len(df), sample_size, replace=False))
+    _check_bool_columns(df)
@@ -16,7 +16,8 @@ import re
 import sys
 import time
 
-from sutter.lib import config, postgres
+from sutter.lib import admissions, config, dx_events, encounter_map, postgres
+from sutter.lib.feature_categorizers import render_categories
 
 log = logging.getLogger('sutter.lib.views')
 logging.basicConfig(format='%(levelname)s:%(name)s:%(asctime)s=> %(message)s',
@@ -29,6 +30,9 @@ CREATE_OR_REPLACE_STR = "CREATE OR REPLACE VIEW {0}.{1} AS {2};"
 DROP_IF_EXISTS_STR = "DROP VIEW IF EXISTS {0}.{1} CASCADE;"
 CREATE_VIEW_STR = "CREATE VIEW {0}.{1} AS {2};"
 CREATE_MATERIALIZED_VIEW_STR = "CREATE MATERIALIZED VIEW {0}.{1} AS {2};"
+REFRESH_MATERIALIZED_VIEW_STR = "REFRESH MATERIALIZED VIEW {0}.{1};"
+# All materialized views are keyed by account, and are also queried one account at a time.
+CREATE_ACCOUNT_INDEX_STR = "CREATE INDEX {1}_hsp_acct_study_id ON {0}.{1} (hsp_acct_study_id);"
 
 
 def _filename_to_viewname(f_name, prefix="bayes_"):
@@ -50,6 +54,8 @@ def _read_view_file(filepath, schema):
 
     * If a schema-specific override exists (under `views/<schema>/*.sql`), read that instead.
     * Replace all instances of 'features.<view>' with '<schema>.<view>'.
+    * Replace category placeholders (e.g. `{{race(race_name)}}`) with their CASE expressions
+      (see sutter.lib.feature_categorizers).
     """
     base_name = os.path.basename(filepath)
     schema_specific_path = os.path.join('views', schema, base_name)
@@ -58,7 +64,7 @@ def _read_view_file(filepath, schema):
 
     with open(filepath) as f:
         content = f.read().encode('ascii').replace(DEFAULT_SCHEMA + ".", schema + ".")
-    return content
+    return render_categories(content)
 
 
 def update_views(schema):
@@ -67,11 +73,15 @@ def update_views(schema):
 
     We simply iterate over all the files in the folder, drop views that might
     already exist and re-create them again with from new code.
+
+    Returns the names of the views, in creation order.
     """
     engine = postgres.get_connection()
-    files = glob.glob(os.path.join('views', '*.sql'))
+    files = sorted(glob.glob(os.path.join('views', '*.sql')))  # numbered files come first
+    view_names = []
     for filename in files:
         view_name = _filename_to_viewname(filename)
+        view_names.append(view_name)
         content = _read_view_file(filename, schema)
         # Queries that use the % character somehow get misinterpreted as formatting characters
         # when passed to engine.execute. So we have to "escape" them here.
@@ -90,6 +100,7 @@ def update_views(schema):
             log.info("couldn't replace it in-place. dropping and recreating it instead ...")
             engine.execute(DROP_IF_EXISTS_STR.format(schema, view_name))
             engine.execute(CREATE_VIEW_STR.format(schema, view_name, content))
+    return view_names
 
 
 def create_materialized_views(schema):
@@ -100,11 +111,14 @@ def create_materialized_views(schema):
     But note that the existing view could be different from what's currently in the file
     (in this case, you should delete the view in the database before running this method).
 
-    Also, this method doesn't handle refreshing existing materialized views in the database.
-    If you want to refresh a materialized view, do it manually.
+    Also, this method doesn't refresh existing materialized views in the database (see
+    `refresh_materialized_views`).
+
+    Returns a dict of {view name: seconds taken to render}, for the views that were created.
     """
     engine = postgres.get_connection()
-    files = glob.glob(os.path.join('views/materialized', '*.sql'))
+    files = sorted(glob.glob(os.path.join('views/materialized', '*.sql')))
+    render_times = {}
     for filename in files:
         view_name = _filename_to_viewname(filename, prefix="bayes_m_")
         content = _read_view_file(filename, schema)
@@ -116,8 +130,32 @@ def create_materialized_views(schema):
             log.info("Creating materialized view {}.{} ...".format(schema, view_name))
             start_time = time.time()  # Let's time it, because materialized views can take a while!
             engine.execute(CREATE_MATERIALIZED_VIEW_STR.format(schema, view_name, content))
+            engine.execute(CREATE_ACCOUNT_INDEX_STR.format(schema, view_name))
             end_time = time.time()
             log.info("... success! (took %.2f sec to render)" % (end_time - start_time))
+            render_times[view_name] = end_time - start_time
+    return render_times
+
+
+def refresh_materialized_views(schema):
+    """
+    Refresh the materialized views that already exist in the database, from their current SQL.
+
+    Returns a dict of {view name: seconds taken to refresh}, for the views that were refreshed.
+    """
+    engine = postgres.get_connection()
+    files = sorted(glob.glob(os.path.join('views/materialized', '*.sql')))
+    refresh_times = {}
+    for filename in files:
+        view_name = _filename_to_viewname(filename, prefix="bayes_m_")
+        if engine.has_table(view_name, schema):
+            log.info("Refreshing materialized view {}.{} ...".format(schema, view_name))
+            start_time = time.time()
+            with postgres.transaction(engine) as conn:
+                conn.execute(REFRESH_MATERIALIZED_VIEW_STR.format(schema, view_name))
+            refresh_times[view_name] = time.time() - start_time
+            log.info("... success! (took %.2f sec)" % refresh_times[view_name])
+    return refresh_times
 
 
 def main():
@@ -128,7 +166,13 @@ def main():
         schema_name = DEFAULT_SCHEMA
 
     log.info("Using database {}".format(config.get("default-db")))
+    # Bring the tables that the views are built on up to date with the raw tables first.
+    admissions.refresh_admissions(postgres.get_connection())
+    dx_events.append_dx_events(postgres.get_connection())
+    encounter_map.build_encounter_map(postgres.get_connection())
     update_views(schema_name)
+    # The materialized views that weren't dropped along with the views they depend on.
+    refresh_materialized_views(schema_name)
     create_materialized_views(schema_name)
 
 if __name__ == '__main__':
@@ -0,0 +1,75 @@
+"""
+Count each patient's prior events in look-back windows, e.g. the visits in the 3, 6 and 12 months
+before an admission.
+
+Rather than self-joining every admission with every prior visit of its patient, the events are
+sorted once by (type, patient, time), and the count of events of a type in a window
+`[time - window, time)` is the difference of two `searchsorted` positions. Every additional
+window or type costs two binary searches per admission:
+
+    counts = count_prior_events(admissions, visits,
+                                windows=[('3_month', pd.DateOffset(months=3)),
+                                         ('6_month', pd.DateOffset(months=6))])
+    counts['3_month', 'Emergency']  # number of ER visits in the 3 months before each admission
+
+Windows are calendar offsets (or Timedeltas), computed as in Postgres' `time - INTERVAL`.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+import pandas as pd
+
+from sutter.lib.segments import nanoseconds
+
+
+def count_prior_events(index, events, windows, key='pat_study_id', index_time='adm_date_time',
+                       event_time='disch_date_time', event_type='acct_type_name', types=None):
+    """
+    Count the events of each type in the look-back windows of each row of `index`.
+
+    An event is counted for a row if it has the same `key`, and `time - window <= event time <
+    time` (the event must have happened strictly before `time`).
+
+    :param index: DataFrame with `key` and `index_time` columns (e.g. the index admissions).
+    :param events: DataFrame with `key`, `event_time` and `event_type` columns (e.g. all hospital
+        accounts, with their discharge time and account type).
+    :param windows: list of (name, pd.DateOffset or pd.Timedelta) pairs.
+    :param types: event types to count (default: every type in `events`).
+    :returns: an int64 DataFrame indexed like `index`, with (window name, type) columns.
+    """
+    event_ns, valid = nanoseconds(events[event_time])
+    valid &= events[key].notnull().values & events[event_type].notnull().values
+    if types is None:
+        types = sorted(events[event_type][valid].unique())
+    type_codes = pd.Index(types).get_indexer(events[event_type])
+    valid &= type_codes >= 0
+
+    # Patients and times are replaced by dense codes, so that (type, patient, time) fits in an
+    # int64 key that sorts like the triple.
+    pat_codes, _ = pd.factorize(np.concatenate([index[key].values, events[key].values]))
+    index_pat, event_pat = pat_codes[:len(index)], pat_codes[len(index):]
+    n_pats = max(pat_codes.max() + 1, 1) if len(pat_codes) else 1
+
+    index_times = pd.to_datetime(index[index_time])
+    end_ns, index_valid = nanoseconds(index_times)
+    index_valid &= index_pat >= 0
+    start_ns = [nanoseconds(index_times - offset)[0] for _, offset in windows]
+    times, ranks = np.unique(np.concatenate([event_ns[valid], end_ns] + start_ns),
+                             return_inverse=True)
+    n_times = len(times)
+    event_rank = ranks[:valid.sum()]
+    end_rank = ranks[valid.sum():valid.sum() + len(index)]
+    start_ranks = np.split(ranks[valid.sum() + len(index):], len(windows)) if windows else []
+
+    event_keys = np.sort((type_codes[valid] * n_pats + event_pat[valid]) * n_times + event_rank)
+
+    counts = OrderedDict()
+    for type_code, type_name in enumerate(types):
+        pat_keys = (type_code * n_pats + index_pat) * n_times
+        hi = np.searchsorted(event_keys, pat_keys + end_rank)
+        for (name, _), start_rank in zip(windows, start_ranks):
+            lo = np.searchsorted(event_keys, pat_keys + start_rank)
+            counts[name, type_name] = np.where(index_valid, hi - lo, 0)
+    return pd.DataFrame(counts, index=index.index)
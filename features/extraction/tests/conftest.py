@@ -0,0 +1,66 @@
+"""
+Make the `sutter` package and the feature extractors importable from the tests.
+
+The `sutter` package is this directory (features/extraction), which is usually linked or
+installed as `sutter`; if it isn't, it is registered here under that name.
+"""
+
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import sutter  # noqa: F401
+except ImportError:
+    sutter = types.ModuleType('sutter')
+    sutter.__path__ = [ROOT]
+    sutter.__file__ = os.path.join(ROOT, '__init__.py')
+    sys.modules['sutter'] = sutter
+
+sys.path.insert(0, os.path.join(ROOT, '3_extraction'))
+
+
+from sutter.lib.databuilder import FeatureExtractor  # noqa: E402
+
+
+class Extractor(FeatureExtractor):
+    """Emit the non-null cells of a DataFrame, with the given missing values."""
+
+    def __init__(self, df, missing=None):
+        FeatureExtractor.__init__(self)
+        self.prefix = 'Extractor'
+        self.df, self.missing = df, missing or {}
+        self.lo = self.hi = None
+
+    def set_account_range(self, lo, hi):
+        self.lo, self.hi = lo, hi
+
+    def extract(self):
+        for row_id, row in self.df.iterrows():
+            if self.lo is not None and not self.lo <= row_id < self.hi:
+                continue
+            for col, value in row.dropna().iteritems():
+                self.emit(row_id, col, value, missing=self.missing.get(col))
+
+
+@pytest.fixture
+def stub_extractor():
+    """The `Extractor` class, a feature extractor emitting the cells of a DataFrame."""
+    return Extractor
+
+
+@pytest.fixture
+def engine():
+    """An engine of the configured database (see `postgres.get_connection`), if one is reachable."""
+    from sutter.lib import postgres
+
+    try:
+        engine = postgres.get_connection()
+        engine.execute('SELECT 1')
+    except Exception as e:
+        pytest.skip('no database to test against: {}'.format(e))
+    return engine
@@ -0,0 +1,77 @@
+"""
+Check that the incremental refresh of sutter.lib.admissions matches a full re-aggregation.
+
+The queueing and re-aggregation happen in triggers and PL/pgSQL, so this runs against a database
+with the admissions table installed. The changes are made in a transaction that is rolled back.
+"""
+
+import pandas as pd
+
+import pytest
+
+from sutter.lib.admissions import ADMISSIONS_SQL, ADMISSIONS_TABLE, QUEUE_TABLE, refresh_admissions
+
+
+@pytest.fixture
+def conn(engine):
+    if not engine.dialect.has_table(engine, ADMISSIONS_TABLE):
+        pytest.skip('{} is not installed'.format(ADMISSIONS_TABLE))
+    conn = engine.connect()
+    trans = conn.begin()
+    yield conn
+    trans.rollback()
+    conn.close()
+
+
+def _table(conn):
+    return pd.read_sql('SELECT * FROM {} ORDER BY hsp_acct_study_id'.format(ADMISSIONS_TABLE),
+                       conn)
+
+
+def _aggregate(conn):
+    return pd.read_sql('SELECT * FROM ({}) adm ORDER BY hsp_acct_study_id'.format(
+        ADMISSIONS_SQL.format('')), conn)
+
+
+def _accounts(conn, n):
+    """Return the ids of `n` inpatient accounts with encounters."""
+    return [row[0] for row in conn.execute("""
+        SELECT DISTINCT hsp_acct_study_id
+          FROM hospital_encounters
+          JOIN hospital_account USING (hsp_acct_study_id)
+         WHERE acct_type_name = 'Inpatient'
+         ORDER BY hsp_acct_study_id
+         LIMIT {}""".format(n))]
+
+
+def test_refresh_matches_full_aggregation(conn):
+    refresh_admissions(conn)
+    pd.testing.assert_frame_equal(_table(conn), _aggregate(conn))
+
+    moved, emptied, outpatient, later = _accounts(conn, 4)
+    new = conn.execute('SELECT max(hsp_acct_study_id) + 1 FROM hospital_account').scalar()
+    # A new account, with one encounter moved from another account and one of its own.
+    conn.execute("""
+        INSERT INTO hospital_account (hsp_acct_study_id, pat_study_id, acct_type_name, loc_name)
+        VALUES ({}, 1, 'Inpatient', 'X')""".format(new))
+    conn.execute("""
+        UPDATE hospital_encounters SET hsp_acct_study_id = {}
+         WHERE enc_study_id = (SELECT min(enc_study_id) FROM hospital_encounters
+                                WHERE hsp_acct_study_id = {})""".format(new, moved))
+    conn.execute("""
+        INSERT INTO hospital_encounters VALUES
+        ({}, -1, '2014-01-01 10:00', '2014-01-05 12:00')""".format(new))
+    conn.execute('DELETE FROM hospital_encounters WHERE hsp_acct_study_id = {}'.format(emptied))
+    conn.execute("""UPDATE hospital_account SET acct_type_name = 'Outpatient'
+                     WHERE hsp_acct_study_id = {}""".format(outpatient))
+    conn.execute("""UPDATE hospital_encounters SET hosp_disch_time = hosp_disch_time + '1 day'
+                     WHERE hsp_acct_study_id = {}""".format(later))
+
+    assert refresh_admissions(conn) == 5
+    pd.testing.assert_frame_equal(_table(conn), _aggregate(conn))
+    table = _table(conn).set_index('hsp_acct_study_id')
+    assert new in table.index and outpatient not in table.index
+    assert table.loc[emptied, ['admit_date_time', 'discharge_date_time']].isnull().all()
+
+    assert conn.execute('SELECT count(*) FROM {}'.format(QUEUE_TABLE)).scalar() == 0
+    assert refresh_admissions(conn) == 0
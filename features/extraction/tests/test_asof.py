@@ -0,0 +1,87 @@
+"""Compare sutter.lib.asof with the DISTINCT ON queries of the "latest during the stay" views."""
+
+import numpy as np
+
+import pandas as pd
+
+from sutter.lib.asof import latest_in_window, take_latest
+
+BASE = pd.Timestamp('2014-01-01')
+
+
+def _data(n_windows=100, n_events=1500, n_patients=20, seed=0):
+    """Random stays and encounters on whole days, with tied times and missing values."""
+    rng = np.random.RandomState(seed)
+    start = BASE + pd.to_timedelta(rng.randint(0, 100, n_windows), 'D')
+    windows = pd.DataFrame({
+        'pat_study_id': rng.randint(0, n_patients, n_windows),
+        'adm_date_time': pd.Series(start).where(rng.rand(n_windows) > 0.05),
+        'disch_date_time': start + pd.to_timedelta(rng.randint(0, 10, n_windows), 'D'),
+    }, index=rng.permutation(n_windows) + 1000)
+    events = pd.DataFrame({
+        'pat_study_id': pd.Series(rng.randint(0, n_patients, n_events)).where(
+            rng.rand(n_events) > 0.02),
+        'contact_date': pd.Series(BASE + pd.to_timedelta(rng.randint(0, 110, n_events), 'D'))
+        .where(rng.rand(n_events) > 0.02),
+        'has_bp': pd.Series(rng.randint(0, 2, n_events)).where(rng.rand(n_events) > 0.1),
+        'value': np.arange(n_events),
+    })
+    return windows, events
+
+
+def _distinct_on(windows, events, start='adm_date_time', priority=None):
+    """
+    The event `DISTINCT ON (account) ... ORDER BY <priority> DESC, contact_date DESC` keeps.
+
+    :returns: for each window, the set of positions in `events` of its best events (any of
+        which the query may return), and the position `latest_in_window` must pick (the last).
+    """
+    best, last = [], []
+    for _, row in windows.iterrows():
+        matches = (events.pat_study_id == row.pat_study_id) & events.contact_date.notnull() & \
+            (events.contact_date <= row.disch_date_time)
+        if start is not None:
+            matches &= events.contact_date >= row[start]
+        for col in priority or []:
+            matches &= events[col].notnull()
+        candidates = events[matches]
+        if not len(candidates):
+            best.append(set())
+            last.append(-1)
+            continue
+        for col in priority or []:
+            candidates = candidates[candidates[col] == candidates[col].max()]
+        candidates = candidates[candidates.contact_date == candidates.contact_date.max()]
+        positions = [events.index.get_loc(i) for i in candidates.index]
+        best.append(set(positions))
+        last.append(max(positions))
+    return best, np.array(last)
+
+
+def test_latest_matches_distinct_on():
+    windows, events = _data()
+    best, last = _distinct_on(windows, events)
+    pos = latest_in_window(windows, events)
+    np.testing.assert_array_equal(pos, last)
+    assert all(p in b for p, b in zip(pos, best) if b)
+
+
+def test_priority_tiers():
+    windows, events = _data(seed=1)
+    _, last = _distinct_on(windows, events, priority=['has_bp'])
+    np.testing.assert_array_equal(latest_in_window(windows, events, priority=['has_bp']), last)
+
+
+def test_windows_without_start():
+    windows, events = _data(seed=2)
+    _, last = _distinct_on(windows, events, start=None)
+    np.testing.assert_array_equal(latest_in_window(windows, events, start=None), last)
+
+
+def test_empty_inputs():
+    windows, events = _data()
+    np.testing.assert_array_equal(latest_in_window(windows, events.iloc[:0]), -1)
+    assert len(latest_in_window(windows.iloc[:0], events)) == 0
+
+    rows = take_latest(events, latest_in_window(windows, events.iloc[:0]), windows.index)
+    assert (rows.index == windows.index).all() and rows.value.isnull().all()
@@ -0,0 +1,36 @@
+"""Check what invalidates the content-addressed cache keys of sutter.lib.cache_key."""
+
+import pandas as pd
+
+from feature_extractors.vitals import VitalsExtractor
+from sutter.lib import cache_key
+
+
+def _stats(**counters):
+    """Return `table_stats`-like counters, with n_tup_ins overridden by `counters`."""
+    tables = ['hospital_account', 'bayes_inpatient_admissions', 'vitals', 'unrelated']
+    return pd.DataFrame({
+        'schemaname': 'public',
+        'relname': tables,
+        'n_tup_ins': [counters.get(table, 10) for table in tables],
+        'n_tup_upd': 0,
+        'n_tup_del': 0,
+    }, columns=['schemaname', 'relname', 'n_tup_ins', 'n_tup_upd', 'n_tup_del'])
+
+
+def test_views_read_by_helpers_are_part_of_the_source():
+    source, lib_sources, views = cache_key.extractor_sql(VitalsExtractor())
+    # VitalsExtractor only reads the index admissions through FeatureExtractor.stays_query.
+    assert 'bayes_vw_index_admissions' not in source
+    assert 'sutter.lib.feature_extractor' in lib_sources
+    assert 'bayes_vw_index_admissions' in views
+
+
+def test_helper_only_tables_invalidate_the_data_version():
+    extractor = VitalsExtractor()
+    version = cache_key.data_version(extractor, _stats())
+    assert cache_key.data_version(extractor, _stats(unrelated=11)) == version
+    assert cache_key.data_version(extractor, _stats(vitals=11)) != version
+    # Read by stays_query, and by the view it joins.
+    assert cache_key.data_version(extractor, _stats(hospital_account=11)) != version
+    assert cache_key.data_version(extractor, _stats(bayes_inpatient_admissions=11)) != version
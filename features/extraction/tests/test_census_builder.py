@@ -0,0 +1,105 @@
+"""Compare sutter.lib.census_builder with the column-by-column mapping it replaces."""
+
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+import pandas as pd
+
+from sutter.lib import census_builder
+from sutter.lib.census_builder import (build_census_dataset, compile_field_dict,
+                                       iter_census_chunks)
+
+COL_DICT = OrderedDict([
+    ('age', OrderedDict([('young', ['a1', 'a2']), ('old', 'a3')])),
+    ('income', OrderedDict([('low', 'i1'), ('all', ['i1', 'i2', 'a1'])])),
+])
+
+
+def _old_mapping(df, col_dict):
+    """The former build_census_dataset, without the export."""
+    census = pd.DataFrame(index=df.index)
+    for col_type, cat_cols in col_dict.iteritems():
+        for col_bin, col_title in cat_cols.iteritems():
+            final_col_name = '__'.join([col_type, col_bin])
+            if isinstance(col_title, list):
+                census[final_col_name] = df[col_title].sum(axis=1)
+            else:
+                census[final_col_name] = df[col_title]
+    return census
+
+
+def _raw(tmpdir, n=50, seed=0):
+    """Write a raw census CSV with missing values and an unused column."""
+    rng = np.random.RandomState(seed)
+    df = pd.DataFrame({col: rng.randint(0, 1000, n).astype(float)
+                       for col in ['a1', 'a2', 'a3', 'i1', 'i2', 'unused']},
+                      index=pd.Index(np.arange(n) + 6001000100, name='Geo_FIPS'))
+    df = df.mask(rng.rand(*df.shape) < 0.2)
+    df['Geo_QName'] = 'Census Tract'
+    path = os.path.join(str(tmpdir), 'raw.csv')
+    df.to_csv(path)
+    return path, df
+
+
+def test_compile_field_dict():
+    input_cols, output_cols, matrix, single = compile_field_dict(COL_DICT)
+    assert input_cols == ['a1', 'a2', 'a3', 'i1', 'i2']
+    assert output_cols == ['age__young', 'age__old', 'income__low', 'income__all']
+    np.testing.assert_array_equal(matrix.toarray(), [[1, 1, 0, 0, 0],
+                                                     [0, 0, 1, 0, 0],
+                                                     [0, 0, 0, 1, 0],
+                                                     [1, 0, 0, 1, 1]])
+    np.testing.assert_array_equal(single, [False, True, True, False])
+
+
+def test_chunks_match_old_mapping(tmpdir):
+    path, df = _raw(tmpdir)
+    expected = _old_mapping(df, COL_DICT)
+    for chunksize in [7, 50, 1000]:
+        chunks = list(iter_census_chunks(path, COL_DICT, chunksize=chunksize))
+        assert len(chunks) == -(-len(df) // chunksize)
+        pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+
+
+def test_missing_values_are_summed_as_zero_but_copied_as_missing(tmpdir):
+    df = pd.DataFrame({'a1': [np.nan, 1.], 'a2': [np.nan, np.nan], 'a3': [np.nan, 2.],
+                       'i1': [3., np.nan], 'i2': [np.nan, 4.]},
+                      index=pd.Index([1, 2], name='Geo_FIPS'))
+    path = os.path.join(str(tmpdir), 'raw.csv')
+    df.to_csv(path)
+
+    census = pd.concat(iter_census_chunks(path, COL_DICT))
+    np.testing.assert_array_equal(census['age__young'], [0, 1])
+    np.testing.assert_array_equal(census['age__old'], [np.nan, 2])
+    np.testing.assert_array_equal(census['income__low'], [3, np.nan])
+    np.testing.assert_array_equal(census['income__all'], [3, 5])
+    pd.testing.assert_frame_equal(census, _old_mapping(df, COL_DICT))
+
+
+def test_output_dtype(tmpdir):
+    path, df = _raw(tmpdir)
+    census = pd.concat(iter_census_chunks(path, COL_DICT, dtype=np.float32))
+    assert (census.dtypes == np.float32).all()
+    np.testing.assert_allclose(census.values, _old_mapping(df, COL_DICT).values)
+
+
+def test_build_census_dataset(tmpdir, monkeypatch):
+    path, df = _raw(tmpdir)
+    dict_path = os.path.join(str(tmpdir), 'census_dictionary.json')
+    with open(dict_path, 'w') as f:
+        json.dump(COL_DICT, f)
+    expected = _old_mapping(df, COL_DICT)
+
+    # The columns are in the (arbitrary) order of the mapping loaded from JSON.
+    census = build_census_dataset(path, None, dict_path, export=False, chunksize=7)
+    pd.testing.assert_frame_equal(census, expected, check_like=True)
+
+    tmpdir.mkdir('data').mkdir('census')
+    monkeypatch.setattr(census_builder, 'get_path', lambda: str(tmpdir))
+    assert build_census_dataset(path, 'census.csv', dict_path, chunksize=7) is None
+    written = pd.read_csv(os.path.join(str(tmpdir), 'data', 'census', 'census.csv'),
+                          index_col='Geo_FIPS')
+    pd.testing.assert_frame_equal(written, expected, check_like=True)
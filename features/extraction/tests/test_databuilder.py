@@ -0,0 +1,68 @@
+"""Check that partitioned features load as if the whole population had been extracted at once."""
+
+import json
+import os
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from sutter.lib.databuilder import (PARTITION_META_FILE, DatabuilderFramework,
+                                    MetaInconsistentException, load_partitioned_features,
+                                    write_partition)
+
+
+def _partitions(tmpdir):
+    """Write two partitions, with dummy columns that only one of them has."""
+    first = pd.DataFrame({'age': [50, 60], 'race_white': [1, 0]}, index=[1, 2])
+    second = pd.DataFrame({'age': [70.], 'race_asian': [1]}, index=[3])
+    for name, df in [('part-0-3', first), ('part-3-6', second)]:
+        df.index.name = 'hsp_acct_study_id'
+        write_partition(df, str(tmpdir), name)
+    with open(os.path.join(str(tmpdir), PARTITION_META_FILE), 'w') as f:
+        json.dump({'missing': {'race_white': 0, 'race_asian': 0}}, f)
+
+
+def test_partitions_have_the_union_of_the_columns(tmpdir):
+    _partitions(tmpdir)
+    features = load_partitioned_features(str(tmpdir))
+    assert list(features.index) == [1, 2, 3]
+    assert sorted(features.columns) == ['age', 'race_asian', 'race_white']
+    np.testing.assert_array_equal(features.race_white, [1, 0, 0])
+    np.testing.assert_array_equal(features.race_asian, [0, 0, 1])
+    np.testing.assert_array_equal(features.age, [50, 60, 70])
+
+
+def test_columns_are_selected_after_filling(tmpdir):
+    _partitions(tmpdir)
+    features = load_partitioned_features(str(tmpdir), columns=['race_asian', 'unknown'])
+    assert list(features.columns) == ['race_asian', 'unknown']
+    np.testing.assert_array_equal(features.race_asian, [0, 0, 1])
+    assert features.unknown.isnull().all()
+
+
+def test_missing_values_are_kept_by_run_partitioned(tmpdir, stub_extractor):
+    # The second partition has no `flag_bool` cells, so its file has no such column.
+    df = pd.DataFrame({'age': [50, 60, 70, 80], 'n_visits': [1, np.nan, 2, np.nan],
+                       'flag_bool': [1, 1, np.nan, np.nan]}, index=[1, 2, 3, 4])
+    framework = DatabuilderFramework(load_state=False)
+    framework.add_feature_extractor(stub_extractor(df, {'n_visits': 0, 'flag_bool': 0}))
+    framework.run_partitioned(str(tmpdir), [(1, 3), (3, 5)])
+
+    features = load_partitioned_features(str(tmpdir))
+    np.testing.assert_array_equal(features['Extractor__n_visits'], [1, 0, 2, 0])
+    np.testing.assert_array_equal(features['Extractor__flag_bool'], [1, 1, 0, 0])
+
+
+def test_emit_df_records_missing_values(stub_extractor):
+    extractor = stub_extractor(pd.DataFrame())
+    df = pd.DataFrame({'n_visits': [1, 2], 'px_a': [True, False]}, index=[1, 2])
+    extractor.emit_df(df, missing={'px_a': False})
+    assert extractor._meta_store['Extractor__px_a']['missing'] is False
+    assert extractor._meta_store['Extractor__n_visits']['missing'] is None
+    assert extractor._data_store['2'] == {'Extractor__n_visits': 2, 'Extractor__px_a': False}
+
+    with pytest.raises(MetaInconsistentException):
+        extractor.emit_df(df[['px_a']], missing=0.5)
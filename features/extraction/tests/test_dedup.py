@@ -0,0 +1,84 @@
+"""Compare sutter.lib.dedup with the groupby aggregations it replaces."""
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from sutter.lib.dedup import dedupe
+
+RULES = [('first', {}), ('latest', {'order_by': ['t']}), ('first_non_null', {}),
+         ('aggregate', {'aggregations': {'a': 'max', 'i': 'sum'}})]
+
+
+def _frame(n=3000, n_accounts=1500, seed=0):
+    """Random rows, with duplicated accounts, tied times and missing values."""
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({
+        'a': rng.choice([1.0, 2.0, np.nan], n),
+        'b': rng.choice(['x', 'y', None], n),
+        't': pd.Timestamp('2012-01-01') + pd.to_timedelta(rng.randint(0, 100, n), 'D'),
+        'i': rng.randint(0, 5, n),
+    }, index=pd.Index(rng.randint(0, n_accounts, n), name='hsp_acct_study_id'))
+
+
+def _shuffled(df, seed):
+    return df.take(np.random.RandomState(seed).permutation(len(df)))
+
+
+@pytest.mark.parametrize('rule,kwargs', RULES)
+def test_result_does_not_depend_on_row_order(rule, kwargs):
+    df = _frame()
+    res = dedupe(df, rule, **kwargs)
+    assert res.index.is_monotonic_increasing and res.index.is_unique
+    assert len(res) == df.index.nunique()
+    for seed in range(3):
+        pd.testing.assert_frame_equal(dedupe(_shuffled(df, seed), rule, **kwargs), res)
+
+
+def test_latest_keeps_the_latest_row():
+    df = _frame()
+    res = dedupe(df, 'latest', order_by=['t'])
+    pd.testing.assert_series_equal(res.t, df.groupby(level=0).t.max())
+
+
+def test_aggregate_matches_groupby():
+    df = _frame()
+    res = dedupe(df, 'aggregate', aggregations={'a': 'min', 'i': 'sum'})
+    grouped = df.groupby(level=0)
+    np.testing.assert_array_equal(res.a.values, grouped.a.min().values)
+    np.testing.assert_array_equal(res.i.values, grouped.i.sum().values)
+    # The other columns are those of the first row.
+    pd.testing.assert_series_equal(res.t, dedupe(df, 'first').t)
+
+
+def test_first_non_null_matches_groupby_first():
+    # With at most one non-null value per account and column, the first non-null value of each
+    # account doesn't depend on the order of its rows.
+    df = _frame()
+    rng = np.random.RandomState(1)
+    for col in ['a', 'b']:
+        keep = pd.Series(rng.rand(len(df)), index=df.index).groupby(level=0).rank(method='first')
+        df[col] = df[col].where(keep.values == 1)
+    df = df[['a', 'b']]
+    res = dedupe(_shuffled(df, 2), 'first_non_null')
+    pd.testing.assert_frame_equal(res, df.groupby(level=0).first())
+
+
+def test_frame_without_duplicates_is_returned_as_is():
+    df = _frame()
+    unique = df[~df.index.duplicated()]
+    for rule, kwargs in RULES:
+        assert dedupe(unique, rule, **kwargs) is unique
+
+
+def test_empty_frame():
+    df = _frame().iloc[:0]
+    for rule, kwargs in RULES:
+        assert len(dedupe(df, rule, **kwargs)) == 0
+
+
+def test_latest_needs_order_by():
+    with pytest.raises(ValueError):
+        dedupe(_frame(), 'latest')
@@ -0,0 +1,79 @@
+"""Check the dtype policy of sutter.lib.dtypes."""
+
+import numpy as np
+
+import pandas as pd
+
+from sutter.lib import dtypes
+from sutter.lib.dtypes import column_kind, compact_column, compact_dtypes
+
+
+def test_column_kind():
+    assert column_kind('if_cocaine_bool') == 'bool'
+    assert column_kind('race_cat') == 'category'
+    assert column_kind('n_visits') == 'numeric'
+    assert column_kind('bool_count') == 'numeric'
+
+
+def test_bool_columns():
+    flags = compact_column(pd.Series([1, 0, 1], name='a_bool'))
+    assert flags.dtype == bool
+    assert list(flags) == [True, False, True]
+    assert compact_column(pd.Series([True, False], dtype=object, name='a_bool')).dtype == bool
+
+
+def test_bool_columns_with_missing_values_are_float32():
+    flags = compact_column(pd.Series([True, np.nan, False], dtype=object, name='a_bool'))
+    assert flags.dtype == np.float32
+    np.testing.assert_array_equal(flags, [1, np.nan, 0])
+
+
+def test_category_columns():
+    column = compact_column(pd.Series(['a', 'b', 'a', None], name='race_cat'))
+    assert column.dtype.name == 'category'
+    assert list(column.cat.categories) == ['a', 'b']
+    assert column.isnull().sum() == 1
+
+
+def test_whole_numbers_get_the_smallest_int_dtype():
+    info16, info32 = np.iinfo(np.int16), np.iinfo(np.int32)
+    for values, dtype in [([info16.min, info16.max], np.int16),
+                          ([info16.min - 1, 0], np.int32),
+                          ([0, info16.max + 1], np.int32),
+                          ([info32.min, info32.max], np.int32),
+                          ([0., 2.], np.int16)]:
+        column = compact_column(pd.Series(values, name='n'))
+        assert column.dtype == dtype, values
+        np.testing.assert_array_equal(column, values)
+
+    # Too large for int32: integers are kept as they are, floats become float32.
+    assert compact_column(pd.Series([0, info32.max + 1], name='n')).dtype == np.int64
+    assert compact_column(pd.Series([0., info32.max + 1.], name='n')).dtype == np.float32
+
+
+def test_other_numbers_are_float32():
+    assert compact_column(pd.Series([0.5, 1.], name='n')).dtype == np.float32
+    assert compact_column(pd.Series([1., np.nan], name='n')).dtype == np.float32
+
+
+def test_non_numeric_columns_are_untouched():
+    dates = pd.Series(pd.to_datetime(['2014-01-01', '2014-02-01']), name='adm_date')
+    assert compact_column(dates).dtype == dates.dtype
+    empty = pd.Series([], dtype=np.float64, name='n')
+    assert compact_column(empty).dtype == np.float64
+
+
+def test_column_dtypes_override_the_policy(monkeypatch):
+    monkeypatch.setitem(dtypes.COLUMN_DTYPES, 'n', np.float64)
+    monkeypatch.setitem(dtypes.COLUMN_DTYPES, 'a_bool', np.int8)
+    assert compact_column(pd.Series([1, 2], name='n')).dtype == np.float64
+    assert compact_column(pd.Series([1, 0], name='a_bool')).dtype == np.int8
+
+
+def test_compact_dtypes_keeps_the_frame():
+    df = pd.DataFrame({'n': [1., 2.], 'x': [0.5, 1.], 'a_bool': [1, 0]}, index=[10, 20],
+                      columns=['x', 'n', 'a_bool'])
+    res = compact_dtypes(df)
+    assert list(res.columns) == ['x', 'n', 'a_bool'] and list(res.index) == [10, 20]
+    assert list(res.dtypes) == [np.float32, np.int16, bool]
+    np.testing.assert_array_equal(res.values.astype(float), df.values)
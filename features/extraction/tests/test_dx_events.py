@@ -0,0 +1,96 @@
+"""
+Check that the incremental appends of sutter.lib.dx_events match a rebuild from scratch.
+
+The appends are PL/pgSQL, so this runs against a database with the dx events table installed.
+The changes are made in a transaction that is rolled back.
+"""
+
+import pandas as pd
+
+import pytest
+
+from sutter.lib.dx_events import DX_EVENTS_TABLE, append_dx_events, create_dx_events_table
+
+COLUMNS = ['pat_study_id', 'hsp_acct_study_id', 'enc_study_id', 'noted_date', 'dx_mode',
+           'dx_source', 'icd_9_cm_code', 'condition_cat', 'weight']
+KEYS = ['pat_study_id', 'condition_cat', 'noted_date']
+
+
+@pytest.fixture
+def conn(engine):
+    if not engine.dialect.has_table(engine, DX_EVENTS_TABLE):
+        pytest.skip('{} is not installed'.format(DX_EVENTS_TABLE))
+    conn = engine.connect()
+    trans = conn.begin()
+    yield conn
+    trans.rollback()
+    conn.close()
+
+
+def _events(conn):
+    return pd.read_sql('SELECT * FROM {} ORDER BY event_id'.format(DX_EVENTS_TABLE), conn,
+                       index_col='event_id')
+
+
+def _assert_same_events(left, right):
+    """
+    Compare the events, whatever their order.
+
+    Diagnoses of a condition noted at the same time are ordered by event_id, so which of them
+    has the days since the prior diagnosis (and which has 0) depends on the order they were
+    added in. Only the days of each (patient, condition, time) are compared, as a sorted list.
+    """
+    def rows(events):
+        return events[COLUMNS].sort_values(COLUMNS).reset_index(drop=True)
+
+    def days(events):
+        return events.groupby(KEYS).days_since_prior_dx.apply(
+            lambda values: sorted(values.fillna(-1)))
+
+    pd.testing.assert_frame_equal(rows(left), rows(right))
+    pd.testing.assert_series_equal(days(left), days(right))
+
+
+def test_appends_match_a_rebuild(conn):
+    # Start from the diagnoses of the current tables (the appends never remove any).
+    create_dx_events_table(conn)
+    assert append_dx_events(conn) == 0
+
+    # The Inpatient diagnosis of a patient with several of the same condition.
+    pat_study_id, condition_cat, code, first, last = conn.execute("""
+        SELECT pat_study_id, condition_cat, min(icd_9_cm_code), min(noted_date), max(noted_date)
+          FROM {}
+         WHERE dx_source = 'hospital_dx' AND dx_mode = 'Inpatient'
+         GROUP BY pat_study_id, condition_cat
+        HAVING count(DISTINCT noted_date) > 1
+         ORDER BY pat_study_id, condition_cat
+         LIMIT 1""".format(DX_EVENTS_TABLE)).first()
+    between = first + (last - first) / 2 + pd.Timedelta('17s').to_pytimedelta()
+
+    # A new account and a new encounter of that patient, diagnosed between those diagnoses.
+    account = conn.execute('SELECT max(hsp_acct_study_id) + 1 FROM hospital_account').scalar()
+    conn.execute("""
+        INSERT INTO hospital_account (hsp_acct_study_id, pat_study_id, acct_type_name,
+                                      adm_date_time, disch_date_time)
+        VALUES (%s, %s, 'Inpatient', %s, %s)""", account, pat_study_id, between, between)
+    conn.execute("INSERT INTO hospital_dx (hsp_acct_study_id, line, icd_9_cm_code) "
+                 "VALUES (%s, 1, %s)", account, code)
+    encounter = conn.execute('SELECT max(enc_study_id) + 1 FROM encounters').scalar()
+    conn.execute("INSERT INTO encounters (enc_study_id, pat_study_id, contact_date) "
+                 "VALUES (%s, %s, %s)", encounter, pat_study_id, last.date())
+    conn.execute("INSERT INTO encounter_dx (enc_study_id, line, icd_9_cm_code) "
+                 "VALUES (%s, 1, %s)", encounter, code)
+
+    before = _events(conn)
+    assert append_dx_events(conn) == 2
+    appended = _events(conn)
+    assert append_dx_events(conn) == 0
+
+    new = appended[appended.hsp_acct_study_id.eq(account) | appended.enc_study_id.eq(encounter)]
+    assert len(new) == 2 and (new.condition_cat == condition_cat).all()
+    # The diagnoses after the new ones now count the days since them.
+    days = appended.days_since_prior_dx.reindex(before.index).fillna(-1)
+    assert (days != before.days_since_prior_dx.fillna(-1)).any()
+
+    create_dx_events_table(conn)
+    _assert_same_events(appended, _events(conn))
@@ -0,0 +1,78 @@
+"""Check sutter.lib.encounter_map's mapping of accounts to the encounters of their stay."""
+
+import numpy as np
+
+import pandas as pd
+
+from sutter.lib.encounter_map import _DAY_SPAN, _EPOCH, _keys, map_encounters
+
+
+def _accounts(*stays):
+    """Accounts 1, 2, ... with the given (patient, admission, discharge)."""
+    return pd.DataFrame([(i + 1, pat, pd.Timestamp(adm), pd.Timestamp(disch))
+                         for i, (pat, adm, disch) in enumerate(stays)],
+                        columns=['hsp_acct_study_id', 'pat_study_id', 'adm_date_time',
+                                 'disch_date_time'])
+
+
+def _encounters(*encounters):
+    """Encounters 10, 11, ... of the given (patient, contact date)."""
+    return pd.DataFrame([(i + 10, pat, pd.Timestamp(date))
+                         for i, (pat, date) in enumerate(encounters)],
+                        columns=['enc_study_id', 'pat_study_id', 'contact_date'])
+
+
+def _pairs(mapping):
+    return list(zip(mapping.hsp_acct_study_id, mapping.enc_study_id))
+
+
+def test_stays_include_their_first_and_last_days():
+    accounts = _accounts((1, '2014-01-05 22:00', '2014-01-07 06:00'),
+                         (2, '2014-01-05 08:00', '2014-01-05 18:00'))
+    encounters = _encounters((1, '2014-01-04'),           # 10: the day before the admission
+                             (1, '2014-01-05'),           # 11: the admission day, before the time
+                             (1, '2014-01-07 12:00'),     # 12: the discharge day, after the time
+                             (1, '2014-01-08'),           # 13: the day after the discharge
+                             (2, '2014-01-05 20:00'),     # 14: same-day stay
+                             (3, '2014-01-06'))           # 15: another patient
+    mapping = map_encounters(accounts, encounters)
+    assert _pairs(mapping) == [(1, 11), (1, 12), (2, 14)]
+    assert list(mapping.contact_date) == list(encounters.contact_date[[1, 2, 4]])
+
+
+def test_encounters_are_ordered_by_account_and_date():
+    rng = np.random.RandomState(0)
+    dates = pd.Timestamp('2014-01-01') + pd.to_timedelta(rng.randint(0, 30, 200), 'D')
+    encounters = _encounters(*zip(rng.randint(0, 5, 200), dates))
+    accounts = _accounts(*[(pat, '2014-01-10', '2014-01-20') for pat in [3, 0, 3, 4]])
+    mapping = map_encounters(accounts, encounters)
+
+    expected = []
+    for acct in accounts.itertuples():
+        stay = encounters[(encounters.pat_study_id == acct.pat_study_id) &
+                          (encounters.contact_date >= acct.adm_date_time) &
+                          (encounters.contact_date <= acct.disch_date_time)]
+        expected += [(acct.hsp_acct_study_id, enc)
+                     for enc in stay.sort_values('contact_date', kind='mergesort').enc_study_id]
+    assert _pairs(mapping) == expected
+
+
+def test_stay_without_encounters():
+    mapping = map_encounters(_accounts((1, '2014-01-05', '2014-01-04')),
+                             _encounters((1, '2014-01-04'), (1, '2014-01-05')))
+    assert len(mapping) == 0
+    assert list(mapping.columns) == ['hsp_acct_study_id', 'enc_study_id', 'contact_date']
+
+
+def test_keys_are_clipped_to_the_patient():
+    last_day = _EPOCH + np.timedelta64(_DAY_SPAN - 1, 'D')
+    keys = _keys([1, 1, 1, 2], pd.to_datetime(['1850-01-01', str(_EPOCH), '2260-01-01',
+                                               str(_EPOCH)]))
+    assert list(keys) == [_DAY_SPAN, _DAY_SPAN, 2 * _DAY_SPAN - 1, 2 * _DAY_SPAN]
+    assert _keys([1], [str(last_day)])[0] == 2 * _DAY_SPAN - 1
+
+    # Out of range dates are clipped to the first or last day of their patient, rather than
+    # overflowing into the days of the next patient.
+    accounts = _accounts((1, '2200-01-01', '2262-01-01'), (2, '1901-01-01', '1902-12-31'))
+    encounters = _encounters((1, '2260-01-01'), (2, '1850-01-01'), (2, '1901-06-01'))
+    assert _pairs(map_encounters(accounts, encounters)) == [(1, 10), (2, 12)]
@@ -0,0 +1,73 @@
+"""Check that the category mappings map values the same way in pandas and in SQL."""
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from sutter.lib.feature_categorizers import (CATEGORY_MAPPINGS, LOWER, marital_status_from_string,
+                                             race_from_string, render_categories)
+
+UNLISTED = ['Other Value', 'MiXeD cAsE', 'white/caucasian', ' Married']
+
+
+def _values(mapping):
+    """The listed values of a mapping, unlisted ones and missing ones, in no particular order."""
+    values = list(mapping.mapping) + UNLISTED + [None]
+    return pd.Series(values * 2, index=np.arange(len(values) * 2) * 10, name='value')
+
+
+def _expected(mapping, value):
+    """Map a single value with a dict lookup, as the former `*_from_string` functions did."""
+    if value is not None and value in mapping.mapping:
+        return mapping.mapping[value]
+    elif mapping.default is LOWER:
+        return None if value is None else value.lower()
+    return mapping.default
+
+
+@pytest.mark.parametrize('name', list(CATEGORY_MAPPINGS))
+def test_apply_matches_a_dict_lookup(name):
+    mapping = CATEGORY_MAPPINGS[name]
+    values = _values(mapping)
+    categories = mapping.apply(values)
+    assert categories.index.equals(values.index) and categories.name == 'value'
+    assert list(categories) == [_expected(mapping, value) for value in values]
+    assert [mapping(value) for value in values] == list(categories)
+    # NaN is missing, like None.
+    assert mapping.apply(pd.Series([np.nan]))[0] == _expected(mapping, None)
+
+
+def test_apply_to_an_empty_series():
+    assert len(CATEGORY_MAPPINGS['race'].apply(pd.Series([], dtype=object))) == 0
+
+
+def test_from_string_wrappers():
+    assert race_from_string('White/Caucasian') == 'white'
+    assert race_from_string('Unknown') is None
+    assert race_from_string('Asian') == 'other'
+    assert marital_status_from_string('Life Partner') == 'partner'
+    assert marital_status_from_string(None) == 'other'
+
+
+@pytest.mark.parametrize('name', list(CATEGORY_MAPPINGS))
+def test_sql_matches_apply(engine, name):
+    mapping = CATEGORY_MAPPINGS[name]
+    values = _values(mapping)
+    query = """
+        SELECT {} AS category
+          FROM unnest(%(values)s::VARCHAR[]) WITH ORDINALITY AS t (value, i)
+         ORDER BY i
+    """.format(mapping.sql('value').replace('%', '%%'))
+    res = pd.read_sql(query, engine, params={'values': list(values)})
+    assert list(res.category) == list(mapping.apply(values))
+
+
+def test_render_categories():
+    sql = "SELECT {{race(acct.race_name)}} AS race, {{ yes_no(alcohol) }} AS alcohol FROM acct"
+    assert render_categories(sql) == "SELECT {} AS race, {} AS alcohol FROM acct".format(
+        CATEGORY_MAPPINGS['race'].sql('acct.race_name'), CATEGORY_MAPPINGS['yes_no'].sql('alcohol'))
+    assert render_categories('SELECT {{not a placeholder}}') == 'SELECT {{not a placeholder}}'
+    with pytest.raises(KeyError):
+        render_categories('SELECT {{unknown(x)}}')
@@ -0,0 +1,55 @@
+"""Check the point-in-time reads of sutter.lib.feature_store."""
+
+import calendar
+
+import pandas as pd
+
+from sutter.lib import feature_store
+from sutter.lib.feature_store import FeatureStore
+
+
+def _store(tmpdir, monkeypatch, extractor, writes):
+    """Write each {account: value} of `writes` at the given (UTC) time, as if extracted then."""
+    store = FeatureStore(str(tmpdir))
+    store._as_of = pd.Series(pd.to_datetime(['2014-01-10', '2014-03-10', '2014-06-10']),
+                             index=[1, 2, 3])
+    for written_at, values in writes:
+        seconds = calendar.timegm(pd.Timestamp(written_at).timetuple())
+        monkeypatch.setattr(feature_store.time, 'time', lambda: seconds)
+        run = extractor(pd.DataFrame({'n_visits': pd.Series(values)}))
+        run.extract()
+        store.write(run)
+    return store
+
+
+def _values(features):
+    return features['Extractor__n_visits'].to_dict()
+
+
+def test_reads_the_latest_write_known_at_as_of(tmpdir, monkeypatch, stub_extractor):
+    store = _store(tmpdir, monkeypatch, stub_extractor, [('2014-02-01', {1: 1.}),
+                                                         ('2014-07-01', {1: 2., 2: 2., 3: 2.}),
+                                                         ('2014-12-01', {2: 3.})])
+    assert _values(store.read_extractor('Extractor')) == {1: 2., 2: 3., 3: 2.}
+    assert _values(store.read_extractor('Extractor', as_of='2014-12-31')) == \
+        {1: 2., 2: 3., 3: 2.}
+    assert _values(store.read_extractor('Extractor', as_of='2014-08-01')) == \
+        {1: 2., 2: 2., 3: 2.}
+    # Account 1 was written on 2014-02-01, but accounts 2 and 3 weren't valid until later.
+    assert _values(store.read_extractor('Extractor', as_of='2014-03-01')) == {1: 1.}
+    assert _values(store.read_extractor('Extractor', as_of='2014-01-31')) == {}
+
+
+def test_per_account_as_of(tmpdir, monkeypatch, stub_extractor):
+    store = _store(tmpdir, monkeypatch, stub_extractor, [('2014-02-01', {1: 1., 2: 1.}),
+                                                         ('2014-05-01', {1: 2., 2: 2.})])
+    as_of = pd.Series(pd.to_datetime(['2014-04-01', '2014-04-01']), index=[1, 2])
+    # Account 2's features (valid from 2014-03-10) were first written on 2014-02-01.
+    assert _values(store.read(as_of=as_of)) == {1: 1., 2: 1.}
+    as_of[2] = pd.Timestamp('2014-03-01')
+    assert _values(store.read(as_of=as_of)) == {1: 1.}
+
+
+def test_written_at_is_utc():
+    assert feature_store._written_at('part-86400000001.parquet') == \
+        pd.Timestamp('1970-01-02 00:00:00.000001')
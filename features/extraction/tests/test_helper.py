@@ -0,0 +1,103 @@
+"""Compare the batched intervention metrics of sutter.lib.helper with one threshold at a time."""
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from sutter.lib.helper import get_capacity_metrics, get_metrics, get_threshold_metrics
+
+COLUMNS = ['precision', 'recall', 'sensitivity', 'specificity', 'num_intervened',
+           'num_intervened_correct', 'fraction_intervened', 'ppv', 'npv', 'tp', 'tn', 'fp', 'fn']
+
+
+def _confusion(intervened, actual):
+    """The metrics of one intervention, as `get_metrics` computed them for one threshold."""
+    actual = np.asarray(actual).astype(bool)
+    tp = float((intervened & actual).sum())
+    tn = float((~intervened & ~actual).sum())
+    fp = float((intervened & ~actual).sum())
+    fn = float((~intervened & actual).sum())
+    p = float(intervened.sum())
+    n = float((~intervened).sum())
+    metrics = {'tp': tp, 'tn': tn, 'fp': fp, 'fn': fn,
+               'num_intervened': p, 'num_intervened_correct': tp}
+    metrics['precision'] = metrics['ppv'] = tp / p if p else np.nan
+    metrics['recall'] = metrics['sensitivity'] = tp / actual.sum() if actual.sum() else np.nan
+    metrics['specificity'] = tn / (~actual).sum() if (~actual).sum() else np.nan
+    metrics['fraction_intervened'] = p / (p + n) if (p + n) else np.nan
+    metrics['npv'] = tn / n if n else np.nan
+    return metrics
+
+
+def _data(n=500, seed=0):
+    """Predictions rounded to create ties, some of them missing, and their labels."""
+    rng = np.random.RandomState(seed)
+    predictions = rng.rand(n).round(2)
+    actual = rng.rand(n) < predictions
+    predictions[rng.rand(n) < .05] = np.nan
+    return predictions, actual
+
+
+def _assert_matches(batched, expected):
+    expected = pd.DataFrame(expected, index=batched.index)[COLUMNS]
+    pd.testing.assert_frame_equal(batched[COLUMNS], expected, check_dtype=False)
+
+
+def test_threshold_metrics_match_one_threshold_at_a_time():
+    predictions, actual = _data()
+    # Below, at and above every prediction, and between them.
+    thresholds = np.concatenate([[-1., 0., .5, 1., 2.], np.unique(predictions[~np.isnan(
+        predictions)]), np.linspace(0, 1, 37)])
+    with np.errstate(invalid='ignore'):
+        expected = [_confusion(predictions > t, actual) for t in thresholds]
+    _assert_matches(get_threshold_metrics(predictions, actual, thresholds), expected)
+
+
+def test_get_metrics_at_a_threshold():
+    predictions, actual = _data()
+    predictions = np.nan_to_num(predictions)
+    metrics = get_metrics(predictions, actual, intervention_threshold=.3)
+    expected = _confusion(predictions > .3, actual)
+    for col in COLUMNS:
+        assert metrics[col] == pytest.approx(expected[col], nan_ok=True), col
+
+
+def _top_k(predictions, k):
+    """Intervene on the k highest predictions (NaNs last, ties in order), one at a time."""
+    ranks = np.where(np.isnan(predictions), -np.inf, predictions)
+    intervened = np.zeros(len(predictions), dtype=bool)
+    intervened[np.argsort(-ranks, kind='mergesort')[:k]] = True
+    return intervened
+
+
+@pytest.mark.parametrize('with_groups', [False, True])
+def test_capacity_metrics_match_one_capacity_at_a_time(with_groups):
+    predictions, actual = _data()
+    groups = np.random.RandomState(1).choice(['a', 'b', 'c'], len(predictions))
+    capacities = [0, 1, 10, 100, 160, 200, 480, 500, 1000]
+
+    expected = []
+    for k in capacities:
+        if with_groups:
+            intervened = np.zeros(len(predictions), dtype=bool)
+            for group in np.unique(groups):
+                members = np.flatnonzero(groups == group)
+                intervened[members[_top_k(predictions[members], k)]] = True
+        else:
+            intervened = _top_k(predictions, k)
+        expected.append(_confusion(intervened, actual))
+
+    batched = get_capacity_metrics(predictions, actual, capacities,
+                                   groups=groups if with_groups else None)
+    _assert_matches(batched, expected)
+
+
+def test_missing_predictions_are_intervened_on_last():
+    predictions = np.array([np.nan, .1, np.nan, .9])
+    actual = np.array([True, False, True, False])
+    res = get_capacity_metrics(predictions, actual, [2, 3])
+    assert res.tp.tolist() == [0, 1]
+    res = get_threshold_metrics(predictions, actual, [-np.inf, 0])
+    assert res.tp.tolist() == [0, 0] and res.num_intervened.tolist() == [2, 2]
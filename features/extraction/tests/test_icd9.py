@@ -0,0 +1,89 @@
+"""Check the integer encoding and the crosswalk lookups of sutter.lib.icd9."""
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from sutter.lib.icd9 import (KEY_FUNCTION_SQL, MISSING, CodeTable, decode_icd9, encode_icd9,
+                             normalize_icd9)
+
+
+def test_formats_of_a_code_share_its_key():
+    keys = encode_icd9(['428.0', '4280', "'4280 '", ' 428.0', '4280 ', u'428.0'])
+    assert len(set(keys)) == 1 and keys[0] != MISSING
+    assert encode_icd9(['4280'])[0] != encode_icd9(['42800'])[0]
+    assert encode_icd9(['v45.81'])[0] == encode_icd9(['V4581'])[0]
+
+
+@pytest.mark.parametrize('code,padded', [
+    ('428.0', '4280 '), ('42800', '42800'), ('038.9', '0389 '), ("'4019 '", '4019 '),
+    ('V45.81', 'V4581'), ('V30', 'V30  '), ('E888.9', 'E8889'), ('E849.7', 'E8497'), ('', '     '),
+])
+def test_round_trip(code, padded):
+    assert normalize_icd9([code]).tolist() == [padded]
+    assert decode_icd9(encode_icd9([code])).tolist() == [padded]
+
+
+def test_malformed_and_null_codes_are_missing():
+    # Longer than 5 characters (which the former `rpad(code, 5)` truncated), or not alphanumeric.
+    codes = ['428001', 'E888.91', '42-80', '4280$', None, np.nan]
+    assert encode_icd9(codes).tolist() == [MISSING] * len(codes)
+    assert decode_icd9([MISSING]).tolist() == [None]
+
+
+def test_codes_must_be_strings():
+    for codes in [[4280], ['4280', 428.0], np.array([389])]:
+        with pytest.raises(TypeError):
+            encode_icd9(codes)
+
+
+def test_keys_sort_like_padded_codes():
+    codes = ['0389', '4019', '428', '4280', '42800', 'V30', 'E8889', '001']
+    keys = encode_icd9(codes)
+    assert [codes[i] for i in np.argsort(keys)] == \
+        sorted(codes, key=lambda c: c.ljust(5).replace('E', '~E').replace('V', '~V'))
+
+
+def test_empty_input():
+    assert len(encode_icd9([])) == 0
+    assert len(decode_icd9([])) == 0
+
+
+def _table():
+    return CodeTable(pd.DataFrame({
+        'icd_9_cm_code': ["'4280 '", "'V4581'", "'4019 '", "'4280 '", "'bad!!'"],
+        'condition_cat': ['chf', 'other', 'htn', 'duplicate', 'malformed'],
+        'weight': [2, 0, 1, 9, 9],
+    }))
+
+
+def test_lookup_keeps_the_first_of_duplicate_and_drops_malformed_codes():
+    table = _table()
+    assert len(table) == 3
+    res = table.lookup(['428.0', 'V45.81', '40190', None, '4019'], ['condition_cat', 'weight'])
+    assert res.condition_cat.tolist() == ['chf', 'other', np.nan, np.nan, 'htn']
+    assert res.weight.tolist()[:2] == [2, 0] and np.isnan(res.weight[2])
+
+
+def test_lookup_keeps_the_index_of_a_series():
+    codes = pd.Series(['4019', '0000'], index=[10, 20])
+    res = _table().lookup(codes, 'condition_cat')
+    assert res.index.tolist() == [10, 20]
+    assert res.tolist() == ['htn', np.nan]
+
+
+def test_lookup_in_an_empty_table():
+    table = CodeTable(pd.DataFrame({'icd_9_cm_code': [], 'weight': []}))
+    assert table.positions(['4280']).tolist() == [MISSING]
+
+
+def test_sql_keys_match(engine):
+    codes = ['428.0', '4280', "'4280 '", 'v45.81', 'E888.9', '038.9', '428001', '42-80', '']
+    with engine.connect() as conn:
+        trans = conn.begin()
+        conn.execute(KEY_FUNCTION_SQL)
+        sql_keys = [conn.execute('SELECT icd9_key(%s)', code).scalar() for code in codes]
+        trans.rollback()
+    assert [MISSING if key is None else key for key in sql_keys] == encode_icd9(codes).tolist()
@@ -0,0 +1,60 @@
+"""Check that the lab features of an account don't depend on the other accounts extracted."""
+
+import numpy as np
+
+import pandas as pd
+
+from feature_extractors.lab_results import COMPONENTS, lab_features
+
+DAY = pd.Timestamp('2014-01-01')
+
+
+def _data(n_stays=40, n_results=3000, seed=0):
+    """Random stays, and results of some of the components for their patients."""
+    rng = np.random.RandomState(seed)
+    admit = DAY + pd.to_timedelta(rng.randint(0, 60, n_stays), 'D')
+    stays = pd.DataFrame({
+        'pat_study_id': rng.randint(0, 20, n_stays),
+        'adm_date_time': admit,
+        'disch_date_time': admit + pd.to_timedelta(rng.randint(0, 10, n_stays), 'D'),
+    }, index=pd.Index(np.arange(n_stays) + 1000, name='hsp_acct_study_id'))
+    results = pd.DataFrame({
+        'pat_study_id': rng.randint(0, 20, n_results),
+        'common_name': rng.choice(COMPONENTS, n_results),
+        'result_date': DAY + pd.to_timedelta(rng.randint(0, 70 * 24, n_results), 'h'),
+        'ord_num_value': rng.normal(10, 5, n_results).round(1),
+        'result_flag_name': rng.choice(['', 'High', 'Low'], n_results),
+    })
+    return stays, results
+
+
+def test_single_account_matches_batch():
+    stays, results = _data()
+    batch = lab_features(stays, results)
+    assert (batch.index == stays.index).all()
+    for acct in stays.index:
+        stay = stays.loc[[acct]]
+        single = lab_features(stay, results[results.pat_study_id == stay.pat_study_id.iloc[0]])
+        pd.testing.assert_frame_equal(single, batch.loc[[acct]], check_dtype=False)
+
+
+def test_account_with_some_components():
+    stays, results = _data()
+    stay = stays.iloc[:1]
+    results = results[results.common_name.isin(['SODIUM', 'WBC'])].copy()
+    results['pat_study_id'] = stay.pat_study_id.iloc[0]
+    results['result_date'] = stay.adm_date_time.iloc[0]
+
+    features = lab_features(stay, results)
+    assert features.shape[0] == 1
+    assert not features.tabak_high_wbc.isnull().any()
+    assert features.num_total_results.iloc[0] == 2
+    assert not features.tabak_low_glucose.iloc[0] and not features.if_cocaine_bool.iloc[0]
+
+
+def test_account_without_results():
+    stays, results = _data()
+    features = lab_features(stays.iloc[:1], results.iloc[:0])
+    expected = lab_features(stays, results).columns
+    assert list(features.columns) == list(expected)
+    assert features.shape[0] == 1 and (features.values == 0).all()
@@ -0,0 +1,97 @@
+"""Check the concurrency and transaction helpers of sutter.lib.postgres."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from sutter.lib.postgres import run_concurrently, transaction
+
+TABLE = 'test_postgres_{}'.format(os.getpid())
+
+
+def _sleeper(value, seconds):
+    def func():
+        time.sleep(seconds)
+        return value
+    return func
+
+
+@pytest.mark.parametrize('n_threads', [1, 4])
+def test_results_are_keyed_by_task(n_threads):
+    # The first tasks finish last.
+    tasks = {name: _sleeper(name * 2, 0.01 * (5 - i)) for i, name in enumerate('abcde')}
+    assert run_concurrently(tasks, n_threads=n_threads) == {name: name * 2 for name in 'abcde'}
+    assert run_concurrently({}, n_threads=n_threads) == {}
+
+
+def test_tasks_run_at_the_same_time():
+    # Each task waits for the other one: run one after the other, both would time out.
+    started = {'a': threading.Event(), 'b': threading.Event()}
+
+    def task(name, other):
+        def func():
+            started[name].set()
+            return started[other].wait(5)
+        return func
+
+    assert run_concurrently({'a': task('a', 'b'), 'b': task('b', 'a')}, n_threads=2) == \
+        {'a': True, 'b': True}
+
+
+@pytest.mark.parametrize('n_threads', [1, 4])
+def test_exceptions_propagate(n_threads):
+    def fail():
+        raise KeyError('missing')
+
+    with pytest.raises(KeyError):
+        run_concurrently({'a': _sleeper(1, 0.01), 'b': fail, 'c': _sleeper(3, 0.01)},
+                         n_threads=n_threads)
+
+
+@pytest.fixture
+def table(engine):
+    engine.execute('CREATE TABLE {} (id int)'.format(TABLE))
+    yield TABLE
+    engine.execute('DROP TABLE IF EXISTS {}'.format(TABLE))
+
+
+def _ids(engine):
+    return [row[0] for row in engine.execute('SELECT id FROM {} ORDER BY id'.format(TABLE))]
+
+
+def test_transaction_commits_at_the_end_of_the_block(engine, table):
+    with transaction(engine) as conn:
+        # DO blocks (like function calls) aren't autocommitted by the engine.
+        conn.execute('DO $$ BEGIN INSERT INTO {} VALUES (1); END $$'.format(table))
+        conn.execute('INSERT INTO {} VALUES (2)'.format(table))
+        assert _ids(engine) == []
+    assert _ids(engine) == [1, 2]
+
+
+def test_transaction_rolls_back_on_error(engine, table):
+    with pytest.raises(ZeroDivisionError):
+        with transaction(engine) as conn:
+            conn.execute('INSERT INTO {} VALUES (1)'.format(table))
+            1 / 0
+    assert _ids(engine) == []
+
+
+def test_transaction_joins_the_transaction_of_a_connection(engine, table):
+    conn = engine.connect()
+    try:
+        outer = conn.begin()
+        with transaction(conn) as inner:
+            assert inner is conn
+            conn.execute('INSERT INTO {} VALUES (1)'.format(table))
+        # The block was part of the outer transaction, so it isn't committed yet.
+        assert _ids(engine) == []
+        outer.rollback()
+        assert _ids(engine) == []
+
+        with transaction(conn):
+            conn.execute('INSERT INTO {} VALUES (2)'.format(table))
+        assert _ids(engine) == [2]
+    finally:
+        conn.close()
@@ -0,0 +1,98 @@
+"""Compare sutter.lib.readmissions with the inequality join of the labels view."""
+
+import numpy as np
+
+import pandas as pd
+
+from sutter.lib.readmissions import TRANSFER_SOURCES, next_admissions, readmission_labels
+
+BASE = pd.Timestamp('2014-01-01')
+
+
+def _stays(n=300, n_patients=20, seed=0):
+    """Random stays, with tied admit times, missing values and non-qualifying stays."""
+    rng = np.random.RandomState(seed)
+    admit = BASE + pd.to_timedelta(rng.randint(0, 60, n), 'D')
+    admit = pd.Series(admit).where(rng.rand(n) > 0.05)
+    stays = pd.DataFrame({
+        'hsp_acct_study_id': rng.permutation(n) + 1000,
+        'pat_study_id': pd.Series(rng.randint(0, n_patients, n)).where(rng.rand(n) > 0.02),
+        'admit_date_time': admit,
+        'discharge_date_time': admit + pd.to_timedelta(rng.randint(0, 5 * 24, n), 'h'),
+        'acct_type_name': rng.choice(['Inpatient', 'Inpatient', 'Outpatient'], n),
+        'admission_type_name': rng.choice(['Emergency', 'Urgent', 'Elective', None], n),
+        'admission_source_name': rng.choice(['Emergency Room', TRANSFER_SOURCES[0], None], n),
+    })
+    return stays
+
+
+def _sql_next_admissions(index, stays):
+    """
+    The next readmission of each index stay, as the labels view computes it.
+
+    :returns: the admit time of each readmission (NaT if none), and for each index stay the set
+        of positions in `stays` admitted at that time (DISTINCT ON picks any of them).
+    """
+    qualifies = (stays.acct_type_name == 'Inpatient') & \
+        stays.admission_type_name.notnull() & (stays.admission_type_name != 'Elective') & \
+        stays.admission_source_name.notnull() & \
+        ~stays.admission_source_name.isin(TRANSFER_SOURCES) & \
+        stays.pat_study_id.notnull() & stays.admit_date_time.notnull()
+    times, positions = [], []
+    for _, row in index.iterrows():
+        matches = qualifies & (stays.pat_study_id == row.pat_study_id) & \
+            (stays.hsp_acct_study_id != row.hsp_acct_study_id) & \
+            (stays.admit_date_time >= row.discharge_date_time)
+        if matches.any():
+            first = stays.admit_date_time[matches].min()
+            times.append(first)
+            positions.append(set(np.flatnonzero(matches & (stays.admit_date_time == first))))
+        else:
+            times.append(pd.NaT)
+            positions.append(set())
+    return pd.Series(times, index=index.index), positions
+
+
+def test_next_admissions_matches_the_view():
+    stays = _stays()
+    index = stays[stays.acct_type_name == 'Inpatient']
+    times, positions = _sql_next_admissions(index, stays)
+
+    pos = next_admissions(index, stays)
+    assert ((pos >= 0) == times.notnull().values).all()
+    for found, expected in zip(pos, positions):
+        assert (found in expected) if expected else found == -1
+
+
+def test_readmission_labels_match_the_view():
+    stays = _stays(seed=1)
+    index = stays[stays.acct_type_name == 'Inpatient']
+    times, _ = _sql_next_admissions(index, stays)
+    # date_part('day', admit - discharge): complete days.
+    days = (times - index.discharge_date_time).dt.days
+
+    labels = readmission_labels(index, stays, horizons=[7, 30])
+    np.testing.assert_array_equal(labels.days_to_readmit.values, days.values.astype(float))
+    assert (labels.readmit_7_day_bool == (days <= 7)).all()
+    assert (labels.readmit_30_day_bool == (days <= 30)).all()
+
+
+def test_zero_length_stay_is_not_its_own_readmission():
+    stays = pd.DataFrame({
+        'hsp_acct_study_id': [1, 2],
+        'pat_study_id': [7, 7],
+        'admit_date_time': [BASE, BASE],
+        'discharge_date_time': [BASE, BASE + pd.Timedelta(days=1)],
+        'acct_type_name': ['Inpatient', 'Inpatient'],
+        'admission_type_name': ['Emergency', 'Emergency'],
+        'admission_source_name': ['Emergency Room', 'Emergency Room'],
+    })
+    np.testing.assert_array_equal(next_admissions(stays, stays), [1, -1])
+
+
+def test_empty_inputs():
+    stays = _stays()
+    assert len(next_admissions(stays.iloc[:0], stays)) == 0
+    np.testing.assert_array_equal(next_admissions(stays, stays.iloc[:0]), -1)
+    labels = readmission_labels(stays.iloc[:0], stays)
+    assert len(labels) == 0 and 'readmit_30_day_bool' in labels
@@ -0,0 +1,54 @@
+"""Check the conversion of single-account features into model inputs, in sutter.lib.realtime."""
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from feature_extractors.medications import MedicationsExtractor
+from sutter.lib.realtime import featurize, training_fill_values
+
+NAMES = ['A__age', 'A__flag_bool', 'A__race_cat_white', 'A__race_cat_asian']
+
+
+def _features():
+    return pd.DataFrame({'A__age': [np.nan], 'A__flag_bool': [True], 'A__race_cat': ['asian'],
+                         'A__unused': [1.]}, index=[7])
+
+
+def test_featurize_fills_and_orders_the_model_inputs():
+    res = featurize(_features(), NAMES, fill_values={'A__age': 50., 'A__flag_bool': .5})
+    assert list(res.columns) == NAMES
+    assert res.loc[7].tolist() == [50., 1., 0., 1.]
+
+
+def test_featurize_requires_a_fill_value_for_every_input():
+    with pytest.raises(ValueError) as e:
+        featurize(_features(), NAMES, fill_values={'A__age': 50.})
+    assert 'A__flag_bool' in str(e.value)
+    assert featurize(_features(), NAMES).A__age.isnull().all()
+
+
+def test_training_fill_values_are_the_means_of_all_but_the_dummies():
+    training = pd.DataFrame({'A__age': [40., 60.], 'A__flag_bool': [0., 1.],
+                             'A__race_cat_white': [1, 0]})
+    fill_values = training_fill_values(training)
+    assert fill_values == {'A__age': 50., 'A__flag_bool': .5}
+    features = _features().assign(A__flag_bool=np.nan)
+    assert featurize(features, NAMES, fill_values=fill_values).loc[7].tolist() == \
+        [50., .5, 0., 1.]
+
+
+def test_materialized_views_can_be_read_from_their_sql():
+    extractor = MedicationsExtractor()
+    query = 'SELECT * FROM features.bayes_m_vw_account_medications'
+    assert extractor._partition_query(query, True) == query
+
+    extractor.inline_materialized_views = True
+    extractor.set_account_range(5, 6)
+    inlined = extractor._partition_query(query, True)
+    assert 'features.bayes_m_vw_account_medications' not in inlined
+    assert 'JOIN bayes_account_encounters stay' in inlined
+    assert inlined.count(') bayes_m_vw_account_medications') == 1
+    assert 'q.hsp_acct_study_id >= 5 AND q.hsp_acct_study_id < 6' in inlined
@@ -0,0 +1,79 @@
+"""Compare sutter.lib.segments with the groupby it replaces."""
+
+import numpy as np
+
+import pandas as pd
+
+from sutter.lib.segments import STATS, iter_segments, nanoseconds, segment_starts, segment_stats
+
+
+def _rows(n=2000, seed=0):
+    """Random lab results sorted by (account, component, time), with tied times."""
+    rng = np.random.RandomState(seed)
+    rows = pd.DataFrame({
+        'hsp_acct_study_id': rng.randint(0, 50, n),
+        'common_name': rng.choice(['SODIUM', 'GLUCOSE', 'WBC'], n),
+        'days': rng.randint(0, 10, n).astype(float) / 2,
+        'value': rng.normal(size=n).round(1),
+    })
+    return rows.sort_values(['hsp_acct_study_id', 'common_name', 'days'], kind='mergesort') \
+        .reset_index(drop=True)
+
+
+def _slope(group):
+    if group.days.nunique() < 2:
+        return np.nan
+    return np.polyfit(group.days, group.value, 1)[0]
+
+
+def test_stats_match_groupby():
+    rows = _rows()
+    keys = ['hsp_acct_study_id', 'common_name']
+    starts = segment_starts(rows.hsp_acct_study_id.values, rows.common_name.values)
+    stats = segment_stats(starts, rows.days.values, rows.value.values)
+
+    grouped = rows.groupby(keys, sort=True)
+    expected = grouped.value.agg(['count', 'first', 'last', 'min', 'max'])
+    expected['slope'] = grouped.apply(_slope)
+    assert len(starts) == len(expected)
+    for stat in STATS:
+        np.testing.assert_allclose(stats[stat], expected[stat].values, err_msg=stat)
+
+
+def test_slope_is_nan_for_equal_times():
+    stats = segment_stats(np.array([0, 3]), [1., 1., 1., 0., 1.], [1., 2., 3., 0., 2.])
+    assert np.isnan(stats['slope'][0])
+    assert stats['slope'][1] == 2
+
+
+def test_empty_input():
+    starts = segment_starts(np.zeros(0), np.zeros(0))
+    assert len(starts) == 0
+    stats = segment_stats(starts, np.zeros(0), np.zeros(0))
+    assert all(len(stats[stat]) == 0 for stat in STATS)
+
+
+def test_iter_segments_keeps_groups_whole():
+    rows = _rows()
+    keys = ['hsp_acct_study_id', 'common_name']
+    chunks = [rows.iloc[i:i + 37] for i in range(0, len(rows), 37)]
+    chunks.insert(3, rows.iloc[:0])
+
+    segments = list(iter_segments(chunks, keys))
+    pd.testing.assert_frame_equal(pd.concat(segments, ignore_index=True), rows)
+    seen = set()
+    for segment in segments:
+        groups = set(map(tuple, segment[keys].drop_duplicates().values))
+        assert not groups & seen
+        seen |= groups
+
+
+def test_iter_segments_without_rows():
+    assert list(iter_segments([], ['a'])) == []
+    assert list(iter_segments([pd.DataFrame({'a': []})], ['a'])) == []
+
+
+def test_nanoseconds():
+    ns, valid = nanoseconds(['1970-01-01 00:00:01', None, pd.Timestamp('1970-01-02')])
+    assert ns[0] == 10 ** 9 and ns[2] == 24 * 3600 * 10 ** 9
+    np.testing.assert_array_equal(valid, [True, False, True])
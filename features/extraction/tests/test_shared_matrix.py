@@ -0,0 +1,50 @@
+"""Check that matrices published by sutter.lib.shared_matrix attach as they were."""
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from sutter.lib.shared_matrix import attach_matrices, map_shared, publish_matrices
+
+
+def _matrices(n=20, seed=0):
+    """Features and labels as load_sutter_csv returns them, with labels of mixed types."""
+    rng = np.random.RandomState(seed)
+    index = pd.Index(np.arange(n) * 7 + 100, name='hsp_acct_study_id')
+    features = pd.DataFrame(rng.normal(size=(n, 3)), index=index, columns=['a', 'b', 'c_bool'])
+    labels = pd.DataFrame({
+        'readmitted': rng.rand(n) < 0.3,
+        'days_to_readmission': rng.randint(1, 30, n),
+        'adm_date': pd.Timestamp('2014-01-01') + pd.to_timedelta(rng.randint(0, 90, n), 'D'),
+        'dx_group': rng.choice(['CHF', 'AMI', None], n),
+    }, index=index, columns=['readmitted', 'days_to_readmission', 'adm_date', 'dx_group'])
+    return features, labels
+
+
+def _fold_sum(features, labels, fold):
+    rows = np.arange(fold, len(labels), 3)
+    return features[rows].sum(), int(labels.days_to_readmission.values[rows].sum())
+
+
+def test_round_trip(tmpdir):
+    features_df, labels_df = _matrices()
+    publish_matrices(features_df, labels_df, str(tmpdir.join('shared')))
+
+    features, labels, columns = attach_matrices(str(tmpdir.join('shared')))
+    assert columns == list(features_df.columns)
+    assert isinstance(features, np.memmap) and not features.flags.writeable
+    assert features.flags.c_contiguous
+    np.testing.assert_array_equal(features, features_df.values)
+    pd.testing.assert_frame_equal(labels, labels_df)
+    with pytest.raises(ValueError):
+        features[0, 0] = 1
+
+
+def test_map_shared(tmpdir):
+    features_df, labels_df = _matrices()
+    publish_matrices(features_df, labels_df, str(tmpdir))
+
+    results = map_shared(_fold_sum, str(tmpdir), range(3), n_jobs=2)
+    assert results == [_fold_sum(features_df.values, labels_df, fold) for fold in range(3)]
@@ -0,0 +1,85 @@
+"""Check the census cache and tract lookup of the socioeconomic extractor."""
+
+import collections
+
+import numpy as np
+
+import pandas as pd
+
+from feature_extractors import socioeconomic
+from feature_extractors.socioeconomic import SocioeconomicExtractor
+
+Connection = collections.namedtuple('Connection', 'url')
+Url = collections.namedtuple('Url', 'database')
+
+
+class Extractor(SocioeconomicExtractor):
+    """Read the census and the tract of each account from DataFrames rather than the database."""
+
+    def __init__(self, census, tracts):
+        SocioeconomicExtractor.__init__(self, output_mode='df')
+        self.census, self.tracts = census, tracts
+        self.census_reads = 0
+
+    def read_sql(self, query, **kwargs):
+        if 'bayes_census' in query:
+            self.census_reads += 1
+            return self.census.copy()
+        return self.tracts
+
+
+def _extractor(tmpdir, monkeypatch, counters):
+    """An extractor caching in `tmpdir`, with bayes_census' counters read from `counters`."""
+    monkeypatch.chdir(tmpdir)
+    monkeypatch.setattr(socioeconomic.postgres, 'get_connection',
+                        lambda: Connection(Url('scratch')))
+    monkeypatch.setattr(socioeconomic.pd, 'read_sql', lambda query, con: pd.DataFrame(
+        [counters], columns=['relid', 'n_tup_ins', 'n_tup_upd', 'n_tup_del']))
+
+    census = pd.DataFrame({'tract_id': ['06001400100', '06001400300', '06001400200'],
+                           'income__per_capita': [1., 3., 2.],
+                           'population__total': [10., 30., 20.]},
+                          columns=['tract_id', 'income__per_capita', 'population__total'])
+    tracts = pd.DataFrame({'tract_id': ['06001400200', '06001400400', None, '06001400100']},
+                          index=pd.Index([1, 2, 3, 4], name='hsp_acct_study_id'))
+    return Extractor(census, tracts)
+
+
+def test_cache_is_rebuilt_when_the_census_changes(tmpdir, monkeypatch):
+    counters = [16384, 3, 0, 0]
+    extractor = _extractor(tmpdir, monkeypatch, counters)
+    first = extractor.extract()
+    assert extractor.census_reads == 1
+    assert len(tmpdir.listdir()) == 1
+
+    # Unchanged table: the cache is reused.
+    pd.testing.assert_frame_equal(extractor.extract(), first)
+    assert extractor.census_reads == 1
+
+    # Updated table: the cache is rebuilt, and the stale one removed.
+    counters[2] += 1
+    extractor.census.loc[0, 'income__per_capita'] = 5.
+    assert extractor.extract().loc[4, 'income__per_capita'] == 5
+    assert extractor.census_reads == 2
+    assert len(tmpdir.listdir()) == 1
+
+    # Reloaded table (new relid, same counters).
+    counters[0] += 1
+    extractor.extract()
+    assert extractor.census_reads == 3
+    assert len(tmpdir.listdir()) == 1
+
+
+def test_accounts_get_the_features_of_their_tract(tmpdir, monkeypatch):
+    extractor = _extractor(tmpdir, monkeypatch, [16384, 3, 0, 0])
+    features = extractor.extract()
+    assert list(features.columns) == ['income__per_capita', 'population__total']
+    np.testing.assert_array_equal(features.income__per_capita, [2, np.nan, np.nan, 1])
+    np.testing.assert_array_equal(features.population__total, [20, np.nan, np.nan, 10])
+
+
+def test_empty_census(tmpdir, monkeypatch):
+    extractor = _extractor(tmpdir, monkeypatch, [16384, 0, 0, 0])
+    extractor.census = extractor.census.iloc[:0]
+    features = extractor.extract()
+    assert features.shape == (4, 2) and features.isnull().all().all()
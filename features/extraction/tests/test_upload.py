@@ -0,0 +1,78 @@
+"""Check the COPY loads of sutter.lib.upload against a database."""
+
+import os
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+import sqlalchemy as sa
+
+from sutter.lib.upload import bulk_load, copy_df
+
+TABLE = 'test_upload_{}'.format(os.getpid())
+
+
+@pytest.fixture
+def table(engine):
+    yield TABLE
+    engine.execute('DROP TABLE IF EXISTS {}'.format(TABLE))
+
+
+def _frame():
+    return pd.DataFrame({'id': [1, 2, 3],
+                         'n': [1., np.nan, 3.],
+                         'day': pd.to_datetime(['2014-01-01', None, '2014-01-03']),
+                         'name': ['a\tb', None, 'c\\d']},
+                        columns=['id', 'n', 'day', 'name'])
+
+
+def _read(engine):
+    return pd.read_sql('SELECT * FROM {} ORDER BY id'.format(TABLE), engine)
+
+
+def test_copy_df_keeps_nulls_and_special_characters(engine, table):
+    engine.execute('CREATE TABLE {} (id int, n int, day date, name varchar)'.format(table))
+    conn = engine.raw_connection()
+    try:
+        copy_df(conn.cursor(), table, _frame())
+        conn.commit()
+    finally:
+        conn.close()
+    res = _read(engine)
+    assert list(res.n.fillna(-1)) == [1, -1, 3]
+    assert list(pd.to_datetime(res.day).isnull()) == [False, True, False]
+    assert list(res.name) == ['a\tb', None, 'c\\d']
+
+
+def test_bulk_load_creates_indexes_and_appends(engine, table):
+    df = _frame()
+    assert bulk_load(table, engine, [df.iloc[:2], df.iloc[2:]], indexes=['id', ['n', 'day']]) == 3
+    pd.testing.assert_frame_equal(_read(engine)[['id', 'n']], df[['id', 'n']])
+    indexes = {index['name'] for index in sa.inspect(engine).get_indexes(table)}
+    assert indexes == {table + '_id', table + '_n_day'}
+
+    with pytest.raises(ValueError):
+        bulk_load(table, engine, df)
+    bulk_load(table, engine, df, if_exists='append')
+    assert len(_read(engine)) == 6
+    bulk_load(table, engine, df.iloc[:1], if_exists='replace')
+    assert len(_read(engine)) == 1
+
+
+def test_bulk_load_through_a_connection_is_part_of_its_transaction(engine, table):
+    with engine.connect() as conn:
+        trans = conn.begin()
+        bulk_load(table, conn, _frame(), indexes=['id'])
+        # Not committed yet: the table only exists within the transaction.
+        assert not engine.has_table(table)
+        assert len(pd.read_sql('SELECT * FROM {}'.format(table), conn)) == 3
+        trans.rollback()
+    assert not engine.has_table(table)
+
+    with engine.connect() as conn:
+        with conn.begin():
+            bulk_load(table, conn, _frame())
+    assert len(_read(engine)) == 3
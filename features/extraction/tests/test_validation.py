@@ -0,0 +1,117 @@
+"""Compare sutter.lib.validation with the per-column checks it replaces."""
+
+import re
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from sutter.lib.validation import default_mode, validate_df
+
+
+def _old_validate_df(df):
+    """The former FeatureExtractor._validate_df."""
+    for colname in df:
+        column = df[colname]
+
+        if re.match("[A-Z] ", colname):
+            raise Exception("Bad column name: %s!" % colname)
+        elif colname.endswith("_bool"):
+            values = set(column.values)
+            if not values <= {True, False, None, np.NaN}:
+                raise Exception("Column %s contains non-boolean values (%s)!"
+                                % (colname, values))
+
+
+def _raises(validate, df):
+    try:
+        validate(df)
+    except Exception:
+        return True
+    return False
+
+
+# The missing values are np.NaN itself in object columns: the former check compared the values
+# to np.NaN by identity, so it rejected the NaNs of float columns.
+FRAMES = [
+    pd.DataFrame({'a_bool': [True, False, True]}),
+    pd.DataFrame({'a_bool': [1, 0, 1]}),
+    pd.DataFrame({'a_bool': [1., 0., 1.]}),
+    pd.DataFrame({'a_bool': [1, 2, 0]}),
+    pd.DataFrame({'a_bool': [1., 0.5, 0.]}),
+    pd.DataFrame({'a_bool': [True, None, np.NaN, False]}, dtype=object),
+    pd.DataFrame({'a_bool': [True, 'x', False]}),
+    pd.DataFrame({'a_bool': ['x', 'y', 'z']}),
+    pd.DataFrame({'a_bool': [True, 2, None]}, dtype=object),
+    pd.DataFrame({'a_bool': [1, 0], 'b_bool': [0, 3], 'n': [5, 6]}),
+    pd.DataFrame({'n': ['x', 2.5, None], 'a_bool': [0, 1, 1]}),
+    pd.DataFrame({'A b': [1, 2]}),
+    pd.DataFrame({'a B': [1, 2], 'a bool': [3, 4]}),
+    pd.DataFrame({'a_bool': []}),
+]
+
+
+@pytest.mark.parametrize('df', FRAMES)
+def test_matches_old_validation(df):
+    assert _raises(lambda d: validate_df(d, 'full'), df) == _raises(_old_validate_df, df)
+
+
+def test_float_bool_columns_may_have_missing_values():
+    validate_df(pd.DataFrame({'a_bool': [1., np.nan, 0.]}), 'full')
+
+
+def test_error_reports_the_bad_values():
+    with pytest.raises(Exception) as exc:
+        validate_df(pd.DataFrame({'a_bool': [1, 0], 'b_bool': [0, 2]}), 'full')
+    assert 'b_bool' in str(exc.value) and '2' in str(exc.value)
+    with pytest.raises(Exception) as exc:
+        validate_df(pd.DataFrame({'A b': [1]}), 'full')
+    assert 'Bad column name: A b!' in str(exc.value)
+
+
+def test_sample_mode_checks_some_of_the_rows():
+    values = np.ones(1000)
+    values[7] = 2
+    df = pd.DataFrame({'a_bool': values})
+    np.random.seed(0)
+    sampled = np.random.choice(len(df), 10, replace=False)
+    assert 7 not in sampled
+
+    np.random.seed(0)
+    validate_df(df, 'sample', sample_size=10)
+    with pytest.raises(Exception):
+        validate_df(df, 'full')
+    # Frames no larger than the sample are checked in full.
+    with pytest.raises(Exception):
+        validate_df(df, 'sample', sample_size=len(df))
+    # Column names are always checked.
+    with pytest.raises(Exception):
+        validate_df(pd.DataFrame({'A b': np.ones(1000)}), 'sample', sample_size=10)
+
+
+def test_off_mode_checks_nothing():
+    validate_df(pd.DataFrame({'A b': [1], 'a_bool': ['x']}), 'off')
+
+
+def test_mode_from_environment(monkeypatch):
+    bad = pd.DataFrame({'a_bool': [2]})
+    monkeypatch.delenv('SUTTER_VALIDATION', raising=False)
+    assert default_mode() == 'full'
+    with pytest.raises(Exception):
+        validate_df(bad)
+
+    monkeypatch.setenv('SUTTER_VALIDATION', 'off')
+    assert default_mode() == 'off'
+    validate_df(bad)
+    # An explicit mode takes precedence.
+    with pytest.raises(Exception):
+        validate_df(bad, 'full')
+
+    monkeypatch.setenv('SUTTER_VALIDATION', 'sample')
+    assert default_mode() == 'sample'
+
+    monkeypatch.setenv('SUTTER_VALIDATION', 'Full')
+    with pytest.raises(ValueError):
+        default_mode()
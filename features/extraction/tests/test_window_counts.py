@@ -0,0 +1,85 @@
+"""Compare sutter.lib.window_counts with the self-join it replaces."""
+
+import numpy as np
+
+import pandas as pd
+
+from sutter.lib.window_counts import count_prior_events
+
+BASE = pd.Timestamp('2014-01-01')
+WINDOWS = [('1_month', pd.DateOffset(months=1)), ('6_month', pd.DateOffset(months=6)),
+           ('2_day', pd.Timedelta(days=2))]
+TYPES = ['Emergency', 'Inpatient', 'Outpatient']
+
+
+def _data(n_index=100, n_events=1000, n_patients=15, seed=0):
+    """Random admissions and visits on whole days, so that many fall on a window boundary."""
+    rng = np.random.RandomState(seed)
+    index = pd.DataFrame({
+        'pat_study_id': rng.randint(0, n_patients, n_index),
+        'adm_date_time': BASE + pd.to_timedelta(rng.randint(0, 400, n_index), 'D'),
+    }, index=rng.permutation(n_index) + 1000)
+    events = pd.DataFrame({
+        'pat_study_id': pd.Series(rng.randint(0, n_patients, n_events)).where(
+            rng.rand(n_events) > 0.02),
+        'disch_date_time': pd.Series(BASE + pd.to_timedelta(rng.randint(0, 400, n_events), 'D'))
+        .where(rng.rand(n_events) > 0.02),
+        'acct_type_name': rng.choice(TYPES + [None], n_events),
+    })
+    index.loc[index.index[:5], 'adm_date_time'] = pd.NaT
+    return index, events
+
+
+def _self_join(index, events, windows, types):
+    """Count the events with `time - window <= event time < time`, one row at a time."""
+    counts = pd.DataFrame(0, index=index.index,
+                          columns=pd.MultiIndex.from_product([[w for w, _ in windows], types]))
+    for acct, row in index.iterrows():
+        if pd.isnull(row.adm_date_time):
+            continue
+        same = events[events.pat_study_id == row.pat_study_id]
+        for name, offset in windows:
+            in_window = same[(same.disch_date_time >= row.adm_date_time - offset) &
+                             (same.disch_date_time < row.adm_date_time)]
+            for type_name in types:
+                counts.loc[acct, (name, type_name)] = (in_window.acct_type_name == type_name).sum()
+    return counts
+
+
+def test_counts_match_the_self_join():
+    index, events = _data()
+    counts = count_prior_events(index, events, WINDOWS)
+    expected = _self_join(index, events, WINDOWS, TYPES)
+    pd.testing.assert_frame_equal(counts[expected.columns], expected, check_names=False,
+                                  check_dtype=False)
+
+
+def test_window_boundaries():
+    index = pd.DataFrame({'pat_study_id': [1], 'adm_date_time': [pd.Timestamp('2014-03-31')]})
+    events = pd.DataFrame({
+        'pat_study_id': [1, 1, 1, 1],
+        'disch_date_time': pd.to_datetime(['2014-02-27', '2014-02-28', '2014-03-30',
+                                           '2014-03-31']),
+        'acct_type_name': ['Emergency'] * 4,
+    })
+    counts = count_prior_events(index, events, [('1_month', pd.DateOffset(months=1))])
+    # 2014-03-31 - 1 month is 2014-02-28, which is in the window; the admission day is not.
+    assert counts.loc[0, ('1_month', 'Emergency')] == 2
+
+
+def test_requested_types_without_events():
+    index, events = _data()
+    counts = count_prior_events(index, events.iloc[:0], WINDOWS, types=TYPES)
+    assert counts.shape == (len(index), len(WINDOWS) * len(TYPES))
+    assert (counts.values == 0).all()
+
+    counts = count_prior_events(index, events, WINDOWS, types=['Emergency', 'Hospice'])
+    expected = _self_join(index, events, WINDOWS, ['Emergency', 'Hospice'])
+    pd.testing.assert_frame_equal(counts[expected.columns], expected, check_names=False,
+                                  check_dtype=False)
+
+
+def test_empty_index():
+    index, events = _data()
+    counts = count_prior_events(index.iloc[:0], events, WINDOWS)
+    assert counts.shape == (0, len(WINDOWS) * len(TYPES))